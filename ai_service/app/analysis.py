@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Callable
+
+from PIL import Image, UnidentifiedImageError
+
+from .cache import content_key, entry_path, load_features, store_features
+from .config import settings
+from .detectors import detector_version, get_detector
+from .features import ImageFeatures, decode_for_analysis, extract_features, normalized_diff
+from .schemas import (
+    AfterAnalyzeRequest,
+    AfterAnalyzeResponse,
+    BeforeAnalyzeRequest,
+    BeforeAnalyzeResponse,
+    Decision,
+    Priority,
+    VerificationDecision,
+)
+
+
+class AnalysisError(Exception):
+    # Positional args only, so the exception survives pickling back from a pool worker.
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _check_deadline(deadline: float | None) -> None:
+    if deadline is not None and time.time() > deadline:
+        raise AnalysisError(504, "Analysis deadline exceeded")
+
+
+def _read_image(image_path: str | None, image_url: str | None) -> bytes:
+    if image_path:
+        path = Path(image_path)
+        if not path.exists():
+            raise AnalysisError(404, "Image path not found")
+        return path.read_bytes()
+    if image_url:
+        # URLs are downloaded by app.fetch on the event loop before the job is queued.
+        raise AnalysisError(400, "image_url must be fetched before analysis")
+    raise AnalysisError(400, "Missing image_path or image_url")
+
+
+def _open_image(data: bytes) -> Image.Image:
+    # Only the header has been parsed at this point, so the pixel cap costs nothing. The cap is
+    # checked here rather than through Image.MAX_IMAGE_PIXELS: the API server imports this module
+    # for its in-process analyzer and keeps Pillow's own limit for its upload handling.
+    try:
+        image = Image.open(BytesIO(data))
+    except Image.DecompressionBombError:
+        raise AnalysisError(413, "Image has too many pixels") from None
+    except UnidentifiedImageError:
+        raise AnalysisError(422, "Unsupported or corrupt image") from None
+    if image.width * image.height > settings.max_image_pixels:
+        raise AnalysisError(413, "Image has too many pixels")
+    return image
+
+
+# Cache activity of the job running in this worker, shipped back to the parent's index.
+_job_stats: dict = {}
+
+
+def _reset_job_stats() -> None:
+    _job_stats.clear()
+    _job_stats.update(cache_hits=0, cache_misses=0, cache_touched=[], cache_written=[])
+
+
+ImageRef = tuple[str | None, str | None]
+
+
+def _resolve_features(refs: list[ImageRef], deadline: float | None) -> list[ImageFeatures | AnalysisError]:
+    """Features for every image in a job, with one detector call for all cache misses."""
+    results: list[ImageFeatures | AnalysisError | None] = [None] * len(refs)
+    waiting: dict[str, list[int]] = {}
+    decoded: list[tuple[str, Image.Image]] = []
+
+    for index, (image_path, image_url) in enumerate(refs):
+        try:
+            _check_deadline(deadline)
+            data = _read_image(image_path, image_url)
+            key = content_key(data)
+            if key in waiting:
+                waiting[key].append(index)
+                continue
+            features = load_features(key)
+            if features is not None:
+                _job_stats["cache_hits"] += 1
+                _job_stats["cache_touched"].append(entry_path(key))
+                results[index] = features
+                continue
+            _job_stats["cache_misses"] += 1
+            decoded.append((key, decode_for_analysis(_open_image(data))))
+            waiting[key] = [index]
+        except AnalysisError as exc:
+            results[index] = exc
+        except Exception as exc:
+            results[index] = AnalysisError(422, f"Analysis failed: {exc}")
+
+    if decoded:
+        try:
+            _check_deadline(deadline)
+            images = [image for _, image in decoded]
+            extracted = [extract_features(image) for image in images]
+            scores = get_detector().score(images, extracted)
+        except AnalysisError as exc:
+            extracted, scores = [exc] * len(decoded), [None] * len(decoded)
+        for (key, _), features, score in zip(decoded, extracted, scores):
+            if isinstance(features, ImageFeatures):
+                features.trash_score = score
+                written = store_features(key, features)
+                if written is not None:
+                    _job_stats["cache_written"].append(written)
+            for index in waiting[key]:
+                results[index] = features
+    return results  # type: ignore[return-value]
+
+
+def _priority_from_severity(severity: float) -> Priority:
+    if severity >= 0.7:
+        return "High"
+    if severity >= 0.45:
+        return "Medium"
+    return "Low"
+
+
+def _before_verdict(scores: ImageFeatures) -> BeforeAnalyzeResponse:
+    trash_present = scores.trash_score >= 0.35
+    severity = scores.trash_score
+    priority = _priority_from_severity(severity)
+    decision: Decision = "approve" if trash_present else "reject"
+    confidence = min(0.99, 0.55 + abs(scores.trash_score - 0.35))
+    reason = None if trash_present else "No trash detected"
+
+    return BeforeAnalyzeResponse(
+        decision=decision,
+        trash_present=trash_present,
+        severity=round(severity, 4),
+        priority=priority,
+        confidence=round(confidence, 4),
+        reason=reason,
+        image_hash=scores.ahash,
+        flags=[],
+        model_version=detector_version(),
+    )
+
+
+def _after_verdict(before: ImageFeatures, after_scores: ImageFeatures) -> AfterAnalyzeResponse:
+    diff_score = normalized_diff(before, after_scores)
+
+    flags: list[str] = []
+    if diff_score < 0.08:
+        flags.append("low_change_detected")
+
+    if after_scores.trash_score < 0.25 and diff_score >= 0.12:
+        decision: VerificationDecision = "accept"
+        cleaned = True
+        confidence = min(0.99, 0.6 + diff_score)
+    elif after_scores.trash_score < 0.45:
+        decision = "reclean"
+        cleaned = False
+        confidence = 0.55
+    else:
+        decision = "reject"
+        cleaned = False
+        confidence = 0.7
+
+    return AfterAnalyzeResponse(
+        decision=decision,
+        cleaned=cleaned,
+        confidence=round(confidence, 4),
+        before_image_hash=before.ahash,
+        after_image_hash=after_scores.ahash,
+        diff_score=round(diff_score, 4),
+        after_trash_score=round(after_scores.trash_score, 4),
+        flags=flags,
+        model_version=detector_version(),
+    )
+
+
+def analyze_before_many(
+    payloads: list[BeforeAnalyzeRequest], deadline: float | None = None
+) -> list[BeforeAnalyzeResponse | AnalysisError]:
+    features = _resolve_features([(p.image_path, p.image_url) for p in payloads], deadline)
+    return [item if isinstance(item, AnalysisError) else _before_verdict(item) for item in features]
+
+
+def analyze_after_many(
+    payloads: list[AfterAnalyzeRequest], deadline: float | None = None
+) -> list[AfterAnalyzeResponse | AnalysisError]:
+    refs: list[ImageRef] = []
+    for p in payloads:
+        refs += [(p.before_image_path, p.before_image_url), (p.after_image_path, p.after_image_url)]
+    features = _resolve_features(refs, deadline)
+    results: list[AfterAnalyzeResponse | AnalysisError] = []
+    for before, after in zip(features[0::2], features[1::2]):
+        error = before if isinstance(before, AnalysisError) else after if isinstance(after, AnalysisError) else None
+        results.append(error or _after_verdict(before, after))  # type: ignore[arg-type]
+    return results
+
+
+def analyze_before(payload: BeforeAnalyzeRequest, deadline: float | None = None) -> BeforeAnalyzeResponse:
+    (result,) = analyze_before_many([payload], deadline)
+    if isinstance(result, AnalysisError):
+        raise result
+    return result
+
+
+def analyze_after(payload: AfterAnalyzeRequest, deadline: float | None = None) -> AfterAnalyzeResponse:
+    (result,) = analyze_after_many([payload], deadline)
+    if isinstance(result, AnalysisError):
+        raise result
+    return result
+
+
+def _finish_job(started: float) -> dict:
+    return {**_job_stats, "busy_seconds": time.perf_counter() - started}
+
+
+def run_before_job(payload: dict, deadline: float | None) -> tuple[dict, dict]:
+    started = time.perf_counter()
+    _reset_job_stats()
+    result = analyze_before(BeforeAnalyzeRequest(**payload), deadline)
+    return result.model_dump(), _finish_job(started)
+
+
+def run_after_job(payload: dict, deadline: float | None) -> tuple[dict, dict]:
+    started = time.perf_counter()
+    _reset_job_stats()
+    result = analyze_after(AfterAnalyzeRequest(**payload), deadline)
+    return result.model_dump(), _finish_job(started)
+
+
+def _run_batch(analyze_many: Callable, model: type, payloads: list[dict], deadline: float | None) -> tuple[list[dict], dict]:
+    # One failing item must not sink its neighbours, so errors are returned per item.
+    started = time.perf_counter()
+    _reset_job_stats()
+    outcomes: list[dict] = []
+    for result in analyze_many([model(**payload) for payload in payloads], deadline):
+        if isinstance(result, AnalysisError):
+            outcomes.append({"error": {"status_code": result.status_code, "detail": result.detail}})
+        else:
+            outcomes.append({"result": result.model_dump()})
+    return outcomes, _finish_job(started)
+
+
+def run_before_batch_job(payloads: list[dict], deadline: float | None) -> tuple[list[dict], dict]:
+    return _run_batch(analyze_before_many, BeforeAnalyzeRequest, payloads, deadline)
+
+
+def run_after_batch_job(payloads: list[dict], deadline: float | None) -> tuple[list[dict], dict]:
+    return _run_batch(analyze_after_many, AfterAnalyzeRequest, payloads, deadline)
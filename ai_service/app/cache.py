@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from uuid import uuid4
+
+import numpy as np
+
+from .config import settings
+from .detectors import detector_version
+from .features import ImageFeatures
+
+# Workers read and write entries; the parent process owns the LRU index and does all
+# eviction, fed by the per-job stats the workers send back.
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def features_root() -> str:
+    return os.path.join(settings.cache_dir, "features")
+
+
+def version_root() -> str:
+    return os.path.join(features_root(), detector_version())
+
+
+def entry_path(key: str) -> str:
+    return os.path.join(version_root(), key[:2], f"{key}.npz")
+
+
+def load_features(key: str) -> ImageFeatures | None:
+    if settings.cache_mb <= 0:
+        return None
+    path = entry_path(key)
+    try:
+        with np.load(path) as entry:
+            features = ImageFeatures(
+                ahash=str(entry["ahash"]),
+                dhash=str(entry["dhash"]),
+                phash=str(entry["phash"]),
+                edge_mean=float(entry["edge_mean"]),
+                grayscale_std=float(entry["grayscale_std"]),
+                trash_score=float(entry["trash_score"]),
+                diff_basis=entry["diff_basis"],
+            )
+    except (OSError, KeyError, ValueError):
+        # Missing, or half-written by a worker that died: treat as a miss.
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return features
+
+
+def store_features(key: str, features: ImageFeatures) -> tuple[str, int] | None:
+    if settings.cache_mb <= 0:
+        return None
+    path = entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid4().hex}.tmp.npz"
+    np.savez(
+        tmp,
+        ahash=features.ahash,
+        dhash=features.dhash,
+        phash=features.phash,
+        edge_mean=features.edge_mean,
+        grayscale_std=features.grayscale_std,
+        trash_score=features.trash_score,
+        diff_basis=features.diff_basis,
+    )
+    os.replace(tmp, path)
+    return path, os.path.getsize(path)
+
+
+class CacheIndex:
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> None:
+        self.entries.clear()
+        self.total_bytes = 0
+        if settings.cache_mb <= 0 or not os.path.isdir(features_root()):
+            return
+        # Entries from any other model version can never be hit again.
+        for name in os.listdir(features_root()):
+            if name != detector_version():
+                shutil.rmtree(os.path.join(features_root(), name), ignore_errors=True)
+
+        found: list[tuple[float, str, int]] = []
+        for dirpath, _, filenames in os.walk(version_root()):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if ".tmp" in name:
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self.entries[path] = size
+            self.total_bytes += size
+        self._evict()
+
+    def record(self, stats: dict) -> None:
+        self.hits += stats.get("cache_hits", 0)
+        self.misses += stats.get("cache_misses", 0)
+        for path in stats.get("cache_touched", ()):
+            if path in self.entries:
+                self.entries.move_to_end(path)
+        for path, size in stats.get("cache_written", ()):
+            self.total_bytes += size - self.entries.pop(path, 0)
+            self.entries[path] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        cap = settings.cache_mb * 1024 * 1024
+        while self.total_bytes > cap and self.entries:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model_version": detector_version(),
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+cache_index = CacheIndex()
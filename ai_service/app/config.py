@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+
+
+def available_cores() -> int:
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - non-Linux
+        cores = os.cpu_count() or 1
+    # Respect a cgroup v2 CPU quota so a 2-CPU container on a 64-core host gets 2 workers.
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_optional_float(name: str) -> float | None:
+    raw = os.getenv(name)
+    return float(raw) if raw else None
+
+
+@dataclass(frozen=True)
+class Settings:
+    pool_workers: int = field(default_factory=lambda: _env_int("AI_POOL_WORKERS", 0) or available_cores())
+    queue_size: int = field(default_factory=lambda: _env_int("AI_QUEUE_SIZE", 32))
+    default_deadline_s: float = field(default_factory=lambda: _env_float("AI_DEFAULT_DEADLINE_S", 30.0))
+    max_batch_items: int = field(default_factory=lambda: _env_int("AI_MAX_BATCH_ITEMS", 1000))
+    batch_chunk_size: int = field(default_factory=lambda: _env_int("AI_BATCH_CHUNK_SIZE", 8))
+    cache_dir: str = field(default_factory=lambda: os.getenv("AI_CACHE_DIR", "./.analysis_cache"))
+    cache_mb: int = field(default_factory=lambda: _env_int("AI_CACHE_MB", 512))
+    batch_deadline_s: float = field(default_factory=lambda: _env_float("AI_BATCH_DEADLINE_S", 600.0))
+    detector: str = field(default_factory=lambda: os.getenv("AI_DETECTOR", "heuristic"))
+    onnx_model_path: str = field(default_factory=lambda: os.getenv("AI_ONNX_MODEL_PATH", "./models/trash.onnx"))
+    onnx_threads: int = field(default_factory=lambda: _env_int("AI_ONNX_THREADS", 1))
+    microbatch_window_ms: float | None = field(default_factory=lambda: _env_optional_float("AI_MICROBATCH_WINDOW_MS"))
+    microbatch_max: int = field(default_factory=lambda: _env_int("AI_MICROBATCH_MAX", 16))
+    max_image_pixels: int = field(default_factory=lambda: _env_int("AI_MAX_IMAGE_PIXELS", 50_000_000))
+    fetch_max_mb: int = field(default_factory=lambda: _env_int("AI_FETCH_MAX_MB", 20))
+    fetch_connect_timeout_s: float = field(default_factory=lambda: _env_float("AI_FETCH_CONNECT_TIMEOUT_S", 3.0))
+    fetch_read_timeout_s: float = field(default_factory=lambda: _env_float("AI_FETCH_READ_TIMEOUT_S", 10.0))
+    fetch_max_connections: int = field(default_factory=lambda: _env_int("AI_FETCH_MAX_CONNECTIONS", 32))
+    fetch_cache_mb: int = field(default_factory=lambda: _env_int("AI_FETCH_CACHE_MB", 256))
+    fetch_fresh_s: float = field(default_factory=lambda: _env_float("AI_FETCH_FRESH_S", 300.0))
+
+
+settings = Settings()
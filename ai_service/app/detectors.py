@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import abc
+import hashlib
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from .config import settings
+from .features import MODEL_VERSION, ImageFeatures
+
+
+# score() gets the whole batch a worker is handling, so a model runs one inference per batch.
+class Detector(abc.ABC):
+    name = "base"
+    # Requests are held this long (when unset by AI_MICROBATCH_WINDOW_MS) to form batches.
+    default_batch_window_ms = 0.0
+
+    def warm_up(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def score(self, images: list[Image.Image], features: list[ImageFeatures]) -> list[float]:
+        ...
+
+
+class HeuristicDetector(Detector):
+    name = "heuristic"
+
+    def score(self, images: list[Image.Image], features: list[ImageFeatures]) -> list[float]:
+        return [item.trash_score for item in features]
+
+
+# Input is NCHW float32 RGB in [0, 1]; output one probability per image or two-class scores.
+class OnnxDetector(Detector):
+    name = "onnx"
+    default_batch_window_ms = 5.0
+
+    def __init__(self, model_path: str) -> None:
+        try:
+            import onnxruntime
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("AI_DETECTOR=onnx needs the onnxruntime package") from exc
+
+        options = onnxruntime.SessionOptions()
+        # Parallelism comes from the worker processes; one thread each avoids oversubscription.
+        options.intra_op_num_threads = max(1, settings.onnx_threads)
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        height, width = model_input.shape[2:4]
+        self.size = (width if isinstance(width, int) else 224, height if isinstance(height, int) else 224)
+
+    def _tensor(self, images: list[Image.Image]) -> np.ndarray:
+        batch = np.stack([np.asarray(image.resize(self.size, Image.Resampling.BILINEAR), dtype=np.float32) for image in images])
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2) / 255.0, dtype=np.float32)
+
+    def warm_up(self) -> None:
+        self.session.run(None, {self.input_name: self._tensor([Image.new("RGB", self.size)])})
+
+    def score(self, images: list[Image.Image], features: list[ImageFeatures]) -> list[float]:
+        if not images:
+            return []
+        output = np.asarray(self.session.run(None, {self.input_name: self._tensor(images)})[0], dtype=np.float32)
+        output = output.reshape(len(images), -1)
+        if output.shape[1] == 1:
+            scores = output[:, 0]
+        else:
+            if output.min() < 0 or not np.allclose(output.sum(axis=1), 1, atol=1e-3):
+                output = np.exp(output - output.max(axis=1, keepdims=True))
+                output /= output.sum(axis=1, keepdims=True)
+            scores = output[:, 1]
+        return [float(value) for value in np.clip(scores, 0.0, 1.0)]
+
+
+def detector_class() -> type[Detector]:
+    return OnnxDetector if settings.detector == "onnx" else HeuristicDetector
+
+
+@lru_cache(maxsize=1)
+def detector_version() -> str:
+    # Computed without loading the runtime so the parent process can key the cache with it.
+    if settings.detector != "onnx":
+        return MODEL_VERSION
+    with open(settings.onnx_model_path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    stem = os.path.splitext(os.path.basename(settings.onnx_model_path))[0]
+    return f"onnx-{stem}-{digest[:8]}"
+
+
+@lru_cache(maxsize=1)
+def get_detector() -> Detector:
+    if settings.detector == "onnx":
+        return OnnxDetector(settings.onnx_model_path)
+    return HeuristicDetector()
+
+
+def warm_up_worker() -> None:
+    # Pool initializer: load the model and run it once before the worker takes requests.
+    get_detector().warm_up()
+
+
+def worker_ready() -> int:
+    return os.getpid()
+
+
+def microbatch_window_s() -> float:
+    window_ms = settings.microbatch_window_ms
+    if window_ms is None:
+        window_ms = detector_class().default_batch_window_ms
+    return max(0.0, window_ms) / 1000
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import BinaryIO
+
+import numpy as np
+from PIL import Image
+
+# Bump whenever a change here alters any feature value; cached features are keyed by it.
+MODEL_VERSION = "heuristic-v2"
+
+# Long edge of the array every feature is computed from. Phone photos are 12 MP;
+# the heuristics do not get better past ~1 MP but cost grows linearly.
+ANALYSIS_MAX_PX = 1280
+DIFF_SIZE = 256
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+
+@dataclass
+class ImageFeatures:
+    ahash: str
+    dhash: str
+    phash: str
+    edge_mean: float
+    grayscale_std: float
+    trash_score: float
+    diff_basis: np.ndarray
+
+
+def decode_for_analysis(source: str | BinaryIO | Image.Image, max_px: int = ANALYSIS_MAX_PX) -> Image.Image:
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    # JPEG draft mode decodes straight to 1/2, 1/4 or 1/8 scale.
+    image.draft("RGB", (max_px, max_px))
+    image = image.convert("RGB")
+    # Integer box reduction is several times cheaper than a resampling filter and
+    # is all the heuristics need.
+    factor = -(-max(image.size) // max_px)
+    if factor > 1:
+        image = image.reduce(factor)
+    return image
+
+
+def _bits_to_hex(bits: np.ndarray) -> str:
+    return np.packbits(bits.astype(np.uint8).ravel()).tobytes().hex()
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def _edge_map(gray: np.ndarray) -> np.ndarray:
+    # Same 3x3 kernel as ImageFilter.FIND_EDGES (8 * centre - neighbours), clipped to
+    # uint8 with border pixels passed through. 9 * centre - separable 3x3 box sum.
+    g = gray.astype(np.int16)
+    edges = g.copy()
+    if g.shape[0] >= 3 and g.shape[1] >= 3:
+        rows = g[:, :-2] + g[:, 1:-1] + g[:, 2:]
+        box = rows[:-2] + rows[1:-1] + rows[2:]
+        inner = 9 * g[1:-1, 1:-1] - box
+        np.clip(inner, 0, 255, out=inner)
+        edges[1:-1, 1:-1] = inner
+    return edges
+
+
+def trash_score_from(edge_mean: float, grayscale_std: float) -> float:
+    return min(1.0, (edge_mean / 255) * 0.7 + (grayscale_std / 128) * 0.3)
+
+
+def extract_features(image: Image.Image) -> ImageFeatures:
+    rgb = image if image.mode == "RGB" else image.convert("RGB")
+    gray_image = rgb.convert("L")
+    gray = np.asarray(gray_image)
+
+    edge_mean = float(_edge_map(gray).mean())
+    grayscale_std = float(gray.std())
+
+    small = np.asarray(gray_image.resize((HASH_SIZE, HASH_SIZE)), dtype=np.float32)
+    ahash = _bits_to_hex(small >= small.mean())
+
+    # aHash keeps the heuristic-v1 bicubic 8x8 resize, but it now runs on the capped
+    # analysis image: benchmarks.features reports ahash_bit_distance against the
+    # full-resolution hash (0-6 bits on its corpus). The newer hashes use a box
+    # filter, which is much cheaper.
+    wide = np.asarray(gray_image.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX), dtype=np.float32)
+    dhash = _bits_to_hex(wide[:, 1:] > wide[:, :-1])
+
+    dct = _dct_matrix(PHASH_SIZE)
+    block = np.asarray(gray_image.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BOX), dtype=np.float64)
+    low = (dct @ block @ dct.T)[:HASH_SIZE, :HASH_SIZE]
+    phash = _bits_to_hex(low > np.median(low.ravel()[1:]))
+
+    diff_basis = np.asarray(rgb.resize((DIFF_SIZE, DIFF_SIZE), Image.Resampling.BOX), dtype=np.uint8)
+
+    return ImageFeatures(
+        ahash=ahash,
+        dhash=dhash,
+        phash=phash,
+        edge_mean=edge_mean,
+        grayscale_std=grayscale_std,
+        trash_score=trash_score_from(edge_mean, grayscale_std),
+        diff_basis=diff_basis,
+    )
+
+
+def normalized_diff(before: ImageFeatures, after: ImageFeatures) -> float:
+    diff = np.abs(before.diff_basis.astype(np.int16) - after.diff_basis.astype(np.int16))
+    return min(1.0, float(diff.mean()) / 255)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from uuid import uuid4
+
+import httpx
+
+from .analysis import AnalysisError
+from .config import settings
+
+# Request fields that may carry a URL, and the path field the worker reads instead.
+URL_FIELDS = {
+    "image_url": "image_path",
+    "before_image_url": "before_image_path",
+    "after_image_url": "after_image_path",
+}
+
+
+def _fetch_root() -> str:
+    return os.path.join(settings.cache_dir, "fetched")
+
+
+# Downloads image_url inputs on the event loop so workers only ever read local files.
+class ImageFetcher:
+    def __init__(self) -> None:
+        self.client: httpx.AsyncClient | None = None
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+        # One download per URL, shared by every request waiting on it.
+        self.pending: dict[str, asyncio.Task[str]] = {}
+        self.waiters: dict[str, int] = {}
+        self.fetched = 0
+        self.revalidated = 0
+        self.hits = 0
+        self.rejected_too_large = 0
+
+    def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.fetch_read_timeout_s, connect=settings.fetch_connect_timeout_s),
+            limits=httpx.Limits(max_connections=settings.fetch_max_connections, max_keepalive_connections=settings.fetch_max_connections),
+            follow_redirects=True,
+        )
+        os.makedirs(_fetch_root(), exist_ok=True)
+        found: list[tuple[float, str, int]] = []
+        for name in os.listdir(_fetch_root()):
+            path = os.path.join(_fetch_root(), name)
+            if name.endswith(".img"):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+            elif ".tmp" in name:
+                os.remove(path)
+        for _, path, size in sorted(found):
+            self.entries[path] = size
+            self.total_bytes += size
+
+    async def close(self) -> None:
+        for task in list(self.pending.values()):
+            task.cancel()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def localize(self, payload: dict, deadline: float) -> dict:
+        """Return ``payload`` with every URL-only image swapped for a local cached path."""
+        localized = dict(payload)
+        for url_field, path_field in URL_FIELDS.items():
+            url = localized.pop(url_field, None)
+            if url and not localized.get(path_field):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise AnalysisError(504, "Analysis deadline exceeded")
+                try:
+                    localized[path_field] = await asyncio.wait_for(self.fetch(url), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise AnalysisError(504, "Analysis deadline exceeded") from None
+        return localized
+
+    async def fetch(self, url: str) -> str:
+        if urlparse(url).scheme not in {"http", "https"}:
+            raise AnalysisError(400, "Only http/https image URLs are supported")
+        task = self.pending.get(url)
+        if task is None:
+            # The download is owned by the fetcher, not by the request that started it, so
+            # one caller hitting its deadline does not cancel it for the others.
+            task = asyncio.create_task(self._fetch(url))
+            task.add_done_callback(lambda done: self._fetch_done(url, done))
+            self.pending[url] = task
+        self.waiters[url] = self.waiters.get(url, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.waiters[url] -= 1
+            if not self.waiters[url]:
+                del self.waiters[url]
+                if not task.done():
+                    task.cancel()
+
+    def _fetch_done(self, url: str, task: asyncio.Task[str]) -> None:
+        if self.pending.get(url) is task:
+            del self.pending[url]
+        if not task.cancelled():
+            # Waiters see the error; this only keeps an unawaited failure from being logged.
+            task.exception()
+
+    async def _fetch(self, url: str) -> str:
+        if self.client is None:
+            raise RuntimeError("Image fetcher not started")
+        key = hashlib.sha256(url.encode()).hexdigest()
+        path = os.path.join(_fetch_root(), f"{key}.img")
+        meta_path = os.path.join(_fetch_root(), f"{key}.json")
+        meta = self._read_meta(meta_path) if path in self.entries else None
+
+        headers = {}
+        if meta is not None:
+            if time.time() - meta["fetched_at"] < settings.fetch_fresh_s:
+                self.hits += 1
+                self.entries.move_to_end(path)
+                return path
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+
+        max_bytes = settings.fetch_max_mb * 1024 * 1024
+        tmp = f"{path}.{uuid4().hex}.tmp"
+        try:
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and meta is not None:
+                    self.revalidated += 1
+                    self._write_meta(meta_path, meta.get("etag"))
+                    self.entries.move_to_end(path)
+                    return path
+                if response.status_code == 404:
+                    raise AnalysisError(404, "Image URL not found")
+                if response.status_code >= 400:
+                    raise AnalysisError(502, f"Image URL returned {response.status_code}")
+
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > max_bytes:
+                    raise self._too_large()
+                size = 0
+                with open(tmp, "wb") as out:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise self._too_large()
+                        out.write(chunk)
+                etag = response.headers.get("etag")
+                if size == 0:
+                    raise AnalysisError(400, "Image URL returned an empty body")
+        except BaseException as exc:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if isinstance(exc, httpx.TimeoutException):
+                raise AnalysisError(504, "Image URL timed out") from None
+            if isinstance(exc, httpx.HTTPError):
+                raise AnalysisError(502, f"Image URL fetch failed: {exc.__class__.__name__}") from None
+            raise
+
+        os.replace(tmp, path)
+        self._write_meta(meta_path, etag)
+        self.fetched += 1
+        self.total_bytes += size - self.entries.pop(path, 0)
+        self.entries[path] = size
+        self._evict()
+        return path
+
+    def _too_large(self) -> AnalysisError:
+        self.rejected_too_large += 1
+        return AnalysisError(413, f"Image URL larger than {settings.fetch_max_mb}MB")
+
+    @staticmethod
+    def _read_meta(meta_path: str) -> dict | None:
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(meta_path: str, etag: str | None) -> None:
+        with open(meta_path, "w") as f:
+            json.dump({"etag": etag, "fetched_at": time.time()}, f)
+
+    def _evict(self) -> None:
+        cap = settings.fetch_cache_mb * 1024 * 1024
+        # Keep the newest entry even over the cap: a worker is about to read it.
+        while self.total_bytes > cap and len(self.entries) > 1:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            for victim in (path, f"{path[:-4]}.json"):
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "fetched": self.fetched,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "rejected_too_large": self.rejected_too_large,
+        }
+
+
+image_fetcher = ImageFetcher()
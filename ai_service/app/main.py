@@ -1,178 +1,157 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Literal
-from urllib.parse import urlparse
-from urllib.request import urlopen
-
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from PIL import Image, ImageChops, ImageFilter, ImageStat
-
-
-app = FastAPI(title="Trashio AI Service", version="0.1.0")
-
-
-Decision = Literal["approve", "reject"]
-VerificationDecision = Literal["accept", "reclean", "reject"]
-Priority = Literal["Low", "Medium", "High"]
-
-
-class BeforeAnalyzeRequest(BaseModel):
-    report_id: str
-    image_path: str | None = None
-    image_url: str | None = None
-    lat: float | None = None
-    lng: float | None = None
-
-
-class BeforeAnalyzeResponse(BaseModel):
-    decision: Decision
-    trash_present: bool
-    severity: float
-    priority: Priority
-    confidence: float
-    reason: str | None = None
-    image_hash: str | None = None
-    flags: list[str] = Field(default_factory=list)
-    model_version: str = "heuristic-v1"
-
-
-class AfterAnalyzeRequest(BaseModel):
-    report_id: str
-    before_image_path: str | None = None
-    after_image_path: str | None = None
-    before_image_url: str | None = None
-    after_image_url: str | None = None
-
-
-class AfterAnalyzeResponse(BaseModel):
-    decision: VerificationDecision
-    cleaned: bool
-    confidence: float
-    before_image_hash: str | None = None
-    after_image_hash: str | None = None
-    diff_score: float
-    after_trash_score: float
-    flags: list[str] = Field(default_factory=list)
-    model_version: str = "heuristic-v1"
-
-
-@dataclass
-class ImageScores:
-    trash_score: float
-    edge_mean: float
-    grayscale_std: float
-
-
-def _load_image(image_path: str | None, image_url: str | None) -> Image.Image:
-    if image_path:
-        path = Path(image_path)
-        if not path.exists():
-            raise HTTPException(status_code=404, detail="Image path not found")
-        return Image.open(path)
-    if image_url:
-        parsed = urlparse(image_url)
-        if parsed.scheme not in {"http", "https"}:
-            raise HTTPException(status_code=400, detail="Only http/https image URLs are supported")
-        with urlopen(image_url) as response:  # nosec - controlled by service deployment
-            return Image.open(response)
-    raise HTTPException(status_code=400, detail="Missing image_path or image_url")
-
-
-def _ahash(image: Image.Image, size: int = 8) -> str:
-    image = image.convert("L").resize((size, size))
-    pixels = list(image.getdata())
-    avg = sum(pixels) / len(pixels)
-    bits = "".join("1" if pixel >= avg else "0" for pixel in pixels)
-    return f"{int(bits, 2):0{size * size // 4}x}"
-
-
-def _trash_scores(image: Image.Image) -> ImageScores:
-    grayscale = image.convert("L")
-    edge = grayscale.filter(ImageFilter.FIND_EDGES)
-    edge_mean = ImageStat.Stat(edge).mean[0]
-    grayscale_std = ImageStat.Stat(grayscale).stddev[0]
-    trash_score = min(1.0, (edge_mean / 255) * 0.7 + (grayscale_std / 128) * 0.3)
-    return ImageScores(trash_score=trash_score, edge_mean=edge_mean, grayscale_std=grayscale_std)
-
-
-def _priority_from_severity(severity: float) -> Priority:
-    if severity >= 0.7:
-        return "High"
-    if severity >= 0.45:
-        return "Medium"
-    return "Low"
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from .analysis import AnalysisError, run_after_batch_job, run_after_job, run_before_batch_job, run_before_job
+from .cache import cache_index
+from .config import settings
+from .fetch import image_fetcher
+from .detectors import detector_version
+from .pool import MicroBatcher, PoolSaturated, analysis_pool
+from .schemas import (
+    AfterAnalyzeRequest,
+    AfterAnalyzeResponse,
+    AfterBatchItem,
+    AfterBatchRequest,
+    AfterBatchResponse,
+    BeforeAnalyzeRequest,
+    BeforeAnalyzeResponse,
+    BeforeBatchItem,
+    BeforeBatchRequest,
+    BeforeBatchResponse,
+)
+
+DEADLINE_HEADER = "x-request-timeout"
+NDJSON = "application/x-ndjson"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    analysis_pool.start()
+    await analysis_pool.warm_up()
+    image_fetcher.start()
+    yield
+    await image_fetcher.close()
+    await before_batcher.close()
+    await after_batcher.close()
+    analysis_pool.close()
+
+
+app = FastAPI(title="Trashio AI Service", version="0.1.0", lifespan=lifespan)
+
+before_batcher = MicroBatcher(analysis_pool, run_before_job, run_before_batch_job)
+after_batcher = MicroBatcher(analysis_pool, run_after_job, run_after_batch_job)
+
+
+def _request_deadline(request: Request, budget: float | None = None) -> float:
+    # Callers send their own timeout so we stop working on requests they have given up on.
+    budget = budget or settings.default_deadline_s
+    raw = request.headers.get(DEADLINE_HEADER)
+    if raw:
+        try:
+            budget = min(budget, float(raw))
+        except ValueError:
+            pass
+    return time.time() + budget
+
+
+def _saturated() -> HTTPException:
+    return HTTPException(status_code=503, detail="Analysis queue full", headers={"Retry-After": "1"})
+
+
+async def _run(batcher: MicroBatcher, payload: dict, request: Request) -> dict:
+    deadline = _request_deadline(request)
+    try:
+        analysis_pool.admit()
+        payload = await image_fetcher.localize(payload, deadline)
+        return await batcher.submit(payload, deadline)
+    except PoolSaturated:
+        raise _saturated()
+    except AnalysisError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+async def _run_batch(job, items: list, item_model: type, request: Request):
+    if len(items) > settings.max_batch_items:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Max {settings.max_batch_items} items.")
+    try:
+        analysis_pool.admit()
+    except PoolSaturated:
+        raise _saturated()
+
+    deadline = _request_deadline(request, settings.batch_deadline_s)
+    localized = await asyncio.gather(
+        *(image_fetcher.localize(item.model_dump(), deadline) for item in items),
+        return_exceptions=True,
+    )
+    ready = [(index, payload) for index, payload in enumerate(localized) if isinstance(payload, dict)]
+
+    async def outcomes():
+        for index, payload in enumerate(localized):
+            if isinstance(payload, AnalysisError):
+                yield index, {"error": {"status_code": payload.status_code, "detail": payload.detail}}
+            elif isinstance(payload, BaseException):
+                yield index, {"error": {"status_code": 502, "detail": f"Image fetch failed: {payload}"}}
+        if ready:
+            batch = analysis_pool.map_batch(job, [payload for _, payload in ready], deadline, settings.batch_chunk_size)
+            async for position, outcome in batch:
+                yield ready[position][0], outcome
+
+    def to_item(index: int, outcome: dict):
+        return item_model(index=index, report_id=items[index].report_id, **outcome)
+
+    if NDJSON in request.headers.get("accept", ""):
+        # Streamed in completion order; each line carries its input index.
+        async def lines():
+            async for index, outcome in outcomes():
+                yield to_item(index, outcome).model_dump_json() + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON)
+
+    collected = [to_item(index, outcome) async for index, outcome in outcomes()]
+    collected.sort(key=lambda item: item.index)
+    failed = sum(1 for item in collected if item.error is not None)
+    return {"items": collected, "succeeded": len(collected) - failed, "failed": failed}
+
 
+@app.get("/health")
+async def health() -> dict:
+    return {"ok": True, "model_version": detector_version()}
 
-def _normalized_diff(before: Image.Image, after: Image.Image) -> float:
-    before_small = before.convert("RGB").resize((256, 256))
-    after_small = after.convert("RGB").resize((256, 256))
-    diff = ImageChops.difference(before_small, after_small)
-    diff_mean = ImageStat.Stat(diff).mean
-    return min(1.0, sum(diff_mean) / (255 * 3))
+
+@app.get("/metrics")
+async def metrics() -> dict:
+    return {
+        "model_version": detector_version(),
+        "pool": analysis_pool.metrics(),
+        "microbatch": {"before": before_batcher.metrics(), "after": after_batcher.metrics()},
+        "cache": cache_index.metrics(),
+        "fetch": image_fetcher.metrics(),
+    }
 
 
 @app.post("/analyze/before", response_model=BeforeAnalyzeResponse)
-async def analyze_before(payload: BeforeAnalyzeRequest) -> BeforeAnalyzeResponse:
-    image = _load_image(payload.image_path, payload.image_url)
-    image = image.convert("RGB")
-    scores = _trash_scores(image)
-    trash_present = scores.trash_score >= 0.35
-    severity = scores.trash_score
-    priority = _priority_from_severity(severity)
-    decision: Decision = "approve" if trash_present else "reject"
-    confidence = min(0.99, 0.55 + abs(scores.trash_score - 0.35))
-    reason = None if trash_present else "No trash detected"
-
-    return BeforeAnalyzeResponse(
-        decision=decision,
-        trash_present=trash_present,
-        severity=round(severity, 4),
-        priority=priority,
-        confidence=round(confidence, 4),
-        reason=reason,
-        image_hash=_ahash(image),
-        flags=[],
-    )
+async def analyze_before(payload: BeforeAnalyzeRequest, request: Request) -> BeforeAnalyzeResponse:
+    result = await _run(before_batcher, payload.model_dump(), request)
+    return BeforeAnalyzeResponse(**result)
 
 
 @app.post("/analyze/after", response_model=AfterAnalyzeResponse)
-async def analyze_after(payload: AfterAnalyzeRequest) -> AfterAnalyzeResponse:
-    before = _load_image(payload.before_image_path, payload.before_image_url)
-    after = _load_image(payload.after_image_path, payload.after_image_url)
-
-    before = before.convert("RGB")
-    after = after.convert("RGB")
-
-    diff_score = _normalized_diff(before, after)
-    after_scores = _trash_scores(after)
-
-    flags: list[str] = []
-    if diff_score < 0.08:
-        flags.append("low_change_detected")
-
-    if after_scores.trash_score < 0.25 and diff_score >= 0.12:
-        decision: VerificationDecision = "accept"
-        cleaned = True
-        confidence = min(0.99, 0.6 + diff_score)
-    elif after_scores.trash_score < 0.45:
-        decision = "reclean"
-        cleaned = False
-        confidence = 0.55
-    else:
-        decision = "reject"
-        cleaned = False
-        confidence = 0.7
-
-    return AfterAnalyzeResponse(
-        decision=decision,
-        cleaned=cleaned,
-        confidence=round(confidence, 4),
-        before_image_hash=_ahash(before),
-        after_image_hash=_ahash(after),
-        diff_score=round(diff_score, 4),
-        after_trash_score=round(after_scores.trash_score, 4),
-        flags=flags,
-    )
+async def analyze_after(payload: AfterAnalyzeRequest, request: Request) -> AfterAnalyzeResponse:
+    result = await _run(after_batcher, payload.model_dump(), request)
+    return AfterAnalyzeResponse(**result)
+
+
+@app.post("/analyze/before:batch", response_model=BeforeBatchResponse)
+async def analyze_before_batch(payload: BeforeBatchRequest, request: Request):
+    return await _run_batch(run_before_batch_job, payload.items, BeforeBatchItem, request)
+
+
+@app.post("/analyze/after:batch", response_model=AfterBatchResponse)
+async def analyze_after_batch(payload: AfterBatchRequest, request: Request):
+    return await _run_batch(run_after_batch_job, payload.items, AfterBatchItem, request)
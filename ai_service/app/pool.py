@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable
+
+from .analysis import AnalysisError
+from .cache import cache_index
+from .config import settings
+from .detectors import microbatch_window_s, worker_ready, warm_up_worker
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class AnalysisPool:
+    def __init__(self) -> None:
+        self.executor: ProcessPoolExecutor | None = None
+        self.workers = 0
+        self.capacity = 0
+        self.in_flight = 0
+        self.started_at = time.monotonic()
+        self.busy_seconds = 0.0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.deadline_exceeded = 0
+
+    def start(self) -> None:
+        self.workers = settings.pool_workers
+        self.capacity = self.workers + max(0, settings.queue_size)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up_worker,
+        )
+        cache_index.load()
+        self.started_at = time.monotonic()
+
+    async def warm_up(self) -> None:
+        # One task per worker makes the executor spawn them all now, each loading its
+        # detector in the initializer, instead of on the first real requests.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, worker_ready) for _ in range(self.workers)))
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def admit(self) -> None:
+        if self.executor is None:
+            raise RuntimeError("Analysis pool not started")
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise PoolSaturated()
+
+    def _record(self, stats: dict) -> None:
+        self.busy_seconds += stats.get("busy_seconds", 0.0)
+        cache_index.record(stats)
+
+    async def submit(self, fn: Callable[[dict, float | None], tuple[dict, dict]], payload: dict, deadline: float) -> dict:
+        self.admit()
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self.deadline_exceeded += 1
+            raise AnalysisError(504, "Analysis deadline exceeded")
+
+        self.in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, fn, payload, deadline)
+        try:
+            # On timeout the queued job is cancelled before it reaches a worker; a job that
+            # already started checks the same deadline between images.
+            result, stats = await asyncio.wait_for(future, timeout=remaining)
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise AnalysisError(504, "Analysis deadline exceeded") from None
+        except AnalysisError as exc:
+            if exc.status_code == 504:
+                self.deadline_exceeded += 1
+            else:
+                self.failed += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self._record(stats)
+        return result
+
+    async def map_batch(
+        self,
+        fn: Callable[[list[dict], float | None], tuple[list[dict], dict]],
+        payloads: list[dict],
+        deadline: float,
+        chunk_size: int,
+    ) -> AsyncIterator[tuple[int, dict]]:
+        # Yields (index, outcome) in completion order. Call admit() first: a batch is admitted
+        # as a whole, and never holds more than one chunk per worker so single requests get a slot.
+        assert self.executor is not None
+        loop = asyncio.get_running_loop()
+        size = max(1, chunk_size)
+        chunks = [(start, payloads[start : start + size]) for start in range(0, len(payloads), size)]
+        chunks.reverse()
+        pending: dict[asyncio.Future, tuple[int, int]] = {}
+        try:
+            while chunks or pending:
+                while chunks and len(pending) < max(1, self.workers):
+                    start, chunk = chunks.pop()
+                    self.in_flight += 1
+                    pending[loop.run_in_executor(self.executor, fn, chunk, deadline)] = (start, len(chunk))
+
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, deadline - time.time()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+
+                for future in done:
+                    start, count = pending.pop(future)
+                    self.in_flight -= 1
+                    try:
+                        outcomes, stats = future.result()
+                    except Exception as exc:
+                        outcomes, stats = [{"error": {"status_code": 500, "detail": f"Analysis worker failed: {exc}"}}] * count, {}
+                    self._record(stats)
+                    for offset, outcome in enumerate(outcomes):
+                        self._count(outcome)
+                        yield start + offset, outcome
+
+            # Deadline passed: whatever has not finished is reported, not silently dropped.
+            expired = {"error": {"status_code": 504, "detail": "Analysis deadline exceeded"}}
+            for start, count in list(pending.values()) + [(start, len(chunk)) for start, chunk in chunks]:
+                for offset in range(count):
+                    self._count(expired)
+                    yield start + offset, expired
+        finally:
+            for future in pending:
+                future.cancel()
+            self.in_flight -= len(pending)
+
+    def _count(self, outcome: dict) -> None:
+        error = outcome.get("error")
+        if error is None:
+            self.completed += 1
+        elif error["status_code"] == 504:
+            self.deadline_exceeded += 1
+        else:
+            self.failed += 1
+
+    def metrics(self) -> dict[str, Any]:
+        uptime = max(1e-9, time.monotonic() - self.started_at)
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "deadline_exceeded": self.deadline_exceeded,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(min(1.0, self.busy_seconds / (uptime * max(1, self.workers))), 4),
+            "uptime_seconds": round(uptime, 1),
+        }
+
+
+# Each request is admitted and counted in pool.in_flight on its own; the batch job holds one
+# more slot while it runs, so it still counts after its waiters time out.
+class MicroBatcher:
+    def __init__(self, pool: AnalysisPool, single_job: Callable, batch_job: Callable) -> None:
+        self.pool = pool
+        self.single_job = single_job
+        self.batch_job = batch_job
+        self.pending: list[tuple[dict, float, asyncio.Future[dict]]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        # The loop only holds weak references to tasks; a batch must not vanish mid-flight.
+        self.tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_items = 0
+
+    async def submit(self, payload: dict, deadline: float) -> dict:
+        window = microbatch_window_s()
+        if window <= 0:
+            return await self.pool.submit(self.single_job, payload, deadline)
+
+        self.pool.admit()
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[dict] = loop.create_future()
+        self.pending.append((payload, deadline, future))
+        self.pool.in_flight += 1
+        if len(self.pending) >= settings.microbatch_max:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(window, self._flush)
+
+        try:
+            outcome = await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, deadline - time.time()))
+        except asyncio.TimeoutError:
+            self.pool.deadline_exceeded += 1
+            raise AnalysisError(504, "Analysis deadline exceeded") from None
+        finally:
+            self.pool.in_flight -= 1
+
+        self.pool._count(outcome)
+        error = outcome.get("error")
+        if error is not None:
+            raise AnalysisError(error["status_code"], error["detail"])
+        return outcome["result"]
+
+    def _flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def close(self) -> None:
+        # Run whatever is still waiting for its window, then let every batch finish.
+        self._flush()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _run(self, batch: list[tuple[dict, float, asyncio.Future[dict]]]) -> None:
+        self.batches += 1
+        self.batched_items += len(batch)
+        payloads = [payload for payload, _, _ in batch]
+        deadline = max(deadline for _, deadline, _ in batch)
+        self.pool.in_flight += 1
+        try:
+            outcomes, stats = await asyncio.get_running_loop().run_in_executor(self.pool.executor, self.batch_job, payloads, deadline)
+            self.pool._record(stats)
+        except Exception as exc:
+            outcomes = [{"error": {"status_code": 500, "detail": f"Analysis worker failed: {exc}"}}] * len(batch)
+        finally:
+            self.pool.in_flight -= 1
+        for (_, _, future), outcome in zip(batch, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "window_ms": round(microbatch_window_s() * 1000, 3),
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+analysis_pool = AnalysisPool()
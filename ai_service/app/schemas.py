@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from .features import MODEL_VERSION
+
+Decision = Literal["approve", "reject"]
+VerificationDecision = Literal["accept", "reclean", "reject"]
+Priority = Literal["Low", "Medium", "High"]
+
+
+class BeforeAnalyzeRequest(BaseModel):
+    report_id: str
+    image_path: str | None = None
+    image_url: str | None = None
+    lat: float | None = None
+    lng: float | None = None
+
+
+class BeforeAnalyzeResponse(BaseModel):
+    decision: Decision
+    trash_present: bool
+    severity: float
+    priority: Priority
+    confidence: float
+    reason: str | None = None
+    image_hash: str | None = None
+    flags: list[str] = Field(default_factory=list)
+    model_version: str = MODEL_VERSION
+
+
+class AfterAnalyzeRequest(BaseModel):
+    report_id: str
+    before_image_path: str | None = None
+    after_image_path: str | None = None
+    before_image_url: str | None = None
+    after_image_url: str | None = None
+
+
+class AfterAnalyzeResponse(BaseModel):
+    decision: VerificationDecision
+    cleaned: bool
+    confidence: float
+    before_image_hash: str | None = None
+    after_image_hash: str | None = None
+    diff_score: float
+    after_trash_score: float
+    flags: list[str] = Field(default_factory=list)
+    model_version: str = MODEL_VERSION
+
+
+class BatchItemError(BaseModel):
+    status_code: int
+    detail: str
+
+
+class BeforeBatchRequest(BaseModel):
+    items: list[BeforeAnalyzeRequest] = Field(min_length=1)
+
+
+class BeforeBatchItem(BaseModel):
+    index: int
+    report_id: str
+    result: BeforeAnalyzeResponse | None = None
+    error: BatchItemError | None = None
+
+
+class BeforeBatchResponse(BaseModel):
+    items: list[BeforeBatchItem]
+    succeeded: int
+    failed: int
+
+
+class AfterBatchRequest(BaseModel):
+    items: list[AfterAnalyzeRequest] = Field(min_length=1)
+
+
+class AfterBatchItem(BaseModel):
+    index: int
+    report_id: str
+    result: AfterAnalyzeResponse | None = None
+    error: BatchItemError | None = None
+
+
+class AfterBatchResponse(BaseModel):
+    items: list[AfterBatchItem]
+    succeeded: int
+    failed: int
@@ -0,0 +1,188 @@
+"""Parity and throughput of the NumPy feature engine against the heuristic-v1 Pillow passes.
+
+Run from the ai_service directory:
+
+    python -m benchmarks.features --repeat 5
+
+Parity is checked two ways: at full resolution (the engine must reproduce the
+legacy numbers exactly) and at the capped analysis resolution used in
+production (scores may drift slightly; decisions are compared). The
+"debris" scenes put dense high-contrast litter on a gravel texture so their
+scores land around and above the 0.35 trash threshold, where a drift can flip
+a decision; ``decision_mismatches`` counts those flips.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.features import ANALYSIS_MAX_PX, decode_for_analysis, extract_features, normalized_diff
+from benchmarks import legacy_heuristics as legacy
+
+# analysis._before_verdict's trash_present cut-off.
+TRASH_THRESHOLD = 0.35
+# Debris density per parity scene: near the threshold, and clearly above it.
+DEBRIS_DENSITIES = {"debris-edge": 0.8, "debris": 1.0, "debris-heavy": 1.5}
+
+SIZES = {
+    "1MP": (1152, 864),
+    "4MP": (2304, 1728),
+    "12MP": (4000, 3000),
+}
+
+
+def synthetic_scene(width: int, height: int, clutter: int, seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    base = np.linspace(90, 170, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    noise = rng.normal(0, 6, size=(height, width)).astype(np.float32)
+    gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+    image = Image.merge("RGB", [Image.fromarray(gray)] * 3)
+    draw = ImageDraw.Draw(image)
+    for _ in range(clutter):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(width // 80, width // 12)), int(rng.integers(height // 80, height // 12))
+        color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+        if rng.random() < 0.5:
+            draw.rectangle((x, y, x + w, y + h), fill=color)
+        else:
+            draw.ellipse((x, y, x + w, y + h), outline=color, width=max(1, w // 10))
+    return image.filter(ImageFilter.SMOOTH) if clutter == 0 else image
+
+
+def debris_scene(width: int, height: int, density: float, seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    # Gravel-like grain, its contrast scaled by density, with litter strokes on top.
+    grain = max(1, width // 600)
+    noise = rng.integers(0, 256, size=(height // grain, width // grain), dtype=np.uint8)
+    gray = np.asarray(Image.fromarray(noise).resize((width, height), Image.Resampling.NEAREST), dtype=np.float32)
+    base = np.clip(128 + (gray - 128) * density, 0, 255).astype(np.uint8)
+    image = Image.merge("RGB", [Image.fromarray(base)] * 3)
+    draw = ImageDraw.Draw(image)
+    for _ in range(int(3000 * density)):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        reach = int(rng.integers(width // 200, width // 40))
+        end = (x + int(rng.integers(-reach, reach)), y + int(rng.integers(-reach, reach)))
+        color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+        draw.line((x, y, *end), fill=color, width=max(1, width // 800))
+    return image
+
+
+def encode(image: Image.Image) -> bytes:
+    buf = BytesIO()
+    image.save(buf, format="JPEG", quality=88)
+    return buf.getvalue()
+
+
+def legacy_before(data: bytes) -> tuple[float, str]:
+    image = Image.open(BytesIO(data)).convert("RGB")
+    return legacy.trash_scores(image).trash_score, legacy.ahash(image)
+
+
+def engine_before(data: bytes) -> tuple[float, str]:
+    features = extract_features(decode_for_analysis(BytesIO(data)))
+    return features.trash_score, features.ahash
+
+
+def legacy_after(before: bytes, after: bytes) -> tuple[float, float]:
+    b = Image.open(BytesIO(before)).convert("RGB")
+    a = Image.open(BytesIO(after)).convert("RGB")
+    legacy.ahash(b)
+    legacy.ahash(a)
+    return legacy.normalized_diff(b, a), legacy.trash_scores(a).trash_score
+
+
+def engine_after(before: bytes, after: bytes) -> tuple[float, float]:
+    b = extract_features(decode_for_analysis(BytesIO(before)))
+    a = extract_features(decode_for_analysis(BytesIO(after)))
+    return normalized_diff(b, a), a.trash_score
+
+
+def _bit_distance(left: str, right: str) -> int:
+    return bin(int(left, 16) ^ int(right, 16)).count("1")
+
+
+def parity(images: dict[str, Image.Image]) -> dict:
+    exact = []
+    capped = []
+    for name, image in images.items():
+        reference = legacy.trash_scores(image)
+        full = extract_features(image)
+        exact.append(
+            {
+                "image": name,
+                "edge_mean_delta": abs(full.edge_mean - reference.edge_mean),
+                "std_delta": abs(full.grayscale_std - reference.grayscale_std),
+                "ahash_equal": full.ahash == legacy.ahash(image),
+            }
+        )
+
+        small = extract_features(decode_for_analysis(image.copy(), ANALYSIS_MAX_PX))
+        capped.append(
+            {
+                "image": name,
+                "legacy_score": round(reference.trash_score, 4),
+                "engine_score": round(small.trash_score, 4),
+                "legacy_trash": reference.trash_score >= TRASH_THRESHOLD,
+                "same_decision": (reference.trash_score >= TRASH_THRESHOLD) == (small.trash_score >= TRASH_THRESHOLD),
+                "ahash_bit_distance": _bit_distance(small.ahash, legacy.ahash(image)),
+            }
+        )
+    summary = {
+        "scenes": len(capped),
+        "legacy_trash": sum(row["legacy_trash"] for row in capped),
+        "decision_mismatches": [row["image"] for row in capped if not row["same_decision"]],
+    }
+    return {"summary": summary, "full_resolution": exact, "analysis_resolution": capped}
+
+
+def throughput(fn, args: tuple, repeat: int) -> float:
+    fn(*args)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return repeat / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results: dict = {"analysis_max_px": ANALYSIS_MAX_PX, "throughput": []}
+    parity_images: dict[str, Image.Image] = {}
+    for label, (width, height) in SIZES.items():
+        clean = synthetic_scene(width, height, clutter=0, seed=1)
+        cluttered = synthetic_scene(width, height, clutter=400, seed=2)
+        parity_images[f"{label}-clean"] = clean
+        parity_images[f"{label}-cluttered"] = cluttered
+        for name, density in DEBRIS_DENSITIES.items():
+            parity_images[f"{label}-{name}"] = debris_scene(width, height, density, seed=3)
+        before, after = encode(cluttered), encode(clean)
+
+        legacy_b = throughput(legacy_before, (before,), args.repeat)
+        engine_b = throughput(engine_before, (before,), args.repeat)
+        legacy_a = throughput(legacy_after, (before, after), args.repeat)
+        engine_a = throughput(engine_after, (before, after), args.repeat)
+        results["throughput"].append(
+            {
+                "size": label,
+                "before_legacy_per_s": round(legacy_b, 2),
+                "before_engine_per_s": round(engine_b, 2),
+                "before_speedup": round(engine_b / legacy_b, 2),
+                "after_legacy_per_s": round(legacy_a, 2),
+                "after_engine_per_s": round(engine_a, 2),
+                "after_speedup": round(engine_a / legacy_a, 2),
+            }
+        )
+
+    results["parity"] = parity(parity_images)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Reference copy of the heuristic-v1 Pillow implementation, kept for parity checks."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+
+@dataclass
+class ImageScores:
+    trash_score: float
+    edge_mean: float
+    grayscale_std: float
+
+
+def ahash(image: Image.Image, size: int = 8) -> str:
+    image = image.convert("L").resize((size, size))
+    pixels = list(image.getdata())
+    avg = sum(pixels) / len(pixels)
+    bits = "".join("1" if pixel >= avg else "0" for pixel in pixels)
+    return f"{int(bits, 2):0{size * size // 4}x}"
+
+
+def trash_scores(image: Image.Image) -> ImageScores:
+    grayscale = image.convert("L")
+    edge = grayscale.filter(ImageFilter.FIND_EDGES)
+    edge_mean = ImageStat.Stat(edge).mean[0]
+    grayscale_std = ImageStat.Stat(grayscale).stddev[0]
+    trash_score = min(1.0, (edge_mean / 255) * 0.7 + (grayscale_std / 128) * 0.3)
+    return ImageScores(trash_score=trash_score, edge_mean=edge_mean, grayscale_std=grayscale_std)
+
+
+def normalized_diff(before: Image.Image, after: Image.Image) -> float:
+    before_small = before.convert("RGB").resize((256, 256))
+    after_small = after.convert("RGB").resize((256, 256))
+    diff = ImageChops.difference(before_small, after_small)
+    diff_mean = ImageStat.Stat(diff).mean
+    return min(1.0, sum(diff_mean) / (255 * 3))
@@ -0,0 +1,239 @@
+"""Load test for /analyze/before and /analyze/after on a synthetic image corpus.
+
+Run from the ai_service directory:
+
+    python -m benchmarks.load --requests 200 --concurrency 8 --output load.json
+
+The corpus (clean and cluttered street scenes at several resolutions, saved as
+JPEG/PNG/WebP) is generated locally, so no network is needed. By default the
+service runs in this process through its ASGI app, including its analysis
+pool, and the report covers latency percentiles, images/sec, CPU per image and
+peak RSS of the service and its workers. ``--url`` points the same load at an
+already running service that can read the corpus directory; CPU and memory
+are then not reported.
+
+The feature cache is disabled unless ``--cache`` is given, so every request
+pays for a decode.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmarks.features import synthetic_scene
+
+KINDS = {"clean": 0, "cluttered": 400}
+FORMATS = {"jpeg": ("jpg", {"quality": 88}), "png": ("png", {}), "webp": ("webp", {"quality": 80})}
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _write_scene(path: str, width: int, height: int, clutter: int, seed: int, fmt: str) -> str:
+    if os.path.exists(path):
+        return path
+    _, options = FORMATS[fmt]
+    synthetic_scene(width, height, clutter, seed).save(path, format=fmt.upper(), **options)
+    return path
+
+
+def build_corpus(root: str, resolutions: list[tuple[int, int]], formats: list[str]) -> dict[str, list[str]]:
+    jobs = []
+    for width, height in resolutions:
+        for fmt in formats:
+            ext, _ = FORMATS[fmt]
+            for kind, clutter in KINDS.items():
+                path = os.path.join(root, f"{kind}_{width}x{height}.{ext}")
+                jobs.append((kind, (path, width, height, clutter, width + height, fmt)))
+    # Generated in a child process so it does not inflate this process's peak RSS.
+    corpus: dict[str, list[str]] = {kind: [] for kind in KINDS}
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1), mp_context=context) as executor:
+        futures = [(kind, executor.submit(_write_scene, *args)) for kind, args in jobs]
+        for kind, future in futures:
+            corpus[kind].append(future.result())
+    return corpus
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _proc_status_kb(pid: int | str, field: str) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _proc_cpu_s(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def _self_cpu_s() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _payloads(endpoint: str, corpus: dict[str, list[str]], count: int) -> list[dict]:
+    payloads = []
+    for i in range(count):
+        if endpoint == "before":
+            images = corpus["cluttered"] + corpus["clean"]
+            payloads.append({"report_id": f"load-{i}", "image_path": images[i % len(images)]})
+        else:
+            pair = i % len(corpus["clean"])
+            payloads.append(
+                {
+                    "report_id": f"load-{i}",
+                    "before_image_path": corpus["cluttered"][pair],
+                    "after_image_path": corpus["clean"][pair],
+                }
+            )
+    return payloads
+
+
+async def _drive(client: httpx.AsyncClient, endpoint: str, payloads: list[dict], concurrency: int) -> dict:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    queue = list(reversed(payloads))
+
+    async def worker() -> None:
+        while queue:
+            payload = queue.pop()
+            started = time.perf_counter()
+            response = await client.post(f"/analyze/{endpoint}", json=payload)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    images = len(payloads) * (1 if endpoint == "before" else 2)
+    return {
+        "endpoint": f"/analyze/{endpoint}",
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "wall_s": round(wall, 3),
+        "images_per_s": round(images / wall, 2),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p95": round(_percentile(latencies, 95), 2),
+            "p99": round(_percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+        },
+        "images": images,
+    }
+
+
+async def _run_local(args, corpus: dict[str, list[str]]) -> tuple[list[dict], dict]:
+    from app.detectors import detector_version
+    from app.main import app, lifespan
+    from app.pool import analysis_pool
+
+    results = []
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+            for endpoint in args.endpoints.split(","):
+                # Warm-up spawns the workers and loads the code paths; it is not measured.
+                await _drive(client, endpoint, _payloads(endpoint, corpus, args.warmup), args.concurrency)
+                workers = list(analysis_pool.executor._processes)  # type: ignore[union-attr]
+                cpu_before = _self_cpu_s(), sum(_proc_cpu_s(pid) for pid in workers)
+                result = await _drive(client, endpoint, _payloads(endpoint, corpus, args.requests), args.concurrency)
+                cpu_after = _self_cpu_s(), sum(_proc_cpu_s(pid) for pid in workers)
+                result["cpu_ms_per_image"] = {
+                    # The service process also runs the load generator, so this is an upper bound.
+                    "service": round((cpu_after[0] - cpu_before[0]) * 1000 / result["images"], 2),
+                    "workers": round((cpu_after[1] - cpu_before[1]) * 1000 / result["images"], 2),
+                }
+                results.append(result)
+        worker_peaks = [_proc_status_kb(pid, "VmHWM") or 0 for pid in analysis_pool.executor._processes]  # type: ignore[union-attr]
+        service = {
+            "model_version": detector_version(),
+            "workers": analysis_pool.workers,
+            "peak_rss_mb": {
+                "service": round((_proc_status_kb("self", "VmHWM") or 0) / 1024, 1),
+                "worker_max": round(max(worker_peaks, default=0) / 1024, 1),
+                "workers_total": round(sum(worker_peaks) / 1024, 1),
+            },
+        }
+    return results, service
+
+
+async def _run_remote(args, corpus: dict[str, list[str]]) -> tuple[list[dict], dict]:
+    results = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        for endpoint in args.endpoints.split(","):
+            await _drive(client, endpoint, _payloads(endpoint, corpus, args.warmup), args.concurrency)
+            results.append(await _drive(client, endpoint, _payloads(endpoint, corpus, args.requests), args.concurrency))
+    return results, {"url": args.url}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", default="before,after")
+    parser.add_argument("--resolutions", default="1024x768,2048x1536,4000x3000")
+    parser.add_argument("--formats", default="jpeg,png,webp")
+    parser.add_argument("--corpus-dir", help="reuse or keep the generated corpus here")
+    parser.add_argument("--url", help="load an already running service instead of an in-process one")
+    parser.add_argument("--cache", action="store_true", help="leave the feature cache enabled")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if not args.cache:
+            os.environ["AI_CACHE_MB"] = "0"
+        os.environ.setdefault("AI_CACHE_DIR", os.path.join(scratch, "cache"))
+        corpus_dir = args.corpus_dir or os.path.join(scratch, "corpus")
+        os.makedirs(corpus_dir, exist_ok=True)
+        resolutions = [tuple(int(v) for v in item.split("x")) for item in args.resolutions.split(",")]
+        corpus = build_corpus(corpus_dir, resolutions, args.formats.split(","))
+
+        runner = _run_remote if args.url else _run_local
+        results, service = await runner(args, corpus)
+
+    report = {
+        "service": service,
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "resolutions": args.resolutions,
+            "formats": args.formats,
+            "feature_cache": args.cache,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
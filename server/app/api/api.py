@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from fastapi import APIRouter
 
-from app.api.routes import admin, auth, cleaner, reports, users
+from app.api.routes import admin, auth, cleaner, reports, uploads, users
 
 api_router = APIRouter()
 
@@ -11,3 +11,4 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(reports.router, prefix="/reports", tags=["reports"])
 api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
 api_router.include_router(cleaner.router, prefix="/cleaner", tags=["cleaner"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
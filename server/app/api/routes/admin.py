@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import UTC, datetime
 
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel, Field, EmailStr
 
 from app.api.deps import DB, require_role
@@ -11,6 +11,15 @@ from app.core.security import hash_password
 from app.models.common import MongoModel
 from app.models.user import UserCreate, UserPublic, user_doc_from_create
 from app.models.report import ReportPublic, ReportStatus
+from app.services.ai_client import ai_client
+from app.services.ai_reconciler import reconcile_reports
+from app.services.assignment import move_task, recount_open_tasks, release_task, reserve_cleaner, task_owner
+from app.services.backlog_optimizer import assign_backlog
+from app.services.cleaner_locations import location_buffer
+from app.services.job_queue import job_queue
+from app.services.upload_gc import collect_garbage, compact_uploads
+from app.services.upload_refs import release_report_uploads, release_upload_ref
+from app.utils.image_pool import image_pool_stats
 
 router = APIRouter()
 
@@ -144,29 +153,46 @@ async def assign_cleaner(
     if report["status"] != "Verified":
         raise HTTPException(status_code=409, detail="Only Verified reports can be assigned")
 
-    cleaner = await database.users.find_one({"_id": ObjectId(body.cleaner_id), "role": "cleaner", "is_active": True})
-    if not cleaner:
-        raise HTTPException(status_code=404, detail="Cleaner not found")
+    cleaner_id = ObjectId(body.cleaner_id)
+    if not await reserve_cleaner(database, cleaner_id):
+        if not await database.users.find_one({"_id": cleaner_id, "role": "cleaner", "is_active": True}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Cleaner not found")
+        raise HTTPException(status_code=409, detail="Cleaner has no open task capacity")
 
     admin_id = ObjectId(payload["sub"])
     now = datetime.now(UTC)
 
-    await database.reports.update_one(
-        {"_id": rid},
+    result = await database.reports.update_one(
+        {"_id": rid, "status": "Verified"},
         {
             "$set": {
                 "status": "Assigned",
-                "assigned_cleaner_id": ObjectId(body.cleaner_id),
+                "assigned_cleaner_id": cleaner_id,
                 "assigned_by_admin_id": admin_id,
                 "assigned_at": now,
             }
         },
     )
+    if not result.modified_count:
+        await release_task(database, cleaner_id)
+        raise HTTPException(status_code=409, detail="Only Verified reports can be assigned")
 
     updated = await database.reports.find_one({"_id": rid})
     return ReportPublic(**updated)
 
 
+@router.post("/reports/assign-backlog")
+async def assign_report_backlog(
+    dry_run: bool = False,
+    max_km: float | None = Query(default=None, gt=0),
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    plan = await assign_backlog(database, ObjectId(payload["sub"]), dry_run=dry_run, max_km=max_km)
+    return plan.as_dict()
+
+
 @router.post("/reports/{report_id}/verify-cleaning", response_model=ReportPublic)
 async def verify_cleaning(
     report_id: str,
@@ -197,11 +223,18 @@ async def verify_cleaning(
                 "cleaning_verified_at": now,
                 "rejected_reason": body.reason or "Cleaning rejected by admin",
                 "after_image_url": None,
+                "after_image_thumb_url": None,
                 "cleaned_at": None,
             }
         }
 
-    await database.reports.update_one({"_id": rid}, update)
+    result = await database.reports.update_one({"_id": rid, "status": "Cleaned"}, update)
+    if not result.modified_count:
+        raise HTTPException(status_code=409, detail="Only Cleaned reports can be verified")
+    if body.action == "approve":
+        await release_task(database, report.get("assigned_cleaner_id"))
+    else:
+        await release_upload_ref(database, report.get("after_image_url"), rid)
     updated = await database.reports.find_one({"_id": rid})
     return ReportPublic(**updated)
 
@@ -227,7 +260,9 @@ async def update_report_status(
     if body.status != "Rejected" and report.get("rejected_reason"):
         update["$set"]["rejected_reason"] = None
 
-    await database.reports.update_one({"_id": rid}, update)
+    result = await database.reports.update_one({"_id": rid, "status": report["status"]}, update)
+    if result.modified_count:
+        await move_task(database, report, {**report, "status": body.status})
     updated = await database.reports.find_one({"_id": rid})
     return ReportPublic(**updated)
 
@@ -242,7 +277,74 @@ async def delete_report(
     if not ObjectId.is_valid(report_id):
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid report id")
     rid = ObjectId(report_id)
-    result = await database.reports.delete_one({"_id": rid})
-    if result.deleted_count == 0:
+    report = await database.reports.find_one({"_id": rid})
+    if not report:
         return None
+    result = await database.reports.delete_one({"_id": rid})
+    if result.deleted_count:
+        await release_task(database, task_owner(report))
+    await release_report_uploads(database, report)
     return None
+
+
+@router.post("/maintenance/uploads/gc")
+async def run_upload_gc(
+    dry_run: bool = False,
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    report = await collect_garbage(database, dry_run=dry_run)
+    return report.as_dict()
+
+
+@router.post("/maintenance/uploads/compact")
+async def run_upload_compaction(
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    report = await compact_uploads(database)
+    return report.as_dict()
+
+
+@router.post("/maintenance/ai/reconcile")
+async def run_ai_reconciliation(
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    report = await reconcile_reports(database)
+    return report.as_dict()
+
+
+@router.post("/maintenance/cleaners/recount")
+async def run_open_task_recount(
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    return await recount_open_tasks(database)
+
+
+@router.post("/maintenance/jobs/retry-dead")
+async def retry_dead_jobs(
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    return {"requeued": await job_queue.retry_dead(database)}
+
+
+@router.get("/maintenance/metrics")
+async def runtime_metrics(
+    *,
+    payload: dict = Depends(require_role("admin")),
+    database: DB,
+):
+    return {
+        "image_pool": image_pool_stats(),
+        "ai_client": ai_client.stats(),
+        "jobs": await job_queue.metrics(database),
+        "locations": location_buffer.stats(),
+    }
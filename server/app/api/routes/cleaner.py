@@ -1,18 +1,66 @@
 from __future__ import annotations
 
-from datetime import UTC, datetime
+from itertools import accumulate
 
 from bson import ObjectId
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
 
 from app.api.deps import DB, require_role
-from app.models.report import ReportPublic
-from app.services.ai_workflow import process_cleaning_verification
+from app.models.location import LocationAccepted, LocationBatch, LocationPing
+from app.models.report import CleanerRoute, ReportPublic, RouteStop
+from app.services.cleaner_locations import location_buffer
+from app.services.route_plan import cleaner_route
+from app.services.submissions import check_after_upload_allowed, submit_after_photo
 from app.utils.uploads import save_upload_with_thumbnail
 
 router = APIRouter()
 
 
+@router.post("/location", response_model=LocationAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def ping_location(ping: LocationPing, *, payload: dict = Depends(require_role("cleaner"))):
+    # Buffered in memory and written with the next flush; no database round trip here.
+    accepted = location_buffer.record(ObjectId(payload["sub"]), ping.lat, ping.lng, ping.recorded_at)
+    return LocationAccepted(accepted=int(accepted))
+
+
+@router.post("/location/batch", response_model=LocationAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def ping_locations(batch: LocationBatch, *, payload: dict = Depends(require_role("cleaner"))):
+    cleaner_id = ObjectId(payload["sub"])
+    accepted = sum(location_buffer.record(cleaner_id, p.lat, p.lng, p.recorded_at) for p in batch.points)
+    return LocationAccepted(accepted=accepted)
+
+
+@router.get("/route", response_model=CleanerRoute)
+async def planned_route(
+    lat: float | None = Query(default=None, ge=-90, le=90),
+    lng: float | None = Query(default=None, ge=-180, le=180),
+    *,
+    payload: dict = Depends(require_role("cleaner")),
+    database: DB,
+):
+    cleaner_id = ObjectId(payload["sub"])
+    if lat is not None and lng is not None:
+        origin = {"lat": lat, "lng": lng}
+    else:
+        # No position sent: start from their latest ping, buffered on this node or already stored.
+        origin = location_buffer.position(cleaner_id)
+        if origin is None:
+            cleaner = await database.users.find_one({"_id": cleaner_id}, {"location": 1})
+            origin = (cleaner or {}).get("location")
+        if not origin or "lat" not in origin or "lng" not in origin:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Current position required: pass lat and lng",
+            )
+
+    plan = await cleaner_route(database, cleaner_id, origin)
+    stops = [
+        RouteStop(order=i + 1, leg_km=leg, cumulative_km=round(cumulative, 3), report=ReportPublic(**report))
+        for i, (report, leg, cumulative) in enumerate(zip(plan.stops, plan.legs_km, accumulate(plan.legs_km)))
+    ]
+    return CleanerRoute(origin=plan.origin, stops=stops, total_km=plan.total_km, cached=plan.cached)
+
+
 @router.post("/reports/{report_id}/upload-after", response_model=ReportPublic)
 async def upload_after_image(
     report_id: str,
@@ -22,32 +70,10 @@ async def upload_after_image(
     database: DB,
 ):
     rid = ObjectId(report_id)
+    cleaner_id = ObjectId(payload["sub"])
     report = await database.reports.find_one({"_id": rid})
-    if not report:
-        raise HTTPException(status_code=404, detail="Report not found")
+    check_after_upload_allowed(report, cleaner_id)
 
-    cleaner_id = ObjectId(payload["sub"])
-    if report.get("assigned_cleaner_id") != cleaner_id:
-        raise HTTPException(status_code=403, detail="Not assigned to this report")
-
-    if report["status"] != "Assigned":
-        raise HTTPException(status_code=409, detail="Only Assigned reports can be cleaned")
-
-    after_url, after_thumb_url = await save_upload_with_thumbnail(after_image, "after")
-    now = datetime.now(UTC)
-
-    await database.reports.update_one(
-        {"_id": rid},
-        {
-            "$set": {
-                "status": "Cleaned",
-                "after_image_url": after_url,
-                "after_image_thumb_url": after_thumb_url,
-                "cleaned_at": now,
-            }
-        },
-    )
-
-    updated = await database.reports.find_one({"_id": rid})
-    verified = await process_cleaning_verification(database, updated)
-    return ReportPublic(**(verified or updated))
+    after = await save_upload_with_thumbnail(after_image, "after")
+    verified = await submit_after_photo(database, report, cleaner_id, after)
+    return ReportPublic(**verified)
@@ -4,8 +4,8 @@ from bson import ObjectId
 from fastapi import APIRouter, Depends, File, Form, UploadFile, status
 
 from app.api.deps import DB, require_role
-from app.models.report import ReportCreate, ReportPublic, report_doc_from_create
-from app.services.ai_workflow import process_new_report
+from app.models.report import ReportCreate, ReportPublic
+from app.services.submissions import submit_new_report
 from app.utils.uploads import save_upload_with_thumbnail
 
 router = APIRouter()
@@ -22,14 +22,10 @@ async def create_report(
     database: DB,
 ):
     citizen_id = ObjectId(payload["sub"])
-    before_url, before_thumb_url = await save_upload_with_thumbnail(before_image, "before")
+    before = await save_upload_with_thumbnail(before_image, "before")
     report_payload = ReportCreate(description=description, location={"lat": lat, "lng": lng})
-    doc = report_doc_from_create(citizen_id, report_payload, before_url, before_thumb_url)
-
-    result = await database.reports.insert_one(doc)
-    created = await database.reports.find_one({"_id": result.inserted_id})
-    updated = await process_new_report(database, created)
-    return ReportPublic(**(updated or created))
+    created = await submit_new_report(database, citizen_id, report_payload, before)
+    return ReportPublic(**created)
 
 
 @router.get("/my", response_model=list[ReportPublic])
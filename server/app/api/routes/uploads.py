@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import os
+import time
+from datetime import UTC, datetime, timedelta
+from email.utils import formatdate
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.api.deps import DB, require_role
+from app.core.config import settings
+from app.models.report import ReportCreate, ReportPublic
+from app.models.upload_session import UploadSessionCreate, UploadSessionPublic, upload_session_doc_from_create
+from app.services.submissions import check_after_upload_allowed, submit_after_photo, submit_new_report
+from app.utils.uploads import (
+    ALLOWED_CONTENT_TYPES,
+    CONTENT_TYPE_EXT,
+    ingest_file,
+    max_upload_bytes,
+    store_ingested_upload,
+)
+
+router = APIRouter()
+
+TUS_VERSION = "1.0.0"
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
+# A PATCH holds the session's writer lease while it writes; a writer that died is taken over
+# once its lease lapses. Leases are renewed well before they lapse.
+WRITER_LEASE = timedelta(seconds=60)
+
+
+def partial_dir() -> str:
+    return f"{settings.upload_dir}/.partial"
+
+
+def _partial_path(session_id: ObjectId) -> str:
+    return f"{partial_dir()}/{session_id}"
+
+
+def _no_live_writer(now: datetime) -> dict:
+    return {"$or": [{"writer_until": None}, {"writer_until": {"$lt": now}}]}
+
+
+def _session_headers(session: dict) -> dict[str, str]:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["length"]),
+        "Upload-Expires": formatdate(session["expires_at"].timestamp(), usegmt=True),
+        "Cache-Control": "no-store",
+    }
+
+
+async def _get_session(database, session_id: str, user_id: ObjectId) -> dict:
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid upload id")
+    session = await database.upload_sessions.find_one({"_id": ObjectId(session_id), "user_id": user_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    expires_at = session["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=UTC)
+    if expires_at < datetime.now(UTC):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload expired")
+    return session
+
+
+@router.post("/resumable", response_model=UploadSessionPublic, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    body: UploadSessionCreate,
+    response: Response,
+    *,
+    payload: dict = Depends(require_role("citizen", "cleaner")),
+    database: DB,
+):
+    user_id = ObjectId(payload["sub"])
+    if body.purpose == "report_before" and payload.get("role") != "citizen":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    if body.purpose == "cleaning_after":
+        if payload.get("role") != "cleaner":
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        report = await database.reports.find_one({"_id": body.report_id})
+        check_after_upload_allowed(report, user_id)
+
+    if body.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file type. Only JPG/PNG/WEBP allowed.",
+        )
+    max_bytes = max_upload_bytes()
+    if max_bytes is not None and body.length > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File too large. Max {settings.max_upload_mb}MB allowed.",
+        )
+
+    doc = upload_session_doc_from_create(user_id, body, settings.resumable_upload_ttl_minutes)
+    result = await database.upload_sessions.insert_one(doc)
+    os.makedirs(partial_dir(), exist_ok=True)
+    open(_partial_path(result.inserted_id), "wb").close()
+
+    created = await database.upload_sessions.find_one({"_id": result.inserted_id})
+    response.headers.update(_session_headers(created))
+    response.headers["Location"] = f"/api/uploads/resumable/{result.inserted_id}"
+    return UploadSessionPublic(**created)
+
+
+@router.head("/resumable/{session_id}")
+async def upload_session_offset(
+    session_id: str,
+    *,
+    payload: dict = Depends(require_role("citizen", "cleaner")),
+    database: DB,
+):
+    session = await _get_session(database, session_id, ObjectId(payload["sub"]))
+    return Response(status_code=status.HTTP_200_OK, headers=_session_headers(session))
+
+
+@router.get("/resumable/{session_id}", response_model=UploadSessionPublic)
+async def get_upload_session(
+    session_id: str,
+    response: Response,
+    *,
+    payload: dict = Depends(require_role("citizen", "cleaner")),
+    database: DB,
+):
+    session = await _get_session(database, session_id, ObjectId(payload["sub"]))
+    response.headers.update(_session_headers(session))
+    return UploadSessionPublic(**session)
+
+
+@router.patch("/resumable/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    *,
+    payload: dict = Depends(require_role("citizen", "cleaner")),
+    database: DB,
+):
+    session = await _get_session(database, session_id, ObjectId(payload["sub"]))
+    if session["status"] != "Open":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already finalized")
+    if request.headers.get("content-type", "").split(";", 1)[0].strip() != CHUNK_CONTENT_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Chunks must be sent as {CHUNK_CONTENT_TYPE}",
+        )
+
+    raw_offset = request.headers.get("upload-offset", "")
+    if not raw_offset.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing Upload-Offset header")
+    offset = int(raw_offset)
+    if offset != session["offset"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload-Offset does not match the server offset",
+            headers=_session_headers(session),
+        )
+
+    path = _partial_path(session["_id"])
+    if not os.path.exists(path):
+        await database.upload_sessions.delete_one({"_id": session["_id"]})
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload expired")
+
+    # Claim the session before touching the file, so a second PATCH for the same offset
+    # cannot overwrite or truncate this one's bytes.
+    writer = ObjectId()
+    now = datetime.now(UTC)
+    claimed = await database.upload_sessions.update_one(
+        {"_id": session["_id"], "offset": offset, "status": "Open", **_no_live_writer(now)},
+        {"$set": {"writer": writer, "writer_until": now + WRITER_LEASE}},
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Concurrent upload detected")
+
+    async def renew_lease() -> bool:
+        result = await database.upload_sessions.update_one(
+            {"_id": session["_id"], "writer": writer},
+            {"$set": {"writer_until": datetime.now(UTC) + WRITER_LEASE}},
+        )
+        return result.matched_count == 1
+
+    # Whatever arrived before a dropped connection is kept, so the client resumes from there.
+    written = 0
+    too_large = False
+    lease_lost = False
+    renew_at = time.monotonic() + WRITER_LEASE.total_seconds() / 3
+    try:
+        with open(path, "r+b") as out:
+            out.seek(offset)
+            try:
+                async for chunk in request.stream():
+                    if offset + written + len(chunk) > session["length"]:
+                        too_large = True
+                        break
+                    if time.monotonic() >= renew_at:
+                        if not await renew_lease():
+                            lease_lost = True
+                            break
+                        renew_at = time.monotonic() + WRITER_LEASE.total_seconds() / 3
+                    await run_in_threadpool(out.write, chunk)
+                    written += len(chunk)
+            except ClientDisconnect:
+                pass
+            if not lease_lost:
+                out.truncate(offset + written)
+    finally:
+        now = datetime.now(UTC)
+        updated = await database.upload_sessions.find_one_and_update(
+            {"_id": session["_id"], "writer": writer},
+            {
+                "$set": {
+                    "offset": offset + written,
+                    "updated_at": now,
+                    "expires_at": now + timedelta(minutes=settings.resumable_upload_ttl_minutes),
+                },
+                "$unset": {"writer": "", "writer_until": ""},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+    if updated is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Concurrent upload detected")
+    if too_large:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Chunk exceeds the declared upload length",
+            headers=_session_headers(updated),
+        )
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_session_headers(updated))
+
+
+@router.post("/resumable/{session_id}/finalize", response_model=ReportPublic)
+async def finalize_upload(
+    session_id: str,
+    *,
+    payload: dict = Depends(require_role("citizen", "cleaner")),
+    database: DB,
+):
+    user_id = ObjectId(payload["sub"])
+    session = await _get_session(database, session_id, user_id)
+
+    # Finalize is idempotent: a client retrying after a timeout gets the same report back
+    # instead of a second encode and AI call.
+    if session["status"] == "Finalized":
+        report = await database.reports.find_one({"_id": session["report_id"]})
+        if not report:
+            raise HTTPException(status_code=404, detail="Report not found")
+        return ReportPublic(**report)
+    if session["offset"] != session["length"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload incomplete",
+            headers=_session_headers(session),
+        )
+
+    claimed = await database.upload_sessions.find_one_and_update(
+        {"_id": session["_id"], "status": "Open", **_no_live_writer(datetime.now(UTC))},
+        {"$set": {"status": "Finalizing", "updated_at": datetime.now(UTC)}},
+    )
+    if claimed is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is already being finalized")
+
+    try:
+        if session["purpose"] == "cleaning_after":
+            report = await database.reports.find_one({"_id": session["report_id"]})
+            check_after_upload_allowed(report, user_id)
+
+        ext = CONTENT_TYPE_EXT.get(session["content_type"], ".jpg")
+        ingested = await ingest_file(_partial_path(session["_id"]), ext)
+        saved = await store_ingested_upload(ingested)
+
+        if session["purpose"] == "report_before":
+            report_payload = ReportCreate(description=session["description"], location=session["location"])
+            result = await submit_new_report(database, user_id, report_payload, saved)
+        else:
+            result = await submit_after_photo(database, report, user_id, saved)
+    except BaseException:
+        if os.path.exists(_partial_path(session["_id"])):
+            await database.upload_sessions.update_one(
+                {"_id": session["_id"], "status": "Finalizing"},
+                {"$set": {"status": "Open", "updated_at": datetime.now(UTC)}},
+            )
+        else:
+            # The bytes were rejected (e.g. not a decodable image); the session cannot be resumed.
+            await database.upload_sessions.delete_one({"_id": session["_id"]})
+        raise
+
+    await database.upload_sessions.update_one(
+        {"_id": session["_id"]},
+        {"$set": {"status": "Finalized", "report_id": result["_id"], "updated_at": datetime.now(UTC)}},
+    )
+    return ReportPublic(**result)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -27,9 +28,59 @@ class Settings(BaseSettings):
     upload_dir: str = "./uploads"
     max_upload_mb: int = 8
     image_thumb_px: int = 640
-
+    image_webp_quality: int = 72
+    image_webp_method: int = 4
+    image_pool_kind: Literal["process", "thread"] = "process"
+    image_pool_workers: int = 2
+    image_pool_queue: int = 16
+    image_derivative_widths: str = "160,320,640,1280"
+    image_derivative_formats: str = "webp,jpeg"
+    derivative_cache_mb: int = 1024
+    resumable_upload_ttl_minutes: int = 60 * 24
+    upload_gc_interval_minutes: int = 360
+    upload_gc_grace_minutes: int = 60
+    upload_gc_batch_size: int = 200
+    upload_gc_deletes_per_second: float = 500.0
+    upload_compact_after_days: int = 0
+    upload_compact_quality: int = 80
+    upload_compact_batch_size: int = 200
+
+    ai_analyzer_mode: Literal["remote", "inprocess"] = "remote"
+    ai_service_dir: str = "../ai_service"
     ai_service_url: str = "http://localhost:9000"
+    ai_service_urls: str = ""
     ai_service_timeout: float = 10.0
+    ai_connect_timeout: float = 2.0
+    ai_pool_max_connections: int = 32
+    ai_pool_max_keepalive: int = 16
+    ai_pool_keepalive_seconds: float = 30.0
+    ai_http2: bool = False
+    ai_retry_attempts: int = 2
+    ai_retry_backoff_seconds: float = 0.2
+    ai_breaker_failures: int = 5
+    ai_breaker_reset_seconds: float = 10.0
+    ai_reconcile_interval_seconds: float = 60.0
+    ai_reconcile_grace_seconds: float = 120.0
+    ai_reconcile_batch_size: int = 200
+    job_workers: int = 4
+    job_poll_seconds: float = 1.0
+    job_visibility_seconds: float = 120.0
+    job_max_attempts: int = 5
+    job_retry_backoff_seconds: float = 5.0
+    job_retention_hours: int = 24
+    ai_batch_size: int = 256
+    ai_batch_timeout: float = 300.0
+    cleaner_search_radius_km: float = 25.0
+    cleaner_candidates: int = 5
+    cleaner_max_open_tasks: int = 10
+    cleaner_recount_interval_minutes: int = 60
+    backlog_exact_max_reports: int = 200
+    backlog_exact_max_slots: int = 4000
+    route_cache_entries: int = 1024
+    location_flush_seconds: float = 10.0
+    location_stale_minutes: int = 15
+    duplicate_hash_distance: int = 4
+    duplicate_index_sync_seconds: float = 5.0
     citizen_reward_amount: float = 10.0
     cleaner_payment_amount: float = 20.0
 
@@ -45,9 +96,24 @@ class Settings(BaseSettings):
     smtp_from: str | None = None
     smtp_use_tls: bool = True
 
+    @property
+    def ai_service_urls_list(self) -> list[str]:
+        urls = [url.strip() for url in self.ai_service_urls.split(",") if url.strip()]
+        return urls or [self.ai_service_url]
+
     @property
     def cors_origins_list(self) -> list[str]:
         return [origin.strip() for origin in self.cors_origins.split(",") if origin.strip()]
 
+    @property
+    def image_derivative_widths_list(self) -> list[int]:
+        widths = {int(width) for width in self.image_derivative_widths.split(",") if width.strip()}
+        widths.add(self.image_thumb_px)
+        return sorted(widths)
+
+    @property
+    def image_derivative_formats_list(self) -> list[str]:
+        return [fmt.strip().lower() for fmt in self.image_derivative_formats.split(",") if fmt.strip()]
+
 
 settings = Settings()  # type: ignore[call-arg]
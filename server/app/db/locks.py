@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import os
+import socket
+from datetime import UTC, datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+LOCK_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def try_acquire_lease(database, name: str, ttl_seconds: float) -> bool:
+    # One worker across the deployment wins the lease; the rest skip this round.
+    now = datetime.now(UTC)
+    try:
+        await database.locks.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": LOCK_OWNER}]},
+            {"$set": {"owner": LOCK_OWNER, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def release_lease(database, name: str) -> None:
+    await database.locks.delete_one({"_id": name, "owner": LOCK_OWNER})
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from app.core.config import settings
 from app.db.mongo import db
+from app.services.cleaner_geo import GEO_FIELD, backfill_cleaner_points
+from app.services.duplicate_images import ensure_hash_index
 
 
 async def ensure_indexes() -> None:
@@ -8,10 +11,36 @@ async def ensure_indexes() -> None:
         database = db()
         # Unique email for users
         await database.users.create_index("email", unique=True)
+        # Nearest-cleaner lookups ($geoNear); cleaners saved before the GeoJSON field get it now
+        await database.users.create_index([(GEO_FIELD, "2dsphere")])
+        await backfill_cleaner_points(database)
+        # Fallback assignment picks the least loaded cleaner
+        await database.users.create_index([("role", 1), ("is_active", 1), ("open_tasks", 1)])
+        # Expiry of positions cleaners stopped refreshing
+        await database.users.create_index("location_at", sparse=True)
         # Helpful report indexes
         await database.reports.create_index("citizen_id")
         await database.reports.create_index("status")
-        await database.reports.create_index("assigned_cleaner_id")
+        await database.reports.create_index([("assigned_cleaner_id", 1), ("status", 1)])
+        # Reports the AI reconciler still has to re-submit
+        await database.reports.create_index([("status", 1), ("ai_decision", 1)])
+        # Near-duplicate candidates from the in-memory hash index are confirmed against these
+        await database.reports.create_index("before_image_hash")
+        await database.reports.create_index("after_image_hash")
+        # One image_hashes row per report and hash, however often the analysis is re-run
+        await ensure_hash_index(database)
+        # Job queue: the claim query, per-report lookups, and expiry of finished jobs
+        await database.jobs.create_index([("status", 1), ("priority", -1), ("available_at", 1)])
+        await database.jobs.create_index("report_id")
+        await database.jobs.create_index(
+            "finished_at",
+            expireAfterSeconds=settings.job_retention_hours * 3600,
+            partialFilterExpression={"status": "done"},
+        )
+        # Back-references from stored uploads to the reports using them
+        await database.uploads.create_index("report_ids")
+        # Abandoned resumable uploads expire; their partial files are removed by the upload GC
+        await database.upload_sessions.create_index("expires_at", expireAfterSeconds=0)
     except Exception:
         # Best-effort on startup: devs may not have Mongo configured yet.
         # Actual API calls will still fail until Mongo is reachable.
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from app.api.api import api_router
 from app.core.config import settings
-from app.db.mongo import close, connect
+from app.db.mongo import close, connect, db
 from app.db.startup import ensure_indexes
+from app.services.ai_client import ai_client
+from app.services.ai_reconciler import ai_reconcile_loop
+from app.services.assignment import open_task_recount_loop
+from app.services.cleaner_locations import location_buffer
+from app.services.inprocess_ai import load_analyzer
+from app.services.job_queue import job_queue
+from app.services.upload_gc import upload_gc_loop
+from app.utils.image_pool import close_image_pool, start_image_pool
+from app.utils.static_files import CacheControlStaticFiles
+from app.utils.uploads import UploadSizeLimit
 
 
 @asynccontextmanager
@@ -18,24 +28,31 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.upload_dir, exist_ok=True)
     connect()
     await ensure_indexes()
+    start_image_pool()
+    if settings.ai_analyzer_mode == "inprocess":
+        load_analyzer()
+    else:
+        ai_client.start()
+    gc_task = asyncio.create_task(upload_gc_loop(db)) if settings.upload_gc_interval_minutes > 0 else None
+    reconcile_task = asyncio.create_task(ai_reconcile_loop(db)) if settings.ai_reconcile_interval_seconds > 0 else None
+    recount_task = asyncio.create_task(open_task_recount_loop(db)) if settings.cleaner_recount_interval_minutes > 0 else None
+    job_queue.start(db)
+    location_buffer.start(db)
     yield
+    job_queue.stop()
+    await location_buffer.close()
+    for task in (gc_task, reconcile_task, recount_task):
+        if task is not None:
+            task.cancel()
+    await ai_client.close()
+    close_image_pool()
     close()
 
 
-class CacheControlStaticFiles(StaticFiles):
-    def __init__(self, *args, cache_control: str, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.cache_control = cache_control
-
-    async def get_response(self, path: str, scope):
-        response = await super().get_response(path, scope)
-        if response.status_code == 200:
-            response.headers["Cache-Control"] = self.cache_control
-        return response
-
-
 app = FastAPI(title="Trashio API", version="0.1.0", lifespan=lifespan)
 
+# Added first so CORS headers still go on its rejections.
+app.add_middleware(UploadSizeLimit)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+# Points per batched ping; a phone that was offline for a while sends its backlog in one go.
+LOCATION_BATCH_MAX_POINTS = 500
+
+
+class LocationPing(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    # When the device took the fix; defaults to when the server received it.
+    recorded_at: datetime | None = None
+
+
+class LocationBatch(BaseModel):
+    points: list[LocationPing] = Field(min_length=1, max_length=LOCATION_BATCH_MAX_POINTS)
+
+
+class LocationAccepted(BaseModel):
+    accepted: int
@@ -63,6 +63,20 @@ class ReportPublic(MongoModel):
     reclean_required: bool = False
 
 
+class RouteStop(BaseModel):
+    order: int
+    leg_km: float
+    cumulative_km: float
+    report: ReportPublic
+
+
+class CleanerRoute(BaseModel):
+    origin: GeoPoint
+    stops: list[RouteStop] = Field(default_factory=list)
+    total_km: float = 0.0
+    cached: bool = False
+
+
 def report_doc_from_create(
     citizen_id: PyObjectId,
     payload: ReportCreate,
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+from app.models.common import MongoModel, PyObjectId, now_utc
+from app.models.report import GeoPoint
+
+UploadPurpose = Literal["report_before", "cleaning_after"]
+UploadSessionStatus = Literal["Open", "Finalizing", "Finalized"]
+
+
+class UploadSessionCreate(BaseModel):
+    purpose: UploadPurpose
+    content_type: str
+    length: int = Field(gt=0)
+    report_id: PyObjectId | None = None
+    description: str | None = Field(default=None, min_length=3, max_length=500)
+    location: GeoPoint | None = None
+
+    model_config = {
+        "arbitrary_types_allowed": True,
+    }
+
+    @model_validator(mode="after")
+    def purpose_fields(self) -> "UploadSessionCreate":
+        if self.purpose == "cleaning_after" and self.report_id is None:
+            raise ValueError("report_id is required for cleaning_after uploads")
+        if self.purpose == "report_before" and (self.description is None or self.location is None):
+            raise ValueError("description and location are required for report_before uploads")
+        return self
+
+
+class UploadSessionPublic(MongoModel):
+    purpose: UploadPurpose
+    content_type: str
+    length: int
+    offset: int
+    status: UploadSessionStatus
+    report_id: PyObjectId | None = None
+    created_at: datetime
+    expires_at: datetime
+
+
+def upload_session_doc_from_create(user_id: PyObjectId, payload: UploadSessionCreate, ttl_minutes: int) -> dict:
+    now = now_utc()
+    return {
+        "user_id": user_id,
+        "purpose": payload.purpose,
+        "content_type": payload.content_type,
+        "length": payload.length,
+        "offset": 0,
+        "status": "Open",
+        "report_id": payload.report_id,
+        "description": payload.description,
+        "location": payload.location.model_dump() if payload.location else None,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + timedelta(minutes=ttl_minutes),
+    }
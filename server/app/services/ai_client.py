@@ -1,31 +1,325 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
 from typing import Any
 
 import httpx
 
 from app.core.config import settings
 
+logger = logging.getLogger("trashio.ai_client")
 
-def _timeout() -> httpx.Timeout:
-    return httpx.Timeout(settings.ai_service_timeout)
+# Worth another attempt: the service was briefly unreachable, restarting, or shedding load.
+RETRY_STATUSES = {502, 503}
 
 
-async def analyze_before(payload: dict[str, Any]) -> dict[str, Any] | None:
-    try:
-        async with httpx.AsyncClient(base_url=settings.ai_service_url, timeout=_timeout()) as client:
-            response = await client.post("/analyze/before", json=payload)
-            response.raise_for_status()
-            return response.json()
-    except (httpx.RequestError, httpx.HTTPStatusError):
-        return None
+# Per endpoint. half_open is still out of rotation; the next health probe closes or re-opens it.
+class CircuitBreaker:
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.times_opened = 0
 
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < settings.ai_breaker_reset_seconds:
+            return "open"
+        return "half_open"
 
-async def analyze_after(payload: dict[str, Any]) -> dict[str, Any] | None:
-    try:
-        async with httpx.AsyncClient(base_url=settings.ai_service_url, timeout=_timeout()) as client:
-            response = await client.post("/analyze/after", json=payload)
-            response.raise_for_status()
-            return response.json()
-    except (httpx.RequestError, httpx.HTTPStatusError):
-        return None
+    def succeeded(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def failed(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= settings.ai_breaker_failures:
+            if self.opened_at is None:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+
+class Endpoint:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.breaker = CircuitBreaker()
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latencies_ms: deque[float] = deque(maxlen=512)
+
+    def stats(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def pct(p: float) -> float | None:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1) if latencies else None
+
+        return {
+            "url": self.url,
+            "breaker": self.breaker.stats(),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99)},
+        }
+
+
+def _service_fault(exc: Exception) -> bool:
+    # A 4xx means the service answered and the input was bad; that says nothing about its health.
+    return not (isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code < 500)
+
+
+def _backoff(attempt: int, response: httpx.Response | None) -> float:
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    # Full jitter, so callers that failed together do not retry together.
+    return random.uniform(0, settings.ai_retry_backoff_seconds * 2**attempt)
+
+
+# Started and closed by the app lifespan; scripts without one get it lazily.
+class AIClient:
+    def __init__(self) -> None:
+        self.client: httpx.AsyncClient | None = None
+        self.endpoints: list[Endpoint] = []
+        self.probe_task: asyncio.Task | None = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.short_circuited = 0
+
+    def start(self) -> None:
+        if self.client is not None:
+            return
+        self.endpoints = [Endpoint(url) for url in settings.ai_service_urls_list]
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.ai_service_timeout, connect=settings.ai_connect_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.ai_pool_max_connections,
+                max_keepalive_connections=settings.ai_pool_max_keepalive,
+                keepalive_expiry=settings.ai_pool_keepalive_seconds,
+            ),
+            http2=settings.ai_http2,
+        )
+
+    async def close(self) -> None:
+        if self.probe_task is not None:
+            self.probe_task.cancel()
+            self.probe_task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.start()
+        if self.probe_task is None:
+            self.probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+        return self.client  # type: ignore[return-value]
+
+    @property
+    def state(self) -> str:
+        # Open only when no endpoint is left in rotation.
+        if not self.endpoints or any(endpoint.breaker.state == "closed" for endpoint in self.endpoints):
+            return "closed"
+        return "open"
+
+    def _pick(self, exclude: Endpoint | None = None) -> Endpoint | None:
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.breaker.state == "closed"]
+        if len(healthy) > 1 and exclude in healthy:
+            healthy.remove(exclude)
+        if not healthy:
+            return None
+        # Least outstanding requests; ties go to a random endpoint so idle ones share the load.
+        random.shuffle(healthy)
+        return min(healthy, key=lambda endpoint: endpoint.outstanding)
+
+    def _begin(self, endpoint: Endpoint) -> float:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        endpoint.requests += 1
+        endpoint.outstanding += 1
+        return time.perf_counter()
+
+    def _end(self, endpoint: Endpoint) -> None:
+        self.in_flight -= 1
+        endpoint.outstanding -= 1
+
+    def _settle(self, endpoint: Endpoint, started: float, exc: Exception | None = None) -> None:
+        if exc is None:
+            endpoint.latencies_ms.append((time.perf_counter() - started) * 1000)
+            endpoint.breaker.succeeded()
+            return
+        self.errors += 1
+        endpoint.errors += 1
+        if isinstance(exc, httpx.TimeoutException):
+            self.timeouts += 1
+            endpoint.timeouts += 1
+        if _service_fault(exc):
+            was_open = endpoint.breaker.opened_at is not None
+            endpoint.breaker.failed()
+            if not was_open and endpoint.breaker.opened_at is not None:
+                logger.warning("AI endpoint %s taken out of rotation", endpoint.url)
+        else:
+            endpoint.breaker.succeeded()
+
+    async def post_json(self, path: str, payload: dict[str, Any], timeout: float | None = None) -> dict[str, Any] | None:
+        client = self._client()
+        deadline = time.monotonic() + (timeout or settings.ai_service_timeout)
+        attempt = 0
+        endpoint = None
+        while True:
+            # A retry goes to a different endpoint when there is one.
+            endpoint = self._pick(exclude=endpoint)
+            if endpoint is None:
+                self.short_circuited += 1
+                return None
+            remaining = deadline - time.monotonic()
+            response = None
+            started = self._begin(endpoint)
+            try:
+                response = await client.post(
+                    f"{endpoint.url}{path}",
+                    json=payload,
+                    # Lets the AI service drop work we will have stopped waiting for.
+                    headers={"X-Request-Timeout": f"{remaining:.3f}"},
+                    timeout=httpx.Timeout(remaining, connect=min(remaining, settings.ai_connect_timeout)),
+                )
+                response.raise_for_status()
+            except (httpx.RequestError, httpx.HTTPStatusError) as exc:
+                self._settle(endpoint, started, exc)
+                transient = (
+                    isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError))
+                    or (response is not None and response.status_code in RETRY_STATUSES)
+                )
+                pause = _backoff(attempt, response) if transient else 0.0
+                if not transient or attempt >= settings.ai_retry_attempts or pause >= deadline - time.monotonic():
+                    return None
+            else:
+                self._settle(endpoint, started)
+                return response.json()
+            finally:
+                self._end(endpoint)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(pause)
+
+    async def _stream_chunk(
+        self, path: str, chunk: list[dict[str, Any]], offset: int, results: list[dict[str, Any] | None]
+    ) -> None:
+        endpoint = self._pick()
+        if endpoint is None:
+            self.short_circuited += 1
+            return
+        headers = {"Accept": "application/x-ndjson", "X-Request-Timeout": str(settings.ai_batch_timeout)}
+        timeout = httpx.Timeout(settings.ai_batch_timeout, connect=settings.ai_connect_timeout)
+        started = self._begin(endpoint)
+        try:
+            async with self._client().stream(
+                "POST", f"{endpoint.url}{path}", json={"items": chunk}, headers=headers, timeout=timeout
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    results[offset + item["index"]] = item.get("result")
+        except (httpx.RequestError, httpx.HTTPStatusError) as exc:
+            self._settle(endpoint, started, exc)
+        else:
+            self._settle(endpoint, started)
+        finally:
+            self._end(endpoint)
+
+    async def stream_batch(self, path: str, payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+        # Results line up with ``payloads``; an item that failed, or a chunk whose request
+        # failed as a whole, comes back as None just like the single-item calls. Chunks run
+        # in parallel, one per endpoint in rotation.
+        self._client()
+        results: list[dict[str, Any] | None] = [None] * len(payloads)
+        size = max(1, settings.ai_batch_size)
+        slots = asyncio.Semaphore(max(1, sum(endpoint.breaker.state == "closed" for endpoint in self.endpoints)))
+
+        async def run(offset: int) -> None:
+            async with slots:
+                await self._stream_chunk(path, payloads[offset : offset + size], offset, results)
+
+        await asyncio.gather(*(run(offset) for offset in range(0, len(payloads), size)))
+        return results
+
+    async def _probe(self, endpoint: Endpoint) -> None:
+        try:
+            response = await self._client().get(f"{endpoint.url}/health", timeout=settings.ai_connect_timeout)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy:
+            endpoint.breaker.succeeded()
+            logger.info("AI endpoint %s back in rotation", endpoint.url)
+        else:
+            endpoint.breaker.failed()
+
+    async def _probe_loop(self) -> None:
+        # Ejected endpoints come back only after answering /health, never on live traffic.
+        interval = max(0.1, settings.ai_breaker_reset_seconds / 4)
+        while True:
+            await asyncio.sleep(interval)
+            due = [endpoint for endpoint in self.endpoints if endpoint.breaker.state == "half_open"]
+            if due:
+                await asyncio.gather(*(self._probe(endpoint) for endpoint in due))
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {
+            "state": self.state,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_connections": settings.ai_pool_max_connections,
+            "endpoints": [endpoint.stats() for endpoint in self.endpoints],
+        }
+        # httpcore's pool is not public API; report it when it is there.
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections_open"] = len(connections)
+            stats["connections_idle"] = sum(1 for conn in connections if conn.is_idle())
+            stats["http2_connections"] = sum(1 for conn in connections if "HTTP/2" in repr(conn))
+        return stats
+
+
+ai_client = AIClient()
+
+
+async def analyze_before(payload: dict[str, Any], timeout: float | None = None) -> dict[str, Any] | None:
+    return await ai_client.post_json("/analyze/before", payload, timeout)
+
+
+async def analyze_after(payload: dict[str, Any], timeout: float | None = None) -> dict[str, Any] | None:
+    return await ai_client.post_json("/analyze/after", payload, timeout)
+
+
+async def analyze_before_batch(payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    return await ai_client.stream_batch("/analyze/before:batch", payloads)
+
+
+async def analyze_after_batch(payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    return await ai_client.stream_batch("/analyze/after:batch", payloads)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime, timedelta
+
+from app.core.config import settings
+from app.db.locks import release_lease, try_acquire_lease
+from app.services.analyzer import ai_state
+from app.services.job_queue import PRIORITY_RECONCILE, job_queue
+
+logger = logging.getLogger("trashio.ai_reconcile")
+
+RECONCILE_LEASE = "ai_reconcile"
+JOB_KIND_FOR_STATUS = {"Pending": "analyze_before", "Cleaned": "analyze_after"}
+
+
+@dataclass
+class ReconcileReport:
+    ai_state: str = "closed"
+    submitted: int = 0
+    duration_s: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def stranded_reports_query(now: datetime | None = None) -> dict:
+    # Reports not yet analyzed keep ai_decision unset. The grace period keeps us away
+    # from reports whose job is still being enqueued.
+    cutoff = (now or datetime.now(UTC)) - timedelta(seconds=settings.ai_reconcile_grace_seconds)
+    return {
+        "$or": [
+            {"status": "Pending", "ai_decision": None, "created_at": {"$lt": cutoff}},
+            {"status": "Cleaned", "ai_decision": None, "cleaned_at": {"$lt": cutoff}},
+        ]
+    }
+
+
+async def reconcile_reports(database) -> ReconcileReport:
+    started = time.perf_counter()
+    report = ReconcileReport(ai_state=ai_state())
+    if report.ai_state == "open":
+        return report
+
+    # Reports with a live job are the queue's business, and dead ones wait for an admin
+    # (POST /admin/maintenance/jobs/retry-dead). What is left lost its job or never had one.
+    pipeline = [
+        {"$match": stranded_reports_query()},
+        {"$sort": {"_id": 1}},
+        {
+            "$lookup": {
+                "from": "jobs",
+                "localField": "_id",
+                "foreignField": "report_id",
+                "pipeline": [{"$match": {"status": {"$in": ["queued", "running", "dead"]}}}, {"$project": {"kind": 1}}],
+                "as": "jobs",
+            }
+        },
+        {"$project": {"status": 1, "jobs": 1}},
+    ]
+    async for doc in database.reports.aggregate(pipeline):
+        kind = JOB_KIND_FOR_STATUS[doc["status"]]
+        if any(job["kind"] == kind for job in doc["jobs"]):
+            continue
+        await job_queue.enqueue(database, kind, doc["_id"], priority=PRIORITY_RECONCILE)
+        report.submitted += 1
+        # One batch per round keeps a big backlog from crowding out live submissions.
+        if report.submitted >= settings.ai_reconcile_batch_size:
+            break
+
+    report.duration_s = round(time.perf_counter() - started, 3)
+    if report.submitted:
+        logger.info("AI reconciliation finished", extra=report.as_dict())
+    return report
+
+
+async def run_reconciliation(database) -> ReconcileReport | None:
+    lease_seconds = max(60.0, settings.ai_reconcile_interval_seconds * 2)
+    if not await try_acquire_lease(database, RECONCILE_LEASE, lease_seconds):
+        return None
+    try:
+        return await reconcile_reports(database)
+    finally:
+        await release_lease(database, RECONCILE_LEASE)
+
+
+async def ai_reconcile_loop(get_database) -> None:
+    while True:
+        await asyncio.sleep(settings.ai_reconcile_interval_seconds)
+        try:
+            await run_reconciliation(get_database())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("AI reconciliation run failed")
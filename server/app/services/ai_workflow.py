@@ -1,32 +1,22 @@
 from __future__ import annotations
 
 from datetime import UTC, datetime
-from math import asin, cos, radians, sin, sqrt
 from typing import Any
 
 from bson import ObjectId
 
 from app.core.config import settings
 from app.models.payment import PaymentCreate, payment_doc_from_create
-from app.services.ai_client import analyze_after, analyze_before
+from app.services.analyzer import analyze_after, analyze_before
+from app.services.assignment import release_task, reserve_cleaner, select_available_cleaner
+from app.services.cleaner_geo import nearest_cleaners
+from app.services.duplicate_images import duplicate_index
+from app.services.upload_refs import release_upload_ref
+from app.utils.storage import path_for_url
 
 
 def image_path_from_url(url: str) -> str | None:
-    if not url:
-        return None
-    if url.startswith("/uploads/"):
-        filename = url.removeprefix("/uploads/")
-        return f"{settings.upload_dir}/{filename}"
-    return None
-
-
-def _haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    r = 6371.0
-    dlat = radians(lat2 - lat1)
-    dlng = radians(lng2 - lng1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    return r * c
+    return path_for_url(url)
 
 
 def _now() -> datetime:
@@ -47,42 +37,15 @@ async def _create_notification(database, user_id: ObjectId, notif_type: str, tit
     )
 
 
-async def _select_nearest_cleaner(database, location: dict[str, float], exclude_cleaner_id: ObjectId | None = None):
-    cleaners = [
-        doc
-        async for doc in database.users.find(
-            {"role": "cleaner", "is_active": True},
-            {"password_hash": 0},
-        )
-    ]
-    if exclude_cleaner_id:
-        cleaners = [cleaner for cleaner in cleaners if cleaner.get("_id") != exclude_cleaner_id]
-
-    if not cleaners:
-        return None
-
-    with_locations = []
-    for cleaner in cleaners:
-        loc = cleaner.get("location")
-        if loc and "lat" in loc and "lng" in loc:
-            with_locations.append(cleaner)
-
-    if with_locations:
-        lat = location.get("lat")
-        lng = location.get("lng")
-        if lat is not None and lng is not None:
-            with_locations.sort(key=lambda c: _haversine_km(lat, lng, c["location"]["lat"], c["location"]["lng"]))
-            return with_locations[0]
-
-    # Fallback: pick least assigned cleaner
-    scored: list[tuple[int, dict[str, Any]]] = []
-    for cleaner in cleaners:
-        assigned = await database.reports.count_documents(
-            {"assigned_cleaner_id": cleaner["_id"], "status": "Assigned"}
-        )
-        scored.append((assigned, cleaner))
-    scored.sort(key=lambda item: item[0])
-    return scored[0][1]
+async def _reserve_nearest_cleaner(database, location: dict[str, float], exclude_cleaner_id: ObjectId | None = None):
+    # Nearest candidate with spare capacity; the reservation is what makes it ours, so two
+    # reports racing for the same cleaner cannot push them past their limit.
+    for candidate in await nearest_cleaners(database, location, exclude_cleaner_id):
+        cleaner = await reserve_cleaner(database, candidate["_id"])
+        if cleaner:
+            return cleaner
+    # Nobody with spare capacity in range: fall back to the least loaded cleaner.
+    return await select_available_cleaner(database, exclude_cleaner_id)
 
 
 async def process_new_report(database, report: dict) -> dict:
@@ -100,10 +63,7 @@ async def process_new_report(database, report: dict) -> dict:
     ai_flags = list(ai.get("flags", []))
     image_hash = ai.get("image_hash")
     if image_hash:
-        dup_count = await database.reports.count_documents(
-            {"before_image_hash": image_hash, "_id": {"$ne": report["_id"]}}
-        )
-        if dup_count > 0:
+        if await duplicate_index.has_duplicate(database, "before", image_hash, report["_id"]):
             ai_flags.append("duplicate_before_image")
 
     if "duplicate_before_image" in ai_flags:
@@ -128,10 +88,13 @@ async def process_new_report(database, report: dict) -> dict:
                 "verified_at": now,
             }
         }
-        await database.reports.update_one({"_id": report["_id"]}, update)
+        # Only if still Pending: an admin may have verified or assigned it while the job ran.
+        result = await database.reports.update_one({"_id": report["_id"], "status": "Pending"}, update)
+        if result.modified_count:
+            await duplicate_index.record(database, "before", image_hash, report["_id"])
         return await database.reports.find_one({"_id": report["_id"]})
 
-    cleaner = await _select_nearest_cleaner(database, report.get("location", {}))
+    cleaner = await _reserve_nearest_cleaner(database, report.get("location", {}))
 
     update_fields: dict[str, Any] = {
         "status": "Verified",
@@ -157,7 +120,13 @@ async def process_new_report(database, report: dict) -> dict:
             }
         )
 
-    await database.reports.update_one({"_id": report["_id"]}, {"$set": update_fields})
+    result = await database.reports.update_one({"_id": report["_id"], "status": "Pending"}, {"$set": update_fields})
+    if not result.modified_count:
+        # Reviewed by an admin while we were waiting on the AI service; theirs stands.
+        if cleaner:
+            await release_task(database, cleaner["_id"])
+        return await database.reports.find_one({"_id": report["_id"]})
+    await duplicate_index.record(database, "before", image_hash, report["_id"])
     updated = await database.reports.find_one({"_id": report["_id"]})
 
     await _create_notification(
@@ -200,17 +169,14 @@ async def process_cleaning_verification(database, report: dict) -> dict:
         ai_flags.append("before_after_hash_match")
 
     if after_hash:
-        dup_after = await database.reports.count_documents(
-            {"after_image_hash": after_hash, "_id": {"$ne": report["_id"]}}
-        )
-        if dup_after > 0:
+        if await duplicate_index.has_duplicate(database, "after", after_hash, report["_id"]):
             ai_flags.append("duplicate_after_image")
 
     now = _now()
 
     if ai.get("decision") == "accept" and not ai_flags:
-        await database.reports.update_one(
-            {"_id": report["_id"]},
+        result = await database.reports.update_one(
+            {"_id": report["_id"], "status": "Cleaned"},
             {
                 "$set": {
                     "status": "Approved",
@@ -223,6 +189,11 @@ async def process_cleaning_verification(database, report: dict) -> dict:
                 }
             },
         )
+        if not result.modified_count:
+            # An admin verified the cleaning first and has already settled payments.
+            return await database.reports.find_one({"_id": report["_id"]})
+        await duplicate_index.record(database, "after", after_hash, report["_id"])
+        await release_task(database, report.get("assigned_cleaner_id"))
 
         if report.get("assigned_cleaner_id"):
             cleaner_payment = payment_doc_from_create(
@@ -268,8 +239,8 @@ async def process_cleaning_verification(database, report: dict) -> dict:
         return await database.reports.find_one({"_id": report["_id"]})
 
     if ai.get("decision") == "reclean":
-        await database.reports.update_one(
-            {"_id": report["_id"]},
+        result = await database.reports.update_one(
+            {"_id": report["_id"], "status": "Cleaned"},
             {
                 "$set": {
                     "status": "Assigned",
@@ -283,6 +254,11 @@ async def process_cleaning_verification(database, report: dict) -> dict:
                 }
             },
         )
+        if not result.modified_count:
+            # An admin verified the cleaning first; an approved report must not go back to Assigned.
+            return await database.reports.find_one({"_id": report["_id"]})
+        await duplicate_index.record(database, "after", after_hash, report["_id"])
+        await release_upload_ref(database, report.get("after_image_url"), report["_id"])
 
         if report.get("assigned_cleaner_id"):
             await _create_notification(
@@ -296,7 +272,7 @@ async def process_cleaning_verification(database, report: dict) -> dict:
 
         return await database.reports.find_one({"_id": report["_id"]})
 
-    new_cleaner = await _select_nearest_cleaner(database, report.get("location", {}), report.get("assigned_cleaner_id"))
+    new_cleaner = await _reserve_nearest_cleaner(database, report.get("location", {}), report.get("assigned_cleaner_id"))
     update_fields: dict[str, Any] = {
         "status": "Assigned",
         "ai_decision": "reject",
@@ -317,7 +293,15 @@ async def process_cleaning_verification(database, report: dict) -> dict:
             }
         )
 
-    await database.reports.update_one({"_id": report["_id"]}, {"$set": update_fields})
+    result = await database.reports.update_one({"_id": report["_id"], "status": "Cleaned"}, {"$set": update_fields})
+    if not result.modified_count:
+        if new_cleaner:
+            await release_task(database, new_cleaner["_id"])
+        return await database.reports.find_one({"_id": report["_id"]})
+    await duplicate_index.record(database, "after", after_hash, report["_id"])
+    if new_cleaner:
+        await release_task(database, report.get("assigned_cleaner_id"))
+    await release_upload_ref(database, report.get("after_image_url"), report["_id"])
 
     if report.get("assigned_cleaner_id"):
         await _create_notification(
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.core.config import settings
+from app.services import ai_client, inprocess_ai
+
+# "remote" calls the AI service over HTTP; "inprocess" runs the same scoring code in the
+# image pool. Both return the AI service's response models as plain dicts, or None.
+
+
+def ai_state() -> str:
+    """``closed`` while AI calls are expected to work, ``open`` while every AI endpoint is down."""
+    if settings.ai_analyzer_mode == "inprocess":
+        return "closed"
+    return ai_client.ai_client.state
+
+
+async def analyze_before(payload: dict[str, Any]) -> dict[str, Any] | None:
+    if settings.ai_analyzer_mode == "inprocess":
+        return await inprocess_ai.analyze_before(payload)
+    return await ai_client.analyze_before(payload)
+
+
+async def analyze_after(payload: dict[str, Any]) -> dict[str, Any] | None:
+    if settings.ai_analyzer_mode == "inprocess":
+        return await inprocess_ai.analyze_after(payload)
+    return await ai_client.analyze_after(payload)
+
+
+async def analyze_before_batch(payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    if settings.ai_analyzer_mode == "inprocess":
+        return await inprocess_ai.analyze_before_batch(payloads)
+    return await ai_client.analyze_before_batch(payloads)
+
+
+async def analyze_after_batch(payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    if settings.ai_analyzer_mode == "inprocess":
+        return await inprocess_ai.analyze_after_batch(payloads)
+    return await ai_client.analyze_after_batch(payloads)
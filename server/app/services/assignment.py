@@ -1,24 +1,137 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+from typing import Any
+
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from app.core.config import settings
+from app.db.locks import release_lease, try_acquire_lease
+
+logger = logging.getLogger("trashio.assignment")
+
+RECOUNT_LEASE = "open_task_recount"
+
+# A report counts against its cleaner's ``open_tasks`` while in one of these statuses.
+OPEN_TASK_STATUSES = ("Assigned", "Cleaned")
+
+CLEANER_PROJECTION = {"password_hash": 0}
+
+
+def task_owner(report: dict) -> ObjectId | None:
+    if report.get("status") in OPEN_TASK_STATUSES:
+        return report.get("assigned_cleaner_id")
+    return None
+
+
+def _has_capacity(slots: int = 1) -> dict:
+    # Cleaners without their own ``max_tasks`` get CLEANER_MAX_OPEN_TASKS.
+    return {
+        "$expr": {
+            "$lte": [
+                {"$add": [{"$ifNull": ["$open_tasks", 0]}, slots]},
+                {"$ifNull": ["$max_tasks", settings.cleaner_max_open_tasks]},
+            ]
+        }
+    }
+
 
+async def reserve_cleaner(database, cleaner_id: ObjectId, slots: int = 1) -> dict | None:
+    # None if the cleaner is inactive or the slots don't fit.
+    return await database.users.find_one_and_update(
+        {"_id": cleaner_id, "role": "cleaner", "is_active": True, **_has_capacity(slots)},
+        {"$inc": {"open_tasks": slots}},
+        projection=CLEANER_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
 
-async def select_available_cleaner(database, exclude_cleaner_id: ObjectId | None = None) -> ObjectId | None:
-    query = {"role": "cleaner", "is_active": True}
+
+async def select_available_cleaner(database, exclude_cleaner_id: ObjectId | None = None) -> dict | None:
+    # Picks and reserves in one round trip.
+    query: dict[str, Any] = {"role": "cleaner", "is_active": True, **_has_capacity()}
     if exclude_cleaner_id:
         query["_id"] = {"$ne": exclude_cleaner_id}
+    return await database.users.find_one_and_update(
+        query,
+        {"$inc": {"open_tasks": 1}},
+        sort=[("open_tasks", 1), ("_id", 1)],
+        projection=CLEANER_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def release_task(database, cleaner_id: ObjectId | None, slots: int = 1) -> None:
+    if cleaner_id and slots > 0:
+        await database.users.update_one({"_id": cleaner_id, "open_tasks": {"$gte": slots}}, {"$inc": {"open_tasks": -slots}})
+
+
+async def move_task(database, before: dict, after: dict) -> None:
+    # For transitions that did not reserve capacity up front, e.g. an admin setting a status.
+    old_owner = task_owner(before)
+    new_owner = task_owner(after)
+    if old_owner == new_owner:
+        return
+    await release_task(database, old_owner)
+    if new_owner:
+        await database.users.update_one({"_id": new_owner}, {"$inc": {"open_tasks": 1}})
+
 
-    cleaners = await database.users.find(query).to_list(length=500)
-    if not cleaners:
+async def recount_open_tasks(database) -> dict[str, int]:
+    async def read_counters() -> dict[ObjectId, int | None]:
+        cleaners = database.users.find({"role": "cleaner"}, {"open_tasks": 1})
+        return {doc["_id"]: doc.get("open_tasks") async for doc in cleaners}
+
+    before = await read_counters()
+    counts: dict[ObjectId, int] = {}
+    pipeline = [
+        {"$match": {"status": {"$in": list(OPEN_TASK_STATUSES)}, "assigned_cleaner_id": {"$ne": None}}},
+        {"$group": {"_id": "$assigned_cleaner_id", "count": {"$sum": 1}}},
+    ]
+    async for row in database.reports.aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    after = await read_counters()
+
+    updates = []
+    for cleaner_id, observed in after.items():
+        # A counter that moved while the aggregate ran may or may not be reflected in it;
+        # leave it for the next run.
+        if cleaner_id not in before or before[cleaner_id] != observed:
+            continue
+        expected = counts.get(cleaner_id, 0)
+        if observed != expected:
+            # Conditional on the value read, so an $inc landing meanwhile is never overwritten.
+            updates.append(
+                UpdateOne({"_id": cleaner_id, "open_tasks": observed}, {"$inc": {"open_tasks": expected - (observed or 0)}})
+            )
+    fixed = 0
+    if updates:
+        result = await database.users.bulk_write(updates, ordered=False)
+        fixed = result.modified_count
+    return {"cleaners_fixed": fixed, "open_tasks": sum(counts.values())}
+
+
+async def run_recount(database) -> dict[str, int] | None:
+    lease_seconds = max(60.0, settings.cleaner_recount_interval_minutes * 60)
+    if not await try_acquire_lease(database, RECOUNT_LEASE, lease_seconds):
         return None
+    try:
+        result = await recount_open_tasks(database)
+        if result["cleaners_fixed"]:
+            logger.warning("Repaired open_tasks drift", extra=result)
+        return result
+    finally:
+        await release_lease(database, RECOUNT_LEASE)
 
-    cleaner_ids = [c["_id"] for c in cleaners]
-    workload = {
-        cid: await database.reports.count_documents({
-            "assigned_cleaner_id": cid,
-            "status": {"$in": ["Assigned", "Cleaned"]},
-        })
-        for cid in cleaner_ids
-    }
 
-    return min(cleaner_ids, key=lambda cid: (workload.get(cid, 0), str(cid)))
+async def open_task_recount_loop(get_database) -> None:
+    # Runs once at startup too, so counters exist before the first assignment after an upgrade.
+    while True:
+        try:
+            await run_recount(get_database())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("open_tasks recount failed")
+        await asyncio.sleep(settings.cleaner_recount_interval_minutes * 60)
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.services.assignment import release_task, reserve_cleaner
+from app.services.cleaner_geo import EARTH_RADIUS_KM, GEO_FIELD, haversine_matrix, haversine_pairs
+
+logger = logging.getLogger("trashio.backlog")
+
+# Travel to a High report counts three times as much as to a Low one, so High reports get
+# the scarce nearby capacity first.
+PRIORITY_WEIGHTS = {"High": 3.0, "Medium": 2.0, "Low": 1.0}
+# Distances are only computed to this many nearest cleaners per report on the greedy path.
+GREEDY_CANDIDATES = 16
+GREEDY_BLOCK_ROWS = 4096
+
+
+@dataclass
+class BacklogPlan:
+    reports: int = 0
+    cleaners: int = 0
+    capacity: int = 0
+    assigned: int = 0
+    unassigned: int = 0
+    method: str = "none"
+    total_km: float = 0.0
+    weighted_km: float = 0.0
+    solve_s: float = 0.0
+    applied: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def hungarian(cost: np.ndarray) -> np.ndarray:
+    # Column for each row of an n x m cost matrix (n <= m); shortest augmenting paths, O(n^2 m).
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # owner[j]: 1-based row matched to column j, 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            j1 = int(np.argmin(np.where(free, minv[1:], np.inf))) + 1
+            delta = minv[j1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    columns = np.empty(n, dtype=np.int64)
+    matched = np.nonzero(owner[1:])[0]
+    columns[owner[1:][matched] - 1] = matched
+    return columns
+
+
+def _solve_exact(
+    distance_km: np.ndarray, weights: np.ndarray, capacity: np.ndarray, max_km: float
+) -> np.ndarray:
+    n = distance_km.shape[0]
+    # One column per unit of capacity, plus one "unassigned" column per report whose cost
+    # outweighs any feasible trip, so as many reports as possible are placed, High first.
+    slots = np.repeat(np.arange(len(capacity)), np.minimum(capacity, n))
+    slot_km = distance_km[:, slots]
+    penalty = weights * (2 * max_km + 1)
+    cost = np.where(slot_km > max_km, penalty.max() * 10, slot_km * weights[:, None])
+    cost = np.hstack([cost, np.repeat(penalty[:, None], n, axis=1)])
+    columns = hungarian(cost)
+    assigned = np.full(n, -1, dtype=np.int64)
+    placed = columns < len(slots)
+    assigned[placed] = slots[columns[placed]]
+    # A forced pick beyond max_km is really "nobody in range".
+    rows = np.nonzero(placed)[0]
+    assigned[rows[distance_km[rows, assigned[rows]] > max_km]] = -1
+    return assigned
+
+
+def _nearest_candidates(
+    report_lat: np.ndarray, report_lng: np.ndarray, cleaner_lat: np.ndarray, cleaner_lng: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    # Local equirectangular projection: at city scale it is within a fraction of a percent
+    # of haversine, and squared distances become one matrix product per block.
+    lat0 = np.radians(np.mean(np.concatenate([report_lat, cleaner_lat])))
+
+    def project(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        return np.column_stack([np.radians(lng) * np.cos(lat0), np.radians(lat)]).astype(np.float32) * EARTH_RADIUS_KM
+
+    reports = project(report_lat, report_lng)
+    cleaners = project(cleaner_lat, cleaner_lng)
+    cleaner_sq = np.einsum("ij,ij->i", cleaners, cleaners)
+    cand_idx = np.empty((len(reports), k), dtype=np.int32)
+    cand_km = np.empty((len(reports), k), dtype=np.float32)
+    for start in range(0, len(reports), GREEDY_BLOCK_ROWS):
+        block = reports[start : start + GREEDY_BLOCK_ROWS]
+        sq = np.einsum("ij,ij->i", block, block)[:, None] + cleaner_sq[None, :] - 2 * (block @ cleaners.T)
+        np.maximum(sq, 0, out=sq)
+        idx = np.argpartition(sq, k - 1, axis=1)[:, :k] if k < len(cleaners) else np.tile(np.arange(k), (len(block), 1))
+        cand_idx[start : start + len(block)] = idx
+        cand_km[start : start + len(block)] = np.sqrt(np.take_along_axis(sq, idx, axis=1))
+    return cand_idx, cand_km
+
+
+def _solve_greedy(
+    report_lat: np.ndarray,
+    report_lng: np.ndarray,
+    weights: np.ndarray,
+    cleaner_lat: np.ndarray,
+    cleaner_lng: np.ndarray,
+    capacity: np.ndarray,
+    max_km: float,
+) -> np.ndarray:
+    n = len(report_lat)
+    k = min(GREEDY_CANDIDATES, len(cleaner_lat))
+    cand_idx, cand_km = _nearest_candidates(report_lat, report_lng, cleaner_lat, cleaner_lng, k)
+
+    # Greedy: all (report, candidate) edges in range, highest priority first, shortest first.
+    rows = np.repeat(np.arange(n), k)
+    cols = cand_idx.ravel()
+    km = cand_km.ravel()
+    keep = km <= max_km
+    rows, cols, km = rows[keep], cols[keep], km[keep]
+    order = np.lexsort((km, -weights[rows]))
+    assigned = [-1] * n
+    remaining = capacity.astype(np.int64).tolist()
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if assigned[r] < 0 and remaining[c] > 0:
+            assigned[r] = c
+            remaining[c] -= 1
+
+    # Repair: reports whose nearby cleaners all filled up try every cleaner with room left.
+    remaining_arr = np.asarray(remaining)
+    unplaced = [r for r in np.argsort(-weights, kind="stable").tolist() if assigned[r] < 0]
+    for r in unplaced:
+        open_cols = np.nonzero(remaining_arr > 0)[0]
+        if not len(open_cols):
+            break
+        dist = haversine_pairs(
+            np.full(len(open_cols), report_lat[r]), np.full(len(open_cols), report_lng[r]),
+            cleaner_lat[open_cols], cleaner_lng[open_cols],
+        )
+        best = int(np.argmin(dist))
+        if dist[best] <= max_km:
+            assigned[r] = int(open_cols[best])
+            remaining_arr[open_cols[best]] -= 1
+
+    # Improvement: move a report to a nearer candidate that still has room.
+    cand_idx_l, cand_km_l = cand_idx.tolist(), cand_km.tolist()
+    for r in np.argsort(-weights, kind="stable").tolist():
+        current = assigned[r]
+        if current < 0:
+            continue
+        row = cand_idx_l[r]
+        current_km = cand_km_l[r][row.index(current)] if current in row else float("inf")
+        for c, dist in sorted(zip(row, cand_km_l[r]), key=lambda item: item[1]):
+            if dist >= current_km:
+                break
+            if remaining_arr[c] > 0:
+                remaining_arr[c] -= 1
+                remaining_arr[current] += 1
+                assigned[r] = c
+                break
+    return np.asarray(assigned, dtype=np.int64)
+
+
+def solve_backlog(
+    report_lat: np.ndarray,
+    report_lng: np.ndarray,
+    weights: np.ndarray,
+    cleaner_lat: np.ndarray,
+    cleaner_lng: np.ndarray,
+    capacity: np.ndarray,
+    max_km: float,
+) -> tuple[np.ndarray, str]:
+    # Cleaner index per report (-1 if unassigned) and the method used.
+    n = len(report_lat)
+    if n == 0 or len(cleaner_lat) == 0 or capacity.sum() == 0:
+        return np.full(n, -1, dtype=np.int64), "none"
+    slots = int(np.minimum(capacity, n).sum())
+    if n <= settings.backlog_exact_max_reports and slots <= settings.backlog_exact_max_slots:
+        distance_km = haversine_matrix(report_lat, report_lng, cleaner_lat, cleaner_lng)
+        return _solve_exact(distance_km, weights, capacity, max_km), "hungarian"
+    return _solve_greedy(report_lat, report_lng, weights, cleaner_lat, cleaner_lng, capacity, max_km), "greedy"
+
+
+async def _load_problem(database) -> tuple[list[dict], list[dict]]:
+    reports = await database.reports.find(
+        {"status": "Verified", "location.lat": {"$type": "number"}, "location.lng": {"$type": "number"}},
+        {"location": 1, "priority": 1, "citizen_id": 1},
+    ).to_list(None)
+    cleaners = await database.users.find(
+        {"role": "cleaner", "is_active": True, GEO_FIELD: {"$exists": True}},
+        {GEO_FIELD: 1, "open_tasks": 1, "max_tasks": 1},
+    ).to_list(None)
+    return reports, cleaners
+
+
+async def assign_backlog(
+    database, admin_id: ObjectId | None = None, dry_run: bool = False, max_km: float | None = None
+) -> BacklogPlan:
+    max_km = settings.cleaner_search_radius_km if max_km is None else max_km
+    reports, cleaners = await _load_problem(database)
+    plan = BacklogPlan(reports=len(reports), cleaners=len(cleaners))
+
+    report_lat = np.array([r["location"]["lat"] for r in reports], dtype=np.float64)
+    report_lng = np.array([r["location"]["lng"] for r in reports], dtype=np.float64)
+    weights = np.array([PRIORITY_WEIGHTS.get(r.get("priority"), 1.0) for r in reports], dtype=np.float64)
+    cleaner_lng = np.array([c[GEO_FIELD]["coordinates"][0] for c in cleaners], dtype=np.float64)
+    cleaner_lat = np.array([c[GEO_FIELD]["coordinates"][1] for c in cleaners], dtype=np.float64)
+    capacity = np.array(
+        [max(0, c.get("max_tasks", settings.cleaner_max_open_tasks) - c.get("open_tasks", 0)) for c in cleaners],
+        dtype=np.int64,
+    )
+    plan.capacity = int(capacity.sum())
+
+    started = time.perf_counter()
+    assigned, plan.method = await asyncio.to_thread(
+        solve_backlog, report_lat, report_lng, weights, cleaner_lat, cleaner_lng, capacity, max_km
+    )
+    plan.solve_s = round(time.perf_counter() - started, 3)
+
+    rows = np.nonzero(assigned >= 0)[0]
+    plan.assigned = len(rows)
+    plan.unassigned = len(reports) - len(rows)
+    if len(rows):
+        km = haversine_pairs(report_lat[rows], report_lng[rows], cleaner_lat[assigned[rows]], cleaner_lng[assigned[rows]])
+        plan.total_km = round(float(km.sum()), 2)
+        plan.weighted_km = round(float((km * weights[rows]).sum()), 2)
+    if dry_run or not len(rows):
+        return plan
+
+    now = datetime.now(UTC)
+    by_cleaner: dict[int, list[int]] = {}
+    for r in rows.tolist():
+        by_cleaner.setdefault(int(assigned[r]), []).append(r)
+
+    # Capacity was read before solving; live assignments may have used some of it since.
+    # Each cleaner's share is reserved atomically against max_tasks, as reserve_cleaner does
+    # for single assignments, and reports of cleaners it no longer fits stay Verified.
+    cleaner_ids = [cleaners[c]["_id"] for c in by_cleaner]
+    reserved = await asyncio.gather(
+        *(reserve_cleaner(database, cleaner_id, len(planned)) for cleaner_id, planned in zip(cleaner_ids, by_cleaner.values()))
+    )
+
+    report_ops = []
+    report_ids = []
+    notifications = []
+    reserved_slots: dict[ObjectId, int] = {}
+    for cleaner_id, planned, ok in zip(cleaner_ids, by_cleaner.values(), reserved):
+        if not ok:
+            continue
+        reserved_slots[cleaner_id] = len(planned)
+        for r in planned:
+            report = reports[r]
+            report_ids.append(report["_id"])
+            report_ops.append(
+                UpdateOne(
+                    {"_id": report["_id"], "status": "Verified"},
+                    {
+                        "$set": {
+                            "status": "Assigned",
+                            "assigned_cleaner_id": cleaner_id,
+                            "assigned_by_admin_id": admin_id,
+                            "assigned_by_ai": admin_id is None,
+                            "assigned_at": now,
+                        }
+                    },
+                )
+            )
+            notifications.append(
+                {
+                    "user_id": cleaner_id,
+                    "type": "task_assigned",
+                    "title": "New task assigned",
+                    "message": "A new cleanup task has been assigned to you.",
+                    "meta": {"report_id": str(report["_id"]), "priority": report.get("priority")},
+                    "read": False,
+                    "created_at": now,
+                }
+            )
+
+    applied_count = 0
+    if report_ops:
+        result = await database.reports.bulk_write(report_ops, ordered=False)
+        applied_count = result.modified_count
+    if applied_count < len(report_ops):
+        # Some reports changed under us: give back the slots reserved for them, and notify
+        # only for reports that are now assigned as planned.
+        applied_per_cleaner: dict[ObjectId, int] = {}
+        applied = set()
+        async for doc in database.reports.find(
+            {"_id": {"$in": report_ids}, "assigned_at": now}, {"_id": 1, "assigned_cleaner_id": 1}
+        ):
+            applied.add(doc["_id"])
+            owner = doc["assigned_cleaner_id"]
+            applied_per_cleaner[owner] = applied_per_cleaner.get(owner, 0) + 1
+        await asyncio.gather(
+            *(
+                release_task(database, cleaner_id, slots - applied_per_cleaner.get(cleaner_id, 0))
+                for cleaner_id, slots in reserved_slots.items()
+            )
+        )
+        notifications = [n for n in notifications if ObjectId(n["meta"]["report_id"]) in applied]
+        applied_count = len(applied)
+    if notifications:
+        await database.notifications.insert_many(notifications, ordered=False)
+    plan.assigned = applied_count
+    plan.unassigned = len(reports) - applied_count
+    plan.applied = True
+    logger.info("Backlog assignment applied", extra=plan.as_dict())
+    return plan
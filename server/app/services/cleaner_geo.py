@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from math import asin, cos, radians, sin, sqrt
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.config import settings
+
+# GeoJSON copy of a cleaner's ``location`` ({lat, lng}), covered by a 2dsphere index.
+GEO_FIELD = "location_point"
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    r = EARTH_RADIUS_KM
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    return r * c
+
+
+def haversine_matrix(lat1: np.ndarray, lng1: np.ndarray, lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km between every point of set 1 (rows) and set 2 (columns)."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lng1, lat2, lng2))
+    dlat = lat2[None, :] - lat1[:, None]
+    dlng = lng2[None, :] - lng1[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_pairs(lat1: np.ndarray, lng1: np.ndarray, lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geojson_point(lat: float, lng: float) -> dict:
+    # GeoJSON order is [longitude, latitude].
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+async def backfill_cleaner_points(database) -> int:
+    """Derive ``location_point`` for cleaners that only have the legacy ``{lat, lng}``."""
+    result = await database.users.update_many(
+        {
+            "role": "cleaner",
+            "location.lat": {"$type": "number"},
+            "location.lng": {"$type": "number"},
+            GEO_FIELD: {"$exists": False},
+        },
+        [{"$set": {GEO_FIELD: {"type": "Point", "coordinates": ["$location.lng", "$location.lat"]}}}],
+    )
+    return result.modified_count
+
+
+async def nearest_cleaners(
+    database,
+    location: dict[str, float],
+    exclude_cleaner_id: ObjectId | None = None,
+    limit: int | None = None,
+    max_km: float | None = None,
+) -> list[dict]:
+    # Nearest first, each with distance_km.
+    lat = location.get("lat")
+    lng = location.get("lng")
+    if lat is None or lng is None:
+        return []
+
+    query: dict = {"role": "cleaner", "is_active": True}
+    if exclude_cleaner_id:
+        query["_id"] = {"$ne": exclude_cleaner_id}
+    max_km = settings.cleaner_search_radius_km if max_km is None else max_km
+    pipeline = [
+        {
+            "$geoNear": {
+                "near": geojson_point(lat, lng),
+                "key": GEO_FIELD,
+                "distanceField": "distance_m",
+                "maxDistance": max_km * 1000,
+                "query": query,
+                "spherical": True,
+            }
+        },
+        {"$limit": limit or settings.cleaner_candidates},
+        {"$project": {"password_hash": 0}},
+    ]
+    candidates = await database.users.aggregate(pipeline).to_list(None)
+    for candidate in candidates:
+        candidate["distance_km"] = candidate.pop("distance_m") / 1000
+    return candidates
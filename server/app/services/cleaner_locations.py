@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.services.cleaner_geo import GEO_FIELD, geojson_point
+
+logger = logging.getLogger("trashio.locations")
+
+# Stale positions are cleared at most this often, by whichever node gets there.
+EXPIRY_INTERVAL_SECONDS = 60.0
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def stale_cutoff(now: datetime | None = None) -> datetime:
+    return (now or datetime.now(UTC)) - timedelta(minutes=settings.location_stale_minutes)
+
+
+async def expire_stale_locations(database) -> int:
+    # Cleaners whose location predates pings (no location_at) are left alone.
+    result = await database.users.update_many(
+        {"role": "cleaner", "location_at": {"$lt": stale_cutoff()}},
+        {"$unset": {"location": "", GEO_FIELD: "", "location_at": ""}},
+    )
+    return result.modified_count
+
+
+# Latest ping per cleaner, written in one bulk_write per LOCATION_FLUSH_SECONDS.
+class LocationBuffer:
+    def __init__(self) -> None:
+        self.pending: dict[ObjectId, tuple[float, float, datetime]] = {}
+        self.task: asyncio.Task | None = None
+        self._get_database = None
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.expired = 0
+        self.last_flush_ms: float | None = None
+
+    def record(self, cleaner_id: ObjectId, lat: float, lng: float, recorded_at: datetime | None = None) -> bool:
+        now = datetime.now(UTC)
+        # Device clocks drift; a fix can't be from the future, and one already stale is useless.
+        at = min(_utc(recorded_at), now) if recorded_at else now
+        self.received += 1
+        if at < stale_cutoff(now):
+            self.dropped += 1
+            return False
+        current = self.pending.get(cleaner_id)
+        if current is None or at >= current[2]:
+            self.pending[cleaner_id] = (lat, lng, at)
+        return True
+
+    def position(self, cleaner_id: ObjectId) -> dict[str, float] | None:
+        # Received by this node but not flushed yet.
+        entry = self.pending.get(cleaner_id)
+        return {"lat": entry[0], "lng": entry[1]} if entry else None
+
+    def _merge_back(self, batch: dict[ObjectId, tuple[float, float, datetime]]) -> None:
+        for cleaner_id, entry in batch.items():
+            current = self.pending.get(cleaner_id)
+            if current is None or entry[2] > current[2]:
+                self.pending[cleaner_id] = entry
+
+    async def flush(self, database) -> int:
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, {}
+        # Every node buffers its own pings; an older fix flushed late must not win.
+        ops = [
+            UpdateOne(
+                {"_id": cleaner_id, "role": "cleaner", "$or": [{"location_at": None}, {"location_at": {"$lt": at}}]},
+                {"$set": {"location": {"lat": lat, "lng": lng}, GEO_FIELD: geojson_point(lat, lng), "location_at": at}},
+            )
+            for cleaner_id, (lat, lng, at) in batch.items()
+        ]
+        started = time.perf_counter()
+        try:
+            await database.users.bulk_write(ops, ordered=False)
+        except BaseException:
+            # Includes cancellation at shutdown, so close() can still write them.
+            # Keep the positions for the next round unless newer pings arrived meanwhile.
+            self._merge_back(batch)
+            raise
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.written += len(ops)
+        return len(ops)
+
+    async def _flush_loop(self) -> None:
+        last_expiry = 0.0
+        while True:
+            await asyncio.sleep(settings.location_flush_seconds)
+            try:
+                database = self._get_database()
+                await self.flush(database)
+                if time.monotonic() - last_expiry >= EXPIRY_INTERVAL_SECONDS:
+                    last_expiry = time.monotonic()
+                    self.expired += await expire_stale_locations(database)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Location flush failed", extra={"pending": len(self.pending)})
+
+    def start(self, get_database) -> None:
+        self._get_database = get_database
+        self.task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        try:
+            await self.flush(self._get_database())
+        except Exception:
+            logger.exception("Final location flush failed", extra={"pending": len(self.pending)})
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "received": self.received,
+            "dropped_stale": self.dropped,
+            "written": self.written,
+            "flushes": self.flushes,
+            "expired": self.expired,
+            "last_flush_ms": round(self.last_flush_ms, 1) if self.last_flush_ms is not None else None,
+        }
+
+
+location_buffer = LocationBuffer()
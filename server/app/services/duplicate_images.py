@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.utils.hash_index import MultiIndexHash, format_hash, parse_hash
+
+KINDS = ("before", "after")
+# ObjectIds carry the inserting node's clock; re-read a window to cover skew between nodes.
+SYNC_OVERLAP = timedelta(seconds=60)
+BACKFILL_BATCH = 1000
+DUPLICATE_KEY = 11000
+
+
+def _field(kind: str) -> str:
+    return f"{kind}_image_hash"
+
+
+async def _insert_new(database, rows: list[dict]) -> None:
+    # Another node may be backfilling, or a report recording its hash, at the same time.
+    try:
+        await database.image_hashes.insert_many(rows, ordered=False)
+    except BulkWriteError as exc:
+        if any(error.get("code") != DUPLICATE_KEY for error in exc.details.get("writeErrors", [])):
+            raise
+
+
+async def ensure_hash_index(database) -> None:
+    # Rows repeated by older inserts would make the unique index fail to build.
+    pipeline = [
+        {
+            "$group": {
+                "_id": {"kind": "$kind", "report_id": "$report_id", "hash": "$hash"},
+                "ids": {"$push": "$_id"},
+                "n": {"$sum": 1},
+            }
+        },
+        {"$match": {"n": {"$gt": 1}}},
+    ]
+    async for group in database.image_hashes.aggregate(pipeline, allowDiskUse=True):
+        await database.image_hashes.delete_many({"_id": {"$in": group["ids"][1:]}})
+    await database.image_hashes.create_index([("kind", 1), ("report_id", 1), ("hash", 1)], unique=True)
+
+
+# Each node keeps its own copy and tails image_hashes; a candidate only counts while some
+# other report still has the hash.
+class DuplicateImageIndex:
+    def __init__(self) -> None:
+        self.indexes = {kind: MultiIndexHash() for kind in KINDS}
+        self.loaded = False
+        self.synced_at: datetime | None = None
+        self.next_sync = 0.0
+        self.lock = asyncio.Lock()
+
+    def _add(self, kind: str, image_hash: str | None) -> None:
+        value = parse_hash(image_hash)
+        if value is not None and kind in self.indexes:
+            self.indexes[kind].add(value)
+
+    async def _backfill(self, database) -> None:
+        batch: list[dict] = []
+        projection = {_field(kind): 1 for kind in KINDS}
+        async for doc in database.reports.find({"$or": [{_field(kind): {"$ne": None}} for kind in KINDS]}, projection):
+            for kind in KINDS:
+                if doc.get(_field(kind)):
+                    batch.append({"kind": kind, "hash": doc[_field(kind)], "report_id": doc["_id"]})
+            if len(batch) >= BACKFILL_BATCH:
+                await _insert_new(database, batch)
+                batch = []
+        if batch:
+            await _insert_new(database, batch)
+
+    async def sync(self, database) -> None:
+        if self.loaded and time.monotonic() < self.next_sync:
+            return
+        async with self.lock:
+            if self.loaded and time.monotonic() < self.next_sync:
+                return
+            started = datetime.now(UTC)
+            query: dict = {}
+            if not self.loaded:
+                if await database.image_hashes.estimated_document_count() == 0:
+                    await self._backfill(database)
+            elif self.synced_at is not None:
+                query = {"_id": {"$gte": ObjectId.from_datetime(self.synced_at - SYNC_OVERLAP)}}
+            async for doc in database.image_hashes.find(query, {"kind": 1, "hash": 1}):
+                self._add(doc["kind"], doc["hash"])
+            self.loaded = True
+            self.synced_at = started
+            self.next_sync = time.monotonic() + settings.duplicate_index_sync_seconds
+
+    async def has_duplicate(self, database, kind: str, image_hash: str, report_id: ObjectId) -> bool:
+        field = _field(kind)
+        value = parse_hash(image_hash)
+        if value is None:
+            # Not a 64-bit hash: only exact matches are possible.
+            candidates = [image_hash]
+        else:
+            await self.sync(database)
+            candidates = [format_hash(match) for match in self.indexes[kind].within(value, settings.duplicate_hash_distance)]
+            if not candidates:
+                return False
+        match = await database.reports.find_one({field: {"$in": candidates}, "_id": {"$ne": report_id}}, {"_id": 1})
+        return match is not None
+
+    async def record(self, database, kind: str, image_hash: str | None, report_id: ObjectId) -> None:
+        if not image_hash:
+            return
+        # Job retries, the reconciler and re-analysis after a reclean record the same hash
+        # again; the upsert keeps one row per report and hash.
+        key = {"kind": kind, "report_id": report_id, "hash": image_hash}
+        await database.image_hashes.update_one(key, {"$setOnInsert": key}, upsert=True)
+        self._add(kind, image_hash)
+
+
+duplicate_index = DuplicateImageIndex()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import types
+from functools import lru_cache
+from typing import Any
+
+from app.core.config import settings
+from app.utils.image_pool import run_image_task
+
+logger = logging.getLogger("trashio.inprocess_ai")
+
+# ai_service's package is also called "app", so it is mounted under another name.
+AI_PACKAGE = "trashio_ai"
+# A relative AI_SERVICE_DIR is taken from the server directory, not the working directory,
+# so ``uvicorn --app-dir server`` from the repo root finds it too.
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Items per pool task for batch analysis, as ai_service's AI_BATCH_CHUNK_SIZE.
+BATCH_CHUNK_SIZE = 8
+
+
+def ai_service_dir() -> str:
+    return os.path.normpath(os.path.join(SERVER_DIR, settings.ai_service_dir))
+
+
+@lru_cache(maxsize=1)
+def _package() -> types.ModuleType:
+    package = types.ModuleType(AI_PACKAGE)
+    package.__path__ = [os.path.join(ai_service_dir(), "app")]
+    sys.modules[AI_PACKAGE] = package
+    return package
+
+
+def _analysis() -> types.ModuleType:
+    _package()
+    return importlib.import_module(f"{AI_PACKAGE}.analysis")
+
+
+def _cache_index():
+    _package()
+    return importlib.import_module(f"{AI_PACKAGE}.cache").cache_index
+
+
+def load_analyzer() -> None:
+    # Called at startup so a missing ai_service checkout or numpy fails loudly, not per report.
+    _analysis()
+    # Pool workers write the feature cache; as in ai_service, this process owns its LRU
+    # index and evicts down to AI_CACHE_MB from the stats each job returns.
+    _cache_index().load()
+
+
+def _before_job(payload: dict[str, Any]) -> tuple[dict[str, Any], dict]:
+    return _analysis().run_before_job(payload, None)
+
+
+def _after_job(payload: dict[str, Any]) -> tuple[dict[str, Any], dict]:
+    return _analysis().run_after_job(payload, None)
+
+
+def _before_batch_job(payloads: list[dict[str, Any]]) -> tuple[list[dict], dict]:
+    return _analysis().run_before_batch_job(payloads, None)
+
+
+def _after_batch_job(payloads: list[dict[str, Any]]) -> tuple[list[dict], dict]:
+    return _analysis().run_after_batch_job(payloads, None)
+
+
+async def _run(job, payload: dict[str, Any]) -> dict[str, Any] | None:
+    # Same contract as the HTTP client: any failure leaves the report for a later retry.
+    try:
+        result, stats = await run_image_task(job, payload)
+    except Exception:
+        logger.warning("In-process analysis failed for report %s", payload.get("report_id"), exc_info=True)
+        return None
+    _cache_index().record(stats)
+    return result
+
+
+async def _run_batch(job, payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    # One pool task per chunk, and no more chunks in flight than there are workers, so a
+    # large batch queues here instead of overflowing the pool into 503s.
+    slots = asyncio.Semaphore(max(1, settings.image_pool_workers))
+
+    async def run_chunk(chunk: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+        async with slots:
+            try:
+                outcomes, stats = await run_image_task(job, chunk)
+            except Exception:
+                logger.warning("In-process batch analysis failed for %d reports", len(chunk), exc_info=True)
+                return [None] * len(chunk)
+        _cache_index().record(stats)
+        return [outcome.get("result") for outcome in outcomes]
+
+    chunks = [payloads[i : i + BATCH_CHUNK_SIZE] for i in range(0, len(payloads), BATCH_CHUNK_SIZE)]
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+    return [result for chunk in results for result in chunk]
+
+
+async def analyze_before(payload: dict[str, Any]) -> dict[str, Any] | None:
+    return await _run(_before_job, payload)
+
+
+async def analyze_after(payload: dict[str, Any]) -> dict[str, Any] | None:
+    return await _run(_after_job, payload)
+
+
+async def analyze_before_batch(payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    return await _run_batch(_before_batch_job, payloads)
+
+
+async def analyze_after_batch(payloads: list[dict[str, Any]]) -> list[dict[str, Any] | None]:
+    return await _run_batch(_after_batch_job, payloads)
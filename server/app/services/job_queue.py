@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.db.locks import LOCK_OWNER
+from app.services.ai_workflow import process_cleaning_verification, process_new_report
+from app.services.analyzer import ai_state
+
+logger = logging.getLogger("trashio.jobs")
+
+# Higher runs first. Live submissions go ahead of reports re-queued by the reconciler.
+PRIORITY_LIVE = 10
+PRIORITY_RECONCILE = 0
+
+JOB_STATUSES = ("queued", "running", "done", "dead")
+
+
+class RetryableJobError(Exception):
+    pass
+
+
+def _utc(value: datetime) -> datetime:
+    # Motor hands back naive datetimes (in UTC) unless the client is tz-aware.
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+async def _analyze_before(database, report: dict) -> None:
+    if report["status"] != "Pending" or report.get("ai_decision") is not None:
+        return
+    updated = await process_new_report(database, report)
+    # Retry only if the AI gave no answer; a report an admin moved on meanwhile is done.
+    if updated and updated["status"] == "Pending" and updated.get("ai_decision") is None:
+        raise RetryableJobError("AI service gave no answer")
+
+
+async def _analyze_after(database, report: dict) -> None:
+    if report["status"] != "Cleaned" or report.get("ai_decision") is not None:
+        return
+    updated = await process_cleaning_verification(database, report)
+    if updated and updated["status"] == "Cleaned" and updated.get("ai_decision") is None:
+        raise RetryableJobError("AI service gave no answer")
+
+
+# Each handler re-reads the report and does nothing if it has moved on (e.g. an admin
+# reviewed it meanwhile), and every AI write is conditional on the status the job started
+# from, so an admin decision made while a job runs, or a job run twice after a lost lease,
+# is never overwritten.
+JOB_HANDLERS = {
+    "analyze_before": _analyze_before,
+    "analyze_after": _analyze_after,
+}
+
+
+# Jobs live in the jobs collection and are worked by every API node; failed jobs end up
+# "dead" after JOB_MAX_ATTEMPTS for an admin to retry.
+class JobQueue:
+    def __init__(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.tasks: list[asyncio.Task] = []
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+        self.wait_ms: deque[float] = deque(maxlen=1024)
+        self.run_ms: deque[float] = deque(maxlen=1024)
+
+    async def enqueue(self, database, kind: str, report_id: ObjectId, priority: int = PRIORITY_LIVE) -> ObjectId:
+        now = datetime.now(UTC)
+        result = await database.jobs.insert_one(
+            {
+                "kind": kind,
+                "report_id": report_id,
+                "priority": priority,
+                "status": "queued",
+                "attempts": 0,
+                "available_at": now,
+                "enqueued_at": now,
+                "locked_until": None,
+                "worker": None,
+                "last_error": None,
+            }
+        )
+        self.wakeup.set()
+        return result.inserted_id
+
+    async def claim(self, database) -> dict | None:
+        now = datetime.now(UTC)
+        return await database.jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued", "available_at": {"$lte": now}},
+                    # Lease expired: the worker holding it died or hung.
+                    {"status": "running", "locked_until": {"$lt": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": LOCK_OWNER,
+                    "started_at": now,
+                    "locked_until": now + timedelta(seconds=settings.job_visibility_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _finish(self, database, job: dict, update: dict[str, Any]) -> None:
+        # Conditional on still holding the lease, so a job reclaimed elsewhere is left alone.
+        await database.jobs.update_one({"_id": job["_id"], "worker": LOCK_OWNER, "status": "running"}, {"$set": update})
+
+    async def run_one(self, database, job: dict) -> None:
+        started = time.perf_counter()
+        self.wait_ms.append((_utc(job["started_at"]) - _utc(job["enqueued_at"])).total_seconds() * 1000)
+        error: str | None = None
+        if job["attempts"] <= settings.job_max_attempts:
+            try:
+                report = await database.reports.find_one({"_id": job["report_id"]})
+                if report is not None:
+                    await JOB_HANDLERS[job["kind"]](database, report)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                error = f"{exc.__class__.__name__}: {exc}"
+                if not isinstance(exc, RetryableJobError):
+                    logger.exception("Job %s (%s) failed", job["_id"], job["kind"])
+        else:
+            error = "Lease expired too many times"
+        self.run_ms.append((time.perf_counter() - started) * 1000)
+
+        now = datetime.now(UTC)
+        if error is None:
+            self.completed += 1
+            await self._finish(database, job, {"status": "done", "finished_at": now, "locked_until": None})
+        elif job["attempts"] >= settings.job_max_attempts:
+            self.dead += 1
+            logger.warning("Job %s (%s) is dead after %s attempts: %s", job["_id"], job["kind"], job["attempts"], error)
+            await self._finish(database, job, {"status": "dead", "finished_at": now, "locked_until": None, "last_error": error})
+        else:
+            self.retried += 1
+            delay = random.uniform(0.5, 1.0) * settings.job_retry_backoff_seconds * 2 ** (job["attempts"] - 1)
+            await self._finish(
+                database,
+                job,
+                {
+                    "status": "queued",
+                    "available_at": now + timedelta(seconds=delay),
+                    "locked_until": None,
+                    "last_error": error,
+                },
+            )
+
+    async def _worker(self, get_database) -> None:
+        while True:
+            try:
+                # Every job needs the AI service; leave them queued while it is down.
+                job = await self.claim(get_database()) if ai_state() != "open" else None
+                if job is None:
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=settings.job_poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run_one(get_database(), job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker iteration failed")
+                await asyncio.sleep(settings.job_poll_seconds)
+
+    def start(self, get_database) -> None:
+        self.tasks = [asyncio.create_task(self._worker(get_database)) for _ in range(settings.job_workers)]
+
+    def stop(self) -> None:
+        # A job cut off here is picked up again when its lease expires.
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    async def retry_dead(self, database) -> int:
+        result = await database.jobs.update_many(
+            {"status": "dead"},
+            {"$set": {"status": "queued", "attempts": 0, "available_at": datetime.now(UTC), "finished_at": None}},
+        )
+        if result.modified_count:
+            self.wakeup.set()
+        return result.modified_count
+
+    async def metrics(self, database) -> dict[str, Any]:
+        depth = {name: 0 for name in JOB_STATUSES}
+        async for row in database.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            depth[row["_id"]] = row["count"]
+        oldest = await database.jobs.find_one({"status": "queued"}, {"enqueued_at": 1}, sort=[("enqueued_at", 1)])
+        oldest_age = (datetime.now(UTC) - _utc(oldest["enqueued_at"])).total_seconds() if oldest else 0.0
+
+        def pct(values: deque[float], p: float) -> float | None:
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else None
+
+        return {
+            "depth": depth,
+            "oldest_queued_s": round(oldest_age, 1),
+            "workers": len(self.tasks),
+            # The rest covers jobs run by this node since it started.
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead": self.dead,
+            "wait_ms": {"p50": pct(self.wait_ms, 0.5), "p95": pct(self.wait_ms, 0.95)},
+            "run_ms": {"p50": pct(self.run_ms, 0.5), "p95": pct(self.run_ms, 0.95)},
+        }
+
+
+job_queue = JobQueue()
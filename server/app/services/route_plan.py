@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.config import settings
+from app.services.backlog_optimizer import PRIORITY_WEIGHTS
+from app.services.cleaner_geo import haversine_matrix
+
+# Tasks the cleaner still has to visit; Cleaned ones are waiting on verification, not on them.
+ROUTE_STATUSES = ("Assigned",)
+# Unprioritised reports are routed like Low ones.
+DEFAULT_WEIGHT = PRIORITY_WEIGHTS["Low"]
+# Positions closer than this (in degrees, about 100 m) share a cached plan.
+ORIGIN_PRECISION = 3
+TWO_OPT_PASSES = 8
+
+
+@dataclass
+class RoutePlan:
+    origin: dict[str, float]
+    stops: list[dict] = field(default_factory=list)
+    legs_km: list[float] = field(default_factory=list)
+    total_km: float = 0.0
+    cached: bool = False
+
+
+def _weighted_cost(order: np.ndarray, distance_km: np.ndarray, weights: np.ndarray) -> float:
+    # Index 0 of ``distance_km`` is the origin; ``order`` holds task indices (1-based rows).
+    path = np.concatenate(([0], order))
+    arrival_km = np.cumsum(distance_km[path[:-1], path[1:]])
+    return float(np.dot(weights[order - 1], arrival_km))
+
+
+def _nearest_neighbour(distance_km: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    n = len(weights)
+    remaining = np.ones(n + 1, dtype=bool)
+    remaining[0] = False
+    order = np.empty(n, dtype=np.int64)
+    current = 0
+    for step in range(n):
+        # Distance per unit of priority, so a High report slightly further away still comes first.
+        score = np.where(remaining[1:], distance_km[current, 1:] / weights, np.inf)
+        current = int(np.argmin(score)) + 1
+        order[step] = current
+        remaining[current] = False
+    return order
+
+
+def _two_opt(order: np.ndarray, distance_km: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # Reversing a segment changes every arrival after it, so each move is re-scored whole;
+    # a cleaner has at most a few dozen open tasks, which keeps that cheap.
+    best = _weighted_cost(order, distance_km, weights)
+    n = len(order)
+    for _ in range(TWO_OPT_PASSES):
+        improved = False
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                candidate = order.copy()
+                candidate[i : j + 1] = candidate[i : j + 1][::-1]
+                cost = _weighted_cost(candidate, distance_km, weights)
+                if cost < best - 1e-9:
+                    order, best, improved = candidate, cost, True
+        if not improved:
+            break
+    return order
+
+
+def plan_route(origin: dict[str, float], tasks: list[dict]) -> RoutePlan:
+    # Minimises priority-weighted arrival distance: nearest-neighbour start, then 2-opt.
+    plan = RoutePlan(origin=origin)
+    if not tasks:
+        return plan
+
+    lat = np.array([origin["lat"]] + [t["location"]["lat"] for t in tasks])
+    lng = np.array([origin["lng"]] + [t["location"]["lng"] for t in tasks])
+    weights = np.array([PRIORITY_WEIGHTS.get(t.get("priority"), DEFAULT_WEIGHT) for t in tasks])
+    distance_km = haversine_matrix(lat, lng, lat, lng)
+
+    order = _nearest_neighbour(distance_km, weights)
+    if len(order) > 2:
+        order = _two_opt(order, distance_km, weights)
+
+    path = np.concatenate(([0], order))
+    legs = distance_km[path[:-1], path[1:]]
+    plan.stops = [tasks[i - 1] for i in order]
+    plan.legs_km = [round(float(km), 3) for km in legs]
+    plan.total_km = round(float(legs.sum()), 3)
+    return plan
+
+
+# Keyed by the cleaner's open task set, so any assignment change misses without invalidation.
+class RouteCache:
+    def __init__(self) -> None:
+        self._plans: OrderedDict[tuple, RoutePlan] = OrderedDict()
+
+    @staticmethod
+    def key(cleaner_id: ObjectId, origin: dict[str, float], tasks: list[dict]) -> tuple:
+        return (
+            cleaner_id,
+            round(origin["lat"], ORIGIN_PRECISION),
+            round(origin["lng"], ORIGIN_PRECISION),
+            tuple(sorted((t["_id"], t.get("priority")) for t in tasks)),
+        )
+
+    def get(self, key: tuple) -> RoutePlan | None:
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+        return plan
+
+    def put(self, key: tuple, plan: RoutePlan) -> None:
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > settings.route_cache_entries:
+            self._plans.popitem(last=False)
+
+
+route_cache = RouteCache()
+
+
+async def open_route_tasks(database, cleaner_id: ObjectId) -> list[dict]:
+    tasks = []
+    async for report in database.reports.find({"assigned_cleaner_id": cleaner_id, "status": {"$in": list(ROUTE_STATUSES)}}):
+        location = report.get("location") or {}
+        if "lat" in location and "lng" in location:
+            tasks.append(report)
+    return tasks
+
+
+async def cleaner_route(database, cleaner_id: ObjectId, origin: dict[str, float]) -> RoutePlan:
+    tasks = await open_route_tasks(database, cleaner_id)
+    key = route_cache.key(cleaner_id, origin, tasks)
+    cached = route_cache.get(key)
+    if cached is not None:
+        # Same stops and order; report fields (e.g. reclean flags) come from this read.
+        by_id = {t["_id"]: t for t in tasks}
+        return RoutePlan(
+            origin=origin,
+            stops=[by_id[s["_id"]] for s in cached.stops],
+            legs_km=cached.legs_km,
+            total_km=cached.total_km,
+            cached=True,
+        )
+    plan = plan_route(origin, tasks)
+    route_cache.put(key, plan)
+    return plan
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.models.report import ReportCreate, report_doc_from_create
+from app.services.job_queue import job_queue
+from app.services.upload_refs import add_upload_ref
+from app.utils.uploads import SavedUpload
+
+
+def check_after_upload_allowed(report: dict | None, cleaner_id: ObjectId) -> dict:
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report.get("assigned_cleaner_id") != cleaner_id:
+        raise HTTPException(status_code=403, detail="Not assigned to this report")
+    if report["status"] != "Assigned":
+        raise HTTPException(status_code=409, detail="Only Assigned reports can be cleaned")
+    return report
+
+
+async def submit_new_report(database, citizen_id: ObjectId, payload: ReportCreate, before: SavedUpload) -> dict:
+    doc = report_doc_from_create(citizen_id, payload, before.url, before.thumb_url)
+
+    result = await database.reports.insert_one(doc)
+    await add_upload_ref(database, before, result.inserted_id)
+    # AI review, duplicate checks and assignment happen in the job queue; the report
+    # stays Pending until a worker gets to it.
+    await job_queue.enqueue(database, "analyze_before", result.inserted_id)
+    return await database.reports.find_one({"_id": result.inserted_id})
+
+
+async def submit_after_photo(database, report: dict, cleaner_id: ObjectId, after: SavedUpload) -> dict:
+    rid = report["_id"]
+    now = datetime.now(UTC)
+
+    # The Assigned/owner check ran before the upload was streamed; the report may have been
+    # reassigned or reviewed since, so the write only applies if that still holds.
+    result = await database.reports.update_one(
+        {"_id": rid, "status": "Assigned", "assigned_cleaner_id": cleaner_id},
+        {
+            "$set": {
+                "status": "Cleaned",
+                "after_image_url": after.url,
+                "after_image_thumb_url": after.thumb_url,
+                "cleaned_at": now,
+                # Cleared until the after-photo is analyzed, so a failed analysis is retried.
+                "ai_decision": None,
+            }
+        },
+    )
+    if not result.modified_count:
+        raise HTTPException(status_code=409, detail="Report is no longer assigned to you")
+
+    await add_upload_ref(database, after, rid)
+
+    await job_queue.enqueue(database, "analyze_after", rid)
+    return await database.reports.find_one({"_id": rid})
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from app.core.config import settings
+from app.db.locks import release_lease, try_acquire_lease
+from app.services.upload_refs import add_upload_ref, release_upload_ref
+from app.utils.derivatives import Variant, derived_root, source_relpath, variant_url
+from app.utils.image_pool import run_image_task
+from app.utils.imaging import recompress_image
+from app.utils.storage import local_path, relpath_from_url, store_blob, upload_url
+from app.utils.uploads import SavedUpload
+
+logger = logging.getLogger("trashio.upload_gc")
+
+IMAGE_URL_FIELDS = (
+    "before_image_url",
+    "before_image_thumb_url",
+    "after_image_url",
+    "after_image_thumb_url",
+)
+COMPACT_STATUSES = ("Approved", "Rejected")
+GC_LEASE = "upload_gc"
+
+
+@dataclass
+class GcReport:
+    scanned: int = 0
+    candidates: int = 0
+    deleted: int = 0
+    freed_bytes: int = 0
+    compacted: int = 0
+    compacted_saved_bytes: int = 0
+    dry_run: bool = False
+    duration_s: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+async def referenced_relpaths(database) -> set[str]:
+    referenced: set[str] = set()
+    projection = {name: 1 for name in IMAGE_URL_FIELDS}
+    async for doc in database.reports.find({}, projection):
+        for name in IMAGE_URL_FIELDS:
+            relpath = relpath_from_url(doc.get(name))
+            if relpath:
+                referenced.add(relpath)
+    async for doc in database.uploads.find({"report_ids.0": {"$exists": True}}, {"_id": 1}):
+        referenced.add(doc["_id"])
+    return referenced
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _scan(
+    grace_cutoff: float,
+    referenced: set[str],
+    live_sessions: set[str],
+) -> tuple[int, list[tuple[str, int, str | None]]]:
+    root = settings.upload_dir
+    scanned = 0
+    orphans: list[tuple[str, int, str | None]] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        top = rel_dir.split(os.sep, 1)[0]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            scanned += 1
+            if stat.st_mtime > grace_cutoff:
+                continue
+
+            if top == ".tmp":
+                orphans.append((path, stat.st_size, None))
+            elif top == ".partial":
+                if name not in live_sessions:
+                    orphans.append((path, stat.st_size, None))
+            elif top == ".derived":
+                # A rendition is garbage once its source original is unreferenced.
+                source = source_relpath(os.path.relpath(path, derived_root()).replace(os.sep, "/"))
+                if source not in referenced:
+                    orphans.append((path, stat.st_size, None))
+            elif not top.startswith("."):
+                relpath = os.path.relpath(path, root).replace(os.sep, "/")
+                if relpath not in referenced:
+                    orphans.append((path, stat.st_size, relpath))
+        dirnames[:] = [d for d in dirnames if rel_dir != "." or d in {".tmp", ".derived", ".partial"} or not d.startswith(".")]
+    return scanned, orphans
+
+
+def _source_of(path: str, relpath: str | None) -> str | None:
+    # The stored original an orphan belongs to: itself, or the one a rendition was made from.
+    if relpath:
+        return relpath
+    derived = os.path.relpath(path, derived_root())
+    if derived.startswith(".."):
+        return None
+    return source_relpath(derived.replace(os.sep, "/"))
+
+
+async def _rereferenced(database, batch: list[tuple[str, int, str | None]]) -> set[str]:
+    # Deletion is paced, so a batch can run minutes after the scan; a dedup hit may have
+    # picked one of its blobs up again since.
+    sources = {source for path, _, relpath in batch if (source := _source_of(path, relpath))}
+    if not sources:
+        return set()
+    found = {
+        doc["_id"]
+        async for doc in database.uploads.find({"_id": {"$in": list(sources)}, "report_ids.0": {"$exists": True}}, {"_id": 1})
+    }
+    patterns = [re.compile(f"^{re.escape(upload_url(relpath))}(\\?|$)") for relpath in sources - found]
+    if patterns:
+        projection = {name: 1 for name in IMAGE_URL_FIELDS}
+        query = {"$or": [{name: {"$in": patterns}} for name in IMAGE_URL_FIELDS]}
+        async for doc in database.reports.find(query, projection):
+            found.update(relpath for name in IMAGE_URL_FIELDS if (relpath := relpath_from_url(doc.get(name))))
+    return found
+
+
+def _delete_batch(batch: list[tuple[str, int, str | None]], grace_cutoff: float) -> tuple[int, int, list[str]]:
+    deleted = 0
+    freed = 0
+    errors: list[str] = []
+    for path, size, _ in batch:
+        try:
+            # store_blob refreshes the mtime of a blob it reuses.
+            if os.stat(path).st_mtime > grace_cutoff:
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as exc:
+            errors.append(f"{path}: {exc}")
+            continue
+        deleted += 1
+        freed += size
+    return deleted, freed, errors
+
+
+async def collect_garbage(database, *, dry_run: bool = False) -> GcReport:
+    started = time.perf_counter()
+    report = GcReport(dry_run=dry_run)
+
+    referenced = await referenced_relpaths(database)
+    live_sessions = {
+        str(doc["_id"])
+        async for doc in database.upload_sessions.find(
+            {"status": {"$ne": "Finalized"}, "expires_at": {"$gt": datetime.now(UTC)}},
+            {"_id": 1},
+        )
+    }
+    # Files younger than the grace period may belong to a report that is still being created.
+    grace_cutoff = time.time() - settings.upload_gc_grace_minutes * 60
+    report.scanned, orphans = await asyncio.to_thread(_scan, grace_cutoff, referenced, live_sessions)
+    report.candidates = len(orphans)
+
+    if dry_run:
+        report.freed_bytes = sum(size for _, size, _ in orphans)
+    else:
+        batch_size = max(1, settings.upload_gc_batch_size)
+        min_batch_seconds = batch_size / settings.upload_gc_deletes_per_second if settings.upload_gc_deletes_per_second > 0 else 0
+        for offset in range(0, len(orphans), batch_size):
+            batch_started = time.perf_counter()
+            batch = orphans[offset : offset + batch_size]
+            rereferenced = await _rereferenced(database, batch)
+            if rereferenced:
+                batch = [entry for entry in batch if _source_of(entry[0], entry[2]) not in rereferenced]
+            deleted, freed, errors = await asyncio.to_thread(_delete_batch, batch, grace_cutoff)
+            report.deleted += deleted
+            report.freed_bytes += freed
+            report.errors.extend(errors)
+            stored = [relpath for _, _, relpath in batch if relpath]
+            if stored:
+                await database.uploads.delete_many({"_id": {"$in": stored}, "report_ids": {"$size": 0}})
+            # I/O budget: never delete faster than UPLOAD_GC_DELETES_PER_SECOND.
+            pause = min_batch_seconds - (time.perf_counter() - batch_started)
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+    report.duration_s = round(time.perf_counter() - started, 3)
+    logger.info("Upload GC finished", extra=report.as_dict())
+    return report
+
+
+async def _compact_image(database, report: dict, url_field: str, thumb_field: str) -> int:
+    src_relpath = relpath_from_url(report.get(url_field))
+    if not src_relpath or src_relpath.endswith(".webp"):
+        return 0
+    src_path = local_path(src_relpath)
+    if not os.path.isfile(src_path):
+        return 0
+
+    tmp_dir = f"{settings.upload_dir}/.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = f"{tmp_dir}/compact_{uuid4().hex}.webp"
+    try:
+        await run_image_task(
+            recompress_image,
+            src_path,
+            tmp_path,
+            settings.upload_compact_quality,
+            settings.image_webp_method,
+        )
+        old_size = os.path.getsize(src_path)
+        new_size = os.path.getsize(tmp_path)
+        if new_size >= old_size:
+            os.remove(tmp_path)
+            return 0
+        sha256 = await asyncio.to_thread(_file_sha256, tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    relpath, _ = store_blob(tmp_path, sha256, ".webp")
+    url = upload_url(relpath)
+    thumb_url = variant_url(url, Variant(width=settings.image_thumb_px, fmt="webp"))
+    await database.reports.update_one(
+        {"_id": report["_id"], url_field: report.get(url_field)},
+        {"$set": {url_field: url, thumb_field: thumb_url}},
+    )
+    await add_upload_ref(database, SavedUpload(url=url, thumb_url=thumb_url, sha256=sha256, size=new_size), report["_id"])
+    # The old original becomes unreferenced and is removed by the next GC pass.
+    await release_upload_ref(database, report.get(url_field), report["_id"])
+    return old_size - new_size
+
+
+async def compact_uploads(database, report: GcReport | None = None) -> GcReport:
+    started = time.perf_counter()
+    report = report or GcReport()
+    if settings.upload_compact_after_days <= 0:
+        return report
+
+    cutoff = datetime.now(UTC) - timedelta(days=settings.upload_compact_after_days)
+    cursor = database.reports.find(
+        {
+            "status": {"$in": list(COMPACT_STATUSES)},
+            "created_at": {"$lt": cutoff},
+            "images_compacted": {"$ne": True},
+        },
+        {name: 1 for name in IMAGE_URL_FIELDS},
+    ).limit(settings.upload_compact_batch_size)
+
+    async for doc in cursor:
+        try:
+            saved = await _compact_image(database, doc, "before_image_url", "before_image_thumb_url")
+            saved += await _compact_image(database, doc, "after_image_url", "after_image_thumb_url")
+        except Exception as exc:
+            report.errors.append(f"{doc['_id']}: {exc}")
+            continue
+        await database.reports.update_one({"_id": doc["_id"]}, {"$set": {"images_compacted": True}})
+        report.compacted += 1
+        report.compacted_saved_bytes += saved
+
+    report.duration_s = round(report.duration_s + time.perf_counter() - started, 3)
+    return report
+
+
+async def run_maintenance(database) -> GcReport | None:
+    lease_seconds = max(60.0, settings.upload_gc_interval_minutes * 60)
+    if not await try_acquire_lease(database, GC_LEASE, lease_seconds):
+        return None
+    try:
+        report = await compact_uploads(database)
+        gc_report = await collect_garbage(database)
+        gc_report.compacted = report.compacted
+        gc_report.compacted_saved_bytes = report.compacted_saved_bytes
+        gc_report.errors = report.errors + gc_report.errors
+        return gc_report
+    finally:
+        await release_lease(database, GC_LEASE)
+
+
+async def upload_gc_loop(get_database) -> None:
+    interval = settings.upload_gc_interval_minutes * 60
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_maintenance(get_database())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Upload GC run failed")
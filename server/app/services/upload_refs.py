@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime
+
+from bson import ObjectId
+
+from app.utils.storage import relpath_from_url
+from app.utils.uploads import SavedUpload
+
+
+async def add_upload_ref(database, upload: SavedUpload, report_id: ObjectId) -> None:
+    relpath = relpath_from_url(upload.url)
+    if relpath is None:
+        return
+    await database.uploads.update_one(
+        {"_id": relpath},
+        {
+            "$addToSet": {"report_ids": report_id},
+            "$setOnInsert": {
+                "sha256": upload.sha256,
+                "size": upload.size,
+                "thumb_url": upload.thumb_url,
+                "created_at": datetime.now(UTC),
+            },
+        },
+        upsert=True,
+    )
+
+
+async def release_upload_ref(database, url: str | None, report_id: ObjectId) -> None:
+    relpath = relpath_from_url(url)
+    if relpath is None:
+        return
+    await database.uploads.update_one({"_id": relpath}, {"$pull": {"report_ids": report_id}})
+
+
+async def release_report_uploads(database, report: dict) -> None:
+    for field in ("before_image_url", "after_image_url"):
+        await release_upload_ref(database, report.get(field), report["_id"])
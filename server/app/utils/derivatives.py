@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.utils.image_pool import run_image_task
+from app.utils.imaging import render_derivative
+
+DERIVATIVE_MEDIA_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+
+@dataclass(frozen=True)
+class Variant:
+    width: int
+    fmt: str
+    negotiated: bool = field(default=False, compare=False)
+
+    @property
+    def suffix(self) -> str:
+        return f"w{self.width}.{self.fmt}"
+
+    @property
+    def query(self) -> str:
+        return f"w={self.width}&fmt={self.fmt}"
+
+
+# The ``.w<width>.<fmt>`` that derived_path() appends to the original's relpath.
+_VARIANT_SUFFIX = re.compile(r"\.w\d+\.(?:%s)$" % "|".join(DERIVATIVE_MEDIA_TYPES))
+
+
+def derived_root() -> str:
+    return f"{settings.upload_dir}/.derived"
+
+
+def derived_path(relpath: str, variant: Variant) -> str:
+    return f"{derived_root()}/{relpath}.{variant.suffix}"
+
+
+def source_relpath(derived_relpath: str) -> str:
+    """Relpath of the original a rendition under ``.derived`` was rendered from."""
+    return _VARIANT_SUFFIX.sub("", derived_relpath)
+
+
+def variant_url(url: str, variant: Variant) -> str:
+    return f"{url}?{variant.query}"
+
+
+def parse_variant(query_string: bytes | str, default_fmt: str = "webp") -> Variant | None:
+    if isinstance(query_string, bytes):
+        query_string = query_string.decode("latin-1")
+    params = parse_qs(query_string)
+    if "w" not in params and "fmt" not in params:
+        return None
+
+    raw_width = params.get("w", [""])[0]
+    negotiated = "fmt" not in params
+    fmt = params.get("fmt", [default_fmt])[0].lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if not raw_width.isdigit() or int(raw_width) not in settings.image_derivative_widths_list:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported width. Allowed: {settings.image_derivative_widths}",
+        )
+    if fmt not in DERIVATIVE_MEDIA_TYPES or fmt not in settings.image_derivative_formats_list:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format. Allowed: {settings.image_derivative_formats}",
+        )
+    return Variant(width=int(raw_width), fmt=fmt, negotiated=negotiated)
+
+
+def negotiate_format(accept: str) -> str:
+    allowed = settings.image_derivative_formats_list
+    if "webp" in allowed and "image/webp" in accept:
+        return "webp"
+    if "jpeg" in allowed:
+        return "jpeg"
+    return allowed[0] if allowed else "webp"
+
+
+class DerivativeCache:
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+        self.loaded = False
+        self.pending: dict[str, asyncio.Task[str]] = {}
+
+    def _load(self) -> None:
+        found: list[tuple[float, str, int]] = []
+        for dirpath, _, filenames in os.walk(derived_root()):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self.entries[path] = size
+            self.total_bytes += size
+        self.loaded = True
+
+    def touch(self, path: str) -> None:
+        if path in self.entries:
+            self.entries.move_to_end(path)
+
+    def add(self, path: str, size: int) -> None:
+        self.total_bytes += size - self.entries.pop(path, 0)
+        self.entries[path] = size
+        self._evict()
+
+    def discard(self, path: str) -> None:
+        self.total_bytes -= self.entries.pop(path, 0)
+
+    def _evict(self) -> None:
+        cap = settings.derivative_cache_mb * 1024 * 1024
+        while self.total_bytes > cap and len(self.entries) > 1:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def get_or_render(self, src_path: str, relpath: str, variant: Variant) -> str:
+        if not self.loaded:
+            await asyncio.to_thread(self._load)
+
+        dest = derived_path(relpath, variant)
+        if os.path.exists(dest):
+            self.touch(dest)
+            return dest
+
+        # The render belongs to the cache, not to the request that started it: a client that
+        # disconnects does not cancel it for the requests coalesced onto it, and the result
+        # is cached either way.
+        task = self.pending.get(dest)
+        if task is None:
+            task = asyncio.create_task(self._render(src_path, dest, variant))
+            task.add_done_callback(lambda done: self._render_done(dest, done))
+            self.pending[dest] = task
+        return await asyncio.shield(task)
+
+    async def _render(self, src_path: str, dest: str, variant: Variant) -> str:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{uuid4().hex}.tmp"
+        try:
+            await run_image_task(
+                render_derivative,
+                src_path,
+                tmp,
+                variant.width,
+                variant.fmt,
+                settings.image_webp_quality,
+                settings.image_webp_method,
+            )
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.add(dest, os.path.getsize(dest))
+        return dest
+
+    def _render_done(self, dest: str, task: asyncio.Task[str]) -> None:
+        if self.pending.get(dest) is task:
+            del self.pending[dest]
+        if not task.cancelled():
+            # Mark retrieved so an unawaited failure does not log "exception never retrieved".
+            task.exception()
+
+derivative_cache = DerivativeCache()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from itertools import combinations
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+@lru_cache(maxsize=8)
+def _flip_masks(radius: int) -> tuple[int, ...]:
+    masks = [0]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            masks.append(mask)
+    return tuple(masks)
+
+
+def _chunks(value: int) -> list[int]:
+    return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+# Two hashes within Hamming distance k agree to within k // 4 bits on at least one of the
+# four 16-bit chunks, so a query only probes buckets near its own chunks.
+class MultiIndexHash:
+    def __init__(self) -> None:
+        self.tables: list[dict[int, list[int]]] = [{} for _ in range(CHUNKS)]
+        self.values: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, value: int) -> None:
+        if value in self.values:
+            return
+        self.values.add(value)
+        for table, chunk in zip(self.tables, _chunks(value)):
+            table.setdefault(chunk, []).append(value)
+
+    def within(self, value: int, distance: int) -> list[int]:
+        if distance <= 0:
+            return [value] if value in self.values else []
+        masks = _flip_masks(distance // CHUNKS)
+        found: set[int] = set()
+        for table, chunk in zip(self.tables, _chunks(value)):
+            for mask in masks:
+                for candidate in table.get(chunk ^ mask, ()):
+                    if candidate not in found and (candidate ^ value).bit_count() <= distance:
+                        found.add(candidate)
+        return list(found)
+
+
+def parse_hash(hex_hash: str | None) -> int | None:
+    if not hex_hash or len(hex_hash) * 4 != HASH_BITS:
+        return None
+    try:
+        return int(hex_hash, 16)
+    except ValueError:
+        return None
+
+
+def format_hash(value: int) -> str:
+    return f"{value:0{HASH_BITS // 4}x}"
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class ImagePool:
+    executor: Executor | None = None
+    capacity: int = 0
+    in_flight: int = 0
+    rejected: int = 0
+
+
+image_pool = ImagePool()
+
+
+def start_image_pool() -> None:
+    workers = settings.image_pool_workers
+    if workers <= 0:
+        image_pool.executor = None
+        return
+
+    if settings.image_pool_kind == "thread":
+        image_pool.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+    else:
+        # spawn: forking a process that already runs an event loop and Mongo threads is unsafe.
+        image_pool.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    image_pool.capacity = workers + max(0, settings.image_pool_queue)
+    image_pool.in_flight = 0
+
+
+def close_image_pool() -> None:
+    if image_pool.executor is not None:
+        image_pool.executor.shutdown(wait=True, cancel_futures=True)
+        image_pool.executor = None
+
+
+def image_pool_stats() -> dict[str, int]:
+    return {
+        "workers": settings.image_pool_workers if image_pool.executor else 0,
+        "capacity": image_pool.capacity,
+        "in_flight": image_pool.in_flight,
+        "rejected": image_pool.rejected,
+    }
+
+
+async def run_image_task(fn: Callable[..., T], *args: Any) -> T:
+    if image_pool.executor is None:
+        return fn(*args)
+
+    if image_pool.in_flight >= image_pool.capacity:
+        image_pool.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image processing is busy. Please retry shortly.",
+            headers={"Retry-After": "2"},
+        )
+
+    image_pool.in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(image_pool.executor, fn, *args)
+    finally:
+        image_pool.in_flight -= 1
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from PIL import Image, ImageOps
+
+# EXIF orientations that swap width and height once transposed.
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def probe_image(src_path: str) -> tuple[int, int]:
+    with Image.open(src_path) as image:
+        size = image.size
+        image.verify()
+    return size
+
+
+def render_derivative(src_path: str, dest_path: str, width: int, fmt: str, quality: int, method: int) -> None:
+    with Image.open(src_path) as image:
+        rotated = image.getexif().get(0x0112) in _ROTATED_ORIENTATIONS
+        # JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale, which is most of the win.
+        image.draft("RGB", (1, width) if rotated else (width, 1))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        if image.mode == "RGBA":
+            image = image.convert("RGB")
+
+        if fmt == "jpeg":
+            image.save(dest_path, format="JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(dest_path, format="WEBP", quality=quality, method=method)
+
+
+def recompress_image(src_path: str, dest_path: str, quality: int, method: int) -> None:
+    with Image.open(src_path) as image:
+        exif = image.getexif()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        image.save(dest_path, format="WEBP", quality=quality, method=method, exif=exif.tobytes())
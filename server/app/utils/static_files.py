@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import PurePosixPath
+
+import anyio
+from fastapi import HTTPException, status
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.utils.derivatives import (
+    DERIVATIVE_MEDIA_TYPES,
+    Variant,
+    derivative_cache,
+    negotiate_format,
+    parse_variant,
+)
+from app.utils.storage import local_path
+
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadFileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        file_size: int,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: dict[str, str],
+        media_type: str | None,
+        send_body: bool,
+    ) -> None:
+        self.path = path
+        self.file_size = file_size
+        self.start = start
+        self.end = end
+        self.send_body = send_body
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        # Let the server hand the file to the kernel when it supports it; otherwise stream.
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and count == self.file_size:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+        if "http.response.zerocopy" in extensions:
+            with open(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": "http.response.zerocopy",
+                        "file": file,
+                        "offset": self.start,
+                        "count": count,
+                        "more_body": False,
+                    }
+                )
+            return
+
+        remaining = count
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _etag(relpath: str, stat_result: os.stat_result, variant: Variant | None) -> str:
+    name = PurePosixPath(relpath).name
+    stem = name.split(".", 1)[0]
+    suffix = f".{variant.suffix}" if variant else ""
+    if _SHA256_NAME.match(stem):
+        # Content-addressed: the name is the SHA-256 of the bytes, so the tag is strong.
+        return f'"{stem}{suffix}"'
+    return f'W/"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{suffix}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def _parse_range(value: str, size: int) -> tuple[int, int] | None:
+    # Only single ranges are honoured; multipart/byteranges is not worth it for images.
+    match = _RANGE.match(value.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("unsatisfiable")
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("unsatisfiable")
+    return start, end
+
+
+class CacheControlStaticFiles(StaticFiles):
+    def __init__(self, *args, cache_control: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    async def check_config(self) -> None:
+        # Files are resolved against settings.upload_dir per request; a missing dir is just a 404.
+        return None
+
+    async def get_response(self, path: str, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        parts = PurePosixPath(path).parts
+        # Staging areas such as .tmp and .derived live inside the upload dir but are never public.
+        if not parts or any(part.startswith(".") for part in parts):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+        relpath = "/".join(parts)
+        src_path = local_path(relpath)
+        if not os.path.isfile(src_path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+        request_headers = Headers(scope=scope)
+        variant = parse_variant(
+            scope.get("query_string", b""),
+            default_fmt=negotiate_format(request_headers.get("accept", "")),
+        )
+        if variant is None:
+            file_path = src_path
+            media_type = mimetypes.guess_type(src_path)[0] or "application/octet-stream"
+        else:
+            try:
+                file_path = await derivative_cache.get_or_render(src_path, relpath, variant)
+            except HTTPException:
+                raise
+            except Exception as exc:  # pragma: no cover - defensive for corrupt files
+                raise HTTPException(
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                    detail="Image cannot be rendered.",
+                ) from exc
+            media_type = DERIVATIVE_MEDIA_TYPES[variant.fmt]
+
+        stat_result = await anyio.to_thread.run_sync(os.stat, file_path)
+        size = stat_result.st_size
+        etag = _etag(relpath, stat_result, variant)
+        headers = {
+            "Cache-Control": self.cache_control,
+            "ETag": etag,
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        if variant is not None and variant.negotiated:
+            headers["Vary"] = "Accept"
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        else:
+            if_modified_since = request_headers.get("if-modified-since")
+            not_modified = bool(if_modified_since) and _not_modified_since(if_modified_since, stat_result.st_mtime)
+        if not_modified:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        # If-Range needs a strong validator; a stale or weak one falls back to the full body.
+        range_applies = if_range is None or (not etag.startswith("W/") and if_range.strip() == etag)
+        if range_header and range_applies:
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                return Response(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "Content-Range": f"bytes */{size}"},
+                )
+            if byte_range is not None:
+                start, end = byte_range
+                status_code = status.HTTP_206_PARTIAL_CONTENT
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        headers["Content-Length"] = str(end - start + 1)
+        return UploadFileResponse(
+            file_path,
+            file_size=size,
+            start=start,
+            end=end,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            send_body=scope["method"] == "GET",
+        )
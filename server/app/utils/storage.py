@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import os
+from pathlib import PurePosixPath
+
+from app.core.config import settings
+
+UPLOAD_URL_PREFIX = "/uploads/"
+
+
+def blob_relpath(sha256: str, ext: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def upload_url(relpath: str) -> str:
+    return f"{UPLOAD_URL_PREFIX}{relpath}"
+
+
+def local_path(relpath: str) -> str:
+    return f"{settings.upload_dir}/{relpath}"
+
+
+def relpath_from_url(url: str | None) -> str | None:
+    if not url or not url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    relpath = url.removeprefix(UPLOAD_URL_PREFIX).split("?", 1)[0]
+    parts = PurePosixPath(relpath).parts
+    if not parts or any(part in {"", ".", ".."} or part.startswith(".") for part in parts):
+        return None
+    return relpath
+
+
+def path_for_url(url: str | None) -> str | None:
+    relpath = relpath_from_url(url)
+    if relpath is None:
+        return None
+    return local_path(relpath)
+
+
+def store_blob(src_path: str, sha256: str, ext: str) -> tuple[str, bool]:
+    # Identical bytes hash to the same relpath, so a resubmitted photo is stored once.
+    relpath = blob_relpath(sha256, ext)
+    dest = local_path(relpath)
+    if os.path.exists(dest):
+        os.remove(src_path)
+        # The blob may be an orphan past the GC grace period; refreshing its mtime keeps
+        # the collector off it until the caller has recorded its reference.
+        os.utime(dest)
+        return relpath, False
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(src_path, dest)
+    return relpath, True
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
-from io import BytesIO
+import hashlib
+import os
+from dataclasses import dataclass
 from uuid import uuid4
 
 from fastapi import HTTPException, UploadFile, status
-from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.core.config import settings
+from app.utils.derivatives import Variant, variant_url
+from app.utils.image_pool import run_image_task
+from app.utils.imaging import probe_image
+from app.utils.storage import local_path, relpath_from_url, store_blob, upload_url
 
 ALLOWED_CONTENT_TYPES = {
     "image/jpeg",
@@ -22,6 +30,26 @@ CONTENT_TYPE_EXT = {
     "image/webp": ".webp",
 }
 
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# Room for the multipart boundaries and the form's text fields next to the file.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class IngestedUpload:
+    path: str
+    sha256: str
+    size: int
+    ext: str
+
+
+@dataclass
+class SavedUpload:
+    url: str
+    thumb_url: str
+    sha256: str
+    size: int
+
 
 def validate_upload(file: UploadFile) -> None:
     if file.content_type not in ALLOWED_CONTENT_TYPES:
@@ -30,57 +58,143 @@ def validate_upload(file: UploadFile) -> None:
             detail="Invalid file type. Only JPG/PNG/WEBP allowed.",
         )
 
-    # Size validation: FastAPI doesn't expose size before reading.
-    # We enforce via MAX_UPLOAD_MB by reading and writing in endpoints (simple MVP).
-    # If needed later, enforce via reverse proxy limits + streaming.
+    # Starlette has already received and spooled the whole body by now; these checks only
+    # keep an oversized file out of the store. UploadSizeLimit rejects declared sizes early.
+    max_bytes = max_upload_bytes()
+    if max_bytes is not None and file.size is not None and file.size > max_bytes:
+        raise _too_large()
+
+
+def max_upload_bytes() -> int | None:
     if settings.max_upload_mb <= 0:
-        return
+        return None
+    return settings.max_upload_mb * 1024 * 1024
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File too large. Max {settings.max_upload_mb}MB allowed.",
+    )
+
+
+# Rejects a multipart request declaring more than MAX_UPLOAD_MB before its body is read.
+class UploadSizeLimit:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_bytes = max_upload_bytes()
+        if scope["type"] == "http" and max_bytes is not None:
+            headers = dict(scope["headers"])
+            declared = headers.get(b"content-length", b"")
+            if (
+                headers.get(b"content-type", b"").startswith(b"multipart/form-data")
+                and declared.isdigit()
+                and int(declared) > max_bytes + MULTIPART_OVERHEAD_BYTES
+            ):
+                too_large = _too_large()
+                response = JSONResponse({"detail": too_large.detail}, status_code=too_large.status_code)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 def path_from_upload_url(url: str) -> str:
-    if not url.startswith("/uploads/"):
+    relpath = relpath_from_url(url)
+    if relpath is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid upload URL")
-    filename = url.removeprefix("/uploads/")
-    return f"{settings.upload_dir}/{filename}"
+    return local_path(relpath)
 
 
-async def save_upload_with_thumbnail(file: UploadFile, prefix: str) -> tuple[str, str]:
-    validate_upload(file)
+def _tmp_dir() -> str:
+    tmp_dir = f"{settings.upload_dir}/.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tmp_dir
 
-    contents = await file.read()
-    if settings.max_upload_mb > 0:
-        max_bytes = settings.max_upload_mb * 1024 * 1024
-        if len(contents) > max_bytes:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File too large. Max {settings.max_upload_mb}MB allowed.",
-            )
 
-    ext = CONTENT_TYPE_EXT.get(file.content_type or "", ".jpg")
-    filename = f"{prefix}_{uuid4().hex}{ext}"
-    filepath = f"{settings.upload_dir}/{filename}"
+async def ingest_upload(file: UploadFile, prefix: str) -> IngestedUpload:
+    validate_upload(file)
 
-    with open(filepath, "wb") as f:
-        f.write(contents)
+    max_bytes = max_upload_bytes()
+    ext = CONTENT_TYPE_EXT.get(file.content_type or "", ".jpg")
+    tmp_path = f"{_tmp_dir()}/{prefix}_{uuid4().hex}{ext}"
 
+    digest = hashlib.sha256()
+    size = 0
     try:
-        image = Image.open(BytesIO(contents))
-        image = ImageOps.exif_transpose(image)
-        if image.mode not in ("RGB", "RGBA"):
-            image = image.convert("RGB")
+        with open(tmp_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise _too_large()
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+    if size == 0:
+        _discard(tmp_path)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file.")
+
+    return IngestedUpload(path=tmp_path, sha256=digest.hexdigest(), size=size, ext=ext)
+
+
+def _hash_file(path: str) -> tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_BYTES):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
 
-        image.thumbnail((settings.image_thumb_px, settings.image_thumb_px))
-        thumb_filename = f"{prefix}_thumb_{uuid4().hex}.webp"
-        thumb_path = f"{settings.upload_dir}/{thumb_filename}"
 
-        if image.mode == "RGBA":
-            image = image.convert("RGB")
+async def ingest_file(path: str, ext: str) -> IngestedUpload:
+    sha256, size = await run_in_threadpool(_hash_file, path)
+    return IngestedUpload(path=path, sha256=sha256, size=size, ext=ext)
 
-        image.save(thumb_path, format="WEBP", quality=72, method=6)
+
+async def save_upload_with_thumbnail(file: UploadFile, prefix: str) -> SavedUpload:
+    ingested = await ingest_upload(file, prefix)
+    try:
+        return await store_ingested_upload(ingested)
+    except BaseException:
+        # A one-shot upload has nothing to resume; the client sends the whole file again.
+        _discard(ingested.path)
+        raise
+
+
+async def store_ingested_upload(ingested: IngestedUpload) -> SavedUpload:
+    # Only the header is checked here; thumbnails are rendered on first request
+    # through the /uploads derivative endpoint.
+    try:
+        await run_image_task(probe_image, ingested.path)
+    except HTTPException as exc:
+        # A busy pool (503) is transient: keep the bytes so a resumable upload can finalize again.
+        if exc.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+            _discard(ingested.path)
+        raise
     except Exception as exc:  # pragma: no cover - defensive for corrupt files
+        _discard(ingested.path)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid image file.",
         ) from exc
 
-    return f"/uploads/{filename}", f"/uploads/{thumb_filename}"
+    relpath, _ = store_blob(ingested.path, ingested.sha256, ingested.ext)
+    url = upload_url(relpath)
+    return SavedUpload(
+        url=url,
+        thumb_url=variant_url(url, Variant(width=settings.image_thumb_px, fmt="webp")),
+        sha256=ingested.sha256,
+        size=ingested.size,
+    )
@@ -0,0 +1,93 @@
+"""Backlog assignment optimizer: solve time and plan quality on synthetic city backlogs.
+
+Run from the server directory:
+
+    python -m benchmarks.backlog_assignment --sizes 200x40,5000x500,50000x2000 --capacity 10
+
+Each size is ``<reports>x<cleaners>``, placed at random around a city with a random
+priority mix, every cleaner with ``--capacity`` free slots. ``solve_backlog`` picks
+the exact (Hungarian) or greedy-with-repair path as it would for a live backlog.
+Small sizes are also solved with the other method, so ``vs_hungarian_pct`` shows how
+much extra weighted travel the greedy plan costs. No Mongo is needed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.backlog_optimizer import _solve_exact, _solve_greedy, solve_backlog
+from app.services.cleaner_geo import haversine_matrix, haversine_pairs
+
+CITY = (12.9716, 77.5946)
+SPREAD_DEG = 0.25
+
+
+def _instance(reports: int, cleaners: int, capacity: int, seed: int):
+    rng = np.random.default_rng(seed)
+    report_lat = CITY[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, reports)
+    report_lng = CITY[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, reports)
+    weights = rng.choice([1.0, 2.0, 3.0], reports, p=[0.5, 0.3, 0.2])
+    cleaner_lat = CITY[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, cleaners)
+    cleaner_lng = CITY[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, cleaners)
+    return report_lat, report_lng, weights, cleaner_lat, cleaner_lng, np.full(cleaners, capacity, dtype=np.int64)
+
+
+def _score(assigned: np.ndarray, report_lat, report_lng, weights, cleaner_lat, cleaner_lng, capacity) -> dict:
+    rows = np.nonzero(assigned >= 0)[0]
+    load = np.bincount(assigned[rows], minlength=len(capacity))
+    km = haversine_pairs(report_lat[rows], report_lng[rows], cleaner_lat[assigned[rows]], cleaner_lng[assigned[rows]])
+    return {
+        "assigned": int(len(rows)),
+        "assigned_high": int((weights[rows] == 3.0).sum()),
+        "over_capacity": int((load > capacity).sum()),
+        "mean_km": round(float(km.mean()), 3) if len(rows) else None,
+        "weighted_km": round(float((km * weights[rows]).sum()), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="200x40,5000x500,50000x2000")
+    parser.add_argument("--capacity", type=int, default=10)
+    parser.add_argument("--max-km", type=float, default=settings.cleaner_search_radius_km)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes.split(","):
+        reports, cleaners = (int(v) for v in size.split("x"))
+        problem = _instance(reports, cleaners, args.capacity, args.seed)
+        started = time.perf_counter()
+        assigned, method = solve_backlog(*problem, args.max_km)
+        result = {
+            "reports": reports,
+            "cleaners": cleaners,
+            "capacity": int(problem[-1].sum()),
+            "method": method,
+            "solve_s": round(time.perf_counter() - started, 3),
+            **_score(assigned, *problem),
+        }
+        if reports <= settings.backlog_exact_max_reports:
+            report_lat, report_lng, weights, cleaner_lat, cleaner_lng, capacity = problem
+            exact = assigned
+            if method != "hungarian":
+                distance_km = haversine_matrix(report_lat, report_lng, cleaner_lat, cleaner_lng)
+                exact = _solve_exact(distance_km, weights, capacity, args.max_km)
+            started = time.perf_counter()
+            greedy = _solve_greedy(*problem, args.max_km)
+            greedy_s = time.perf_counter() - started
+            exact_cost = _score(exact, *problem)["weighted_km"]
+            greedy_score = _score(greedy, *problem)
+            result["greedy"] = {"solve_s": round(greedy_s, 3), **greedy_score}
+            if exact_cost:
+                result["greedy"]["vs_hungarian_pct"] = round((greedy_score["weighted_km"] / exact_cost - 1) * 100, 2)
+        results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
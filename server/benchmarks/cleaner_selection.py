@@ -0,0 +1,135 @@
+"""Nearest-cleaner selection: ``$geoNear`` on the 2dsphere index against the previous full scan.
+
+Run from the server directory against a Mongo you can write to:
+
+    python -m benchmarks.cleaner_selection --sizes 100,10000,100000 --queries 200
+
+Cleaners are seeded into a scratch database (``<MONGODB_DB>_bench_cleaners``,
+dropped afterwards) at random points around a city. The scan baseline is the
+previous ``_select_nearest_cleaner``: load every active cleaner, keep those with
+a location and sort them by haversine distance. Each query's ``$geoNear``
+winner is checked against the scan's, so non-zero ``mismatches`` means the
+index picked a different cleaner.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.services.cleaner_geo import GEO_FIELD, geojson_point, haversine_km, nearest_cleaners
+
+CITY = (12.9716, 77.5946)
+SPREAD_DEG = 0.25
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _point(rng: random.Random) -> dict[str, float]:
+    return {"lat": CITY[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), "lng": CITY[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)}
+
+
+async def _scan_nearest(database, location: dict[str, float]) -> dict | None:
+    cleaners = [doc async for doc in database.users.find({"role": "cleaner", "is_active": True}, {"password_hash": 0})]
+    with_locations = [c for c in cleaners if c.get("location") and "lat" in c["location"] and "lng" in c["location"]]
+    if not with_locations:
+        return None
+    with_locations.sort(key=lambda c: haversine_km(location["lat"], location["lng"], c["location"]["lat"], c["location"]["lng"]))
+    return with_locations[0]
+
+
+async def _seed(database, size: int, rng: random.Random) -> None:
+    await database.users.drop()
+    docs = []
+    for i in range(size):
+        location = _point(rng)
+        docs.append(
+            {
+                "full_name": f"Cleaner {i}",
+                "email": f"cleaner{i}@bench.invalid",
+                "role": "cleaner",
+                "is_active": True,
+                "password_hash": "x" * 60,
+                "location": location,
+                GEO_FIELD: geojson_point(location["lat"], location["lng"]),
+            }
+        )
+    for start in range(0, len(docs), 10_000):
+        await database.users.insert_many(docs[start : start + 10_000], ordered=False)
+    await database.users.create_index([(GEO_FIELD, "2dsphere")])
+
+
+async def _run_size(database, size: int, queries: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    await _seed(database, size, rng)
+    probes = [_point(rng) for _ in range(queries)]
+
+    scan_ms: list[float] = []
+    geo_ms: list[float] = []
+    mismatches = 0
+    for probe in probes:
+        started = time.perf_counter()
+        expected = await _scan_nearest(database, probe)
+        scan_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        candidates = await nearest_cleaners(database, probe)
+        geo_ms.append((time.perf_counter() - started) * 1000)
+
+        found = candidates[0] if candidates else None
+        # With the search radius, "no one in range" is only right if the scan's winner is out of it too.
+        if found is None:
+            in_range = expected is not None and haversine_km(
+                probe["lat"], probe["lng"], expected["location"]["lat"], expected["location"]["lng"]
+            ) <= settings.cleaner_search_radius_km
+            mismatches += in_range
+        elif expected is None or found["_id"] != expected["_id"]:
+            mismatches += 1
+
+    return {
+        "cleaners": size,
+        "queries": queries,
+        "scan_p50_ms": round(statistics.median(scan_ms), 3),
+        "scan_p95_ms": round(_percentile(scan_ms, 95), 3),
+        "geonear_p50_ms": round(statistics.median(geo_ms), 3),
+        "geonear_p95_ms": round(_percentile(geo_ms, 95), 3),
+        "candidates": settings.cleaner_candidates,
+        "radius_km": settings.cleaner_search_radius_km,
+        "mismatches": mismatches,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.mongodb_uri)
+    name = f"{settings.mongodb_db}_bench_cleaners"
+    try:
+        database = client[name]
+        results = []
+        for size in args.sizes.split(","):
+            # The scan gets fewer queries at large sizes; each one reads the whole roster.
+            queries = args.queries if int(size) <= 10_000 else max(10, args.queries // 10)
+            results.append(await _run_size(database, int(size), queries, args.seed))
+        print(json.dumps(results, indent=2))
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
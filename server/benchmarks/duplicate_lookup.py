@@ -0,0 +1,103 @@
+"""Near-duplicate image lookup: multi-index hashing against a full scan of stored hashes.
+
+Run from the server directory:
+
+    python -m benchmarks.duplicate_lookup --sizes 100000,1000000 --distance 4
+
+The scan baseline is what ``count_documents({"before_image_hash": ...})`` does without
+an index (touch every report), done here in-process so it is a lower bound on the Mongo
+collection scan. Every query's multi-index result is checked against the brute-force
+Hamming scan, so a non-zero ``mismatches`` means the index missed a duplicate.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.utils.hash_index import HASH_BITS, MultiIndexHash, format_hash
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _near(value: int, rng: random.Random, max_flips: int) -> int:
+    for bit in rng.sample(range(HASH_BITS), rng.randint(0, max_flips)):
+        value ^= 1 << bit
+    return value
+
+
+def _run_size(size: int, queries: int, distance: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    stored = [rng.getrandbits(HASH_BITS) for _ in range(size)]
+    # Half the queries are edits of stored photos, half are new photos.
+    probes = [
+        _near(rng.choice(stored), rng, distance + 2) if i % 2 == 0 else rng.getrandbits(HASH_BITS)
+        for i in range(queries)
+    ]
+
+    started = time.perf_counter()
+    index = MultiIndexHash()
+    for value in stored:
+        index.add(value)
+    build_s = time.perf_counter() - started
+
+    docs = [{"before_image_hash": format_hash(value)} for value in stored]
+    scan_exact_ms: list[float] = []
+    scan_hamming_ms: list[float] = []
+    index_ms: list[float] = []
+    mismatches = 0
+    exact_hits = 0
+    near_hits = 0
+    for probe in probes:
+        probe_hex = format_hash(probe)
+        started = time.perf_counter()
+        exact = sum(1 for doc in docs if doc["before_image_hash"] == probe_hex)
+        scan_exact_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        expected = {value for value in stored if (value ^ probe).bit_count() <= distance}
+        scan_hamming_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        found = index.within(probe, distance)
+        index_ms.append((time.perf_counter() - started) * 1000)
+
+        mismatches += set(found) != expected
+        exact_hits += exact > 0
+        near_hits += bool(found)
+
+    return {
+        "stored_hashes": size,
+        "queries": queries,
+        "distance": distance,
+        "index_build_s": round(build_s, 3),
+        "scan_exact_p50_ms": round(statistics.median(scan_exact_ms), 3),
+        "scan_hamming_p50_ms": round(statistics.median(scan_hamming_ms), 3),
+        "index_p50_ms": round(statistics.median(index_ms), 4),
+        "index_p99_ms": round(_percentile(index_ms, 99), 4),
+        "exact_match_duplicates": exact_hits,
+        "near_duplicates": near_hits,
+        "mismatches": mismatches,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--distance", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = [_run_size(int(size), args.queries, args.distance, args.seed) for size in args.sizes.split(",")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
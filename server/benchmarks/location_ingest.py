@@ -0,0 +1,167 @@
+"""Cleaner location pings: sustained pings/sec one API worker absorbs, and the Mongo writes they cost.
+
+Run from the server directory:
+
+    python -m benchmarks.location_ingest --cleaners 5000 --interval 5 --duration 20 --concurrency 64
+
+Requests go through the real app (routing, JWT check, validation) over an
+in-process ASGI transport, so HTTP parsing in uvicorn is not included, but the load
+generator shares the worker's event loop and CPU, so rates are a lower bound. Two phases:
+
+- ``fleet``: every cleaner pings once per ``--interval`` seconds (open loop), the
+  expected production shape; reports request latency and writes per second.
+- ``saturate``: ``--concurrency`` clients ping back to back (closed loop) for
+  ``--duration`` seconds; the rate reached is the worker's ceiling.
+
+The flush loop runs throughout against a stand-in ``users`` collection that
+sleeps ``--write-ms`` per ``bulk_write``, so only the coalesced writes reach it.
+``--batch N`` sends N points per request to ``/location/batch`` instead.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.main import app
+from app.services.cleaner_locations import location_buffer
+
+CITY = (12.9716, 77.5946)
+SPREAD_DEG = 0.25
+
+
+class _Result:
+    def __init__(self, modified_count: int = 0):
+        self.modified_count = modified_count
+
+
+class _Users:
+    def __init__(self, write_ms: float):
+        self.write_ms = write_ms
+        self.bulk_writes = 0
+        self.ops = 0
+
+    async def bulk_write(self, ops, ordered: bool = True) -> _Result:
+        await asyncio.sleep(self.write_ms / 1000)
+        self.bulk_writes += 1
+        self.ops += len(ops)
+        return _Result(len(ops))
+
+    async def update_many(self, *args, **kwargs) -> _Result:
+        return _Result()
+
+
+class FakeDB:
+    def __init__(self, write_ms: float):
+        self.users = _Users(write_ms)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _body(rng: random.Random, batch: int) -> dict:
+    points = [
+        {"lat": CITY[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), "lng": CITY[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)}
+        for _ in range(batch)
+    ]
+    return {"points": points} if batch > 1 else points[0]
+
+
+async def _phase(name: str, client: httpx.AsyncClient, headers: list[dict], args, rng: random.Random) -> dict:
+    database = FakeDB(args.write_ms)
+    location_buffer.start(lambda: database)
+    path = "/api/cleaner/location/batch" if args.batch > 1 else "/api/cleaner/location"
+    latencies: list[float] = []
+    errors = 0
+
+    async def ping(header: dict) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        response = await client.post(path, json=_body(rng, args.batch), headers=header)
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors += response.status_code != 202
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    if name == "fleet":
+        # Each cleaner pings on its own schedule, phase-shifted so the load is even.
+        async def cleaner(header: dict, offset: float) -> None:
+            await asyncio.sleep(offset)
+            while time.perf_counter() < deadline:
+                tick = time.perf_counter()
+                await ping(header)
+                next_ping = tick + args.interval
+                await asyncio.sleep(max(0.0, min(next_ping, deadline) - time.perf_counter()))
+
+        await asyncio.gather(*(cleaner(h, i * args.interval / len(headers)) for i, h in enumerate(headers)))
+    else:
+        async def client_loop(worker: int) -> None:
+            i = worker
+            while time.perf_counter() < deadline:
+                await ping(headers[i % len(headers)])
+                i += args.concurrency
+
+        await asyncio.gather(*(client_loop(w) for w in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await location_buffer.close()
+
+    requests = len(latencies)
+    return {
+        "phase": name,
+        "cleaners": len(headers),
+        "points_per_request": args.batch,
+        "duration_s": round(elapsed, 2),
+        "requests": requests,
+        "errors": errors,
+        "pings_per_s": round(requests * args.batch / elapsed, 1),
+        "requests_per_s": round(requests / elapsed, 1),
+        "latency_p50_ms": round(statistics.median(latencies), 2),
+        "latency_p99_ms": round(_percentile(latencies, 99), 2),
+        "bulk_writes": database.users.bulk_writes,
+        "mongo_updates": database.users.ops,
+        "mongo_updates_per_s": round(database.users.ops / elapsed, 1),
+        # Pings absorbed in memory per update that reached Mongo.
+        "coalescing": round(requests * args.batch / max(1, database.users.ops), 1),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cleaners", type=int, default=5000)
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--write-ms", type=float, default=20.0)
+    parser.add_argument("--flush-seconds", type=float, default=settings.location_flush_seconds)
+    parser.add_argument("--phases", default="fleet,saturate")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    settings.location_flush_seconds = args.flush_seconds
+    rng = random.Random(args.seed)
+    headers = [
+        {"Authorization": f"Bearer {create_access_token(subject=str(ObjectId()), role='cleaner')}"}
+        for _ in range(args.cleaners)
+    ]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in args.phases.split(","):
+            results.append(await _phase(name.strip(), client, headers, args, rng))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
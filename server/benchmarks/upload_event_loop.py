@@ -0,0 +1,169 @@
+"""Event-loop latency of GET /api/reports/my while photo uploads and thumbnail renders are in flight.
+
+Run from the server directory:
+
+    python -m benchmarks.upload_event_loop --uploads 16 --modes inline,thread,process
+
+Mongo is replaced by an in-memory fake so only the upload pipeline and the
+request path compete for the worker.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+import httpx
+from bson import ObjectId
+from PIL import Image
+from starlette.datastructures import Headers, UploadFile
+
+from app.api.deps import get_db
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.main import app
+from app.models.common import now_utc
+from app.utils.image_pool import close_image_pool, start_image_pool
+from app.utils.uploads import save_upload_with_thumbnail
+
+
+class _Cursor:
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs) -> "_Cursor":
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class _Reports:
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+
+    def find(self, *args, **kwargs) -> _Cursor:
+        return _Cursor(self.docs)
+
+
+class FakeDB:
+    def __init__(self, citizen_id: ObjectId, count: int = 20):
+        self.reports = _Reports(
+            [
+                {
+                    "_id": ObjectId(),
+                    "citizen_id": citizen_id,
+                    "description": "Overflowing bin",
+                    "location": {"lat": 17.38, "lng": 78.48},
+                    "before_image_url": "/uploads/before.jpg",
+                    "status": "Pending",
+                    "created_at": now_utc(),
+                }
+                for _ in range(count)
+            ]
+        )
+
+
+def make_photo(width: int, height: int) -> bytes:
+    noise = Image.effect_noise((width, height), 64)
+    image = Image.merge("RGB", (noise, noise.rotate(90, expand=False), noise.transpose(Image.FLIP_LEFT_RIGHT)))
+    buf = BytesIO()
+    image.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run_mode(mode: str, photo: bytes, uploads: int, concurrency: int) -> dict:
+    if mode == "inline":
+        settings.image_pool_workers = 0
+    else:
+        settings.image_pool_kind = mode  # type: ignore[assignment]
+        settings.image_pool_workers = max(1, os.cpu_count() or 1)
+        settings.image_pool_queue = uploads
+    start_image_pool()
+
+    citizen_id = ObjectId()
+    token = create_access_token(subject=str(citizen_id), role="citizen")
+    app.dependency_overrides[get_db] = lambda: FakeDB(citizen_id)
+
+    latencies: list[float] = []
+    done = asyncio.Event()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def upload_one(client: httpx.AsyncClient) -> None:
+        async with sem:
+            # Trailing bytes after the JPEG EOI marker keep every upload unique for the content-addressed store.
+            body = photo + os.urandom(16)
+            file = UploadFile(BytesIO(body), size=len(body), filename="photo.jpg", headers=Headers({"content-type": "image/jpeg"}))
+            saved = await save_upload_with_thumbnail(file, "bench")
+            # The first thumbnail fetch is what renders it.
+            response = await client.get(saved.thumb_url)
+            response.raise_for_status()
+
+    async def poll(client: httpx.AsyncClient) -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            response = await client.get("/api/reports/my", headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.005)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up the pool so worker start-up is not billed to the first request.
+        await upload_one(client)
+        pollers = [asyncio.create_task(poll(client)) for _ in range(4)]
+        started = time.perf_counter()
+        await asyncio.gather(*(upload_one(client) for _ in range(uploads)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*pollers)
+
+    close_image_pool()
+    app.dependency_overrides.pop(get_db, None)
+    return {
+        "mode": mode,
+        "uploads": uploads,
+        "upload_wall_s": round(elapsed, 3),
+        "uploads_per_s": round(uploads / elapsed, 2),
+        "my_reports_requests": len(latencies),
+        "my_reports_p50_ms": round(statistics.median(latencies), 2),
+        "my_reports_p95_ms": round(_percentile(latencies, 95), 2),
+        "my_reports_max_ms": round(max(latencies), 2),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--modes", default="inline,thread,process")
+    args = parser.parse_args()
+
+    photo = make_photo(args.width, args.height)
+    results = []
+    with tempfile.TemporaryDirectory() as upload_dir:
+        settings.upload_dir = upload_dir
+        for mode in args.modes.split(","):
+            results.append(await _run_mode(mode.strip(), photo, args.uploads, args.concurrency))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""Upload GC scan: time to walk the upload tree, and which files it would delete.
+
+Run from the server directory:
+
+    python -m benchmarks.upload_gc_scan --originals 2000 --referenced 0.5
+
+A scratch upload dir is seeded with content-addressed originals, a rendition for
+every configured width and format of each (``.derived/<relpath>.w640.webp`` ...),
+and stale ``.tmp`` files. Half the originals (``--referenced``) are referenced.
+Every scanned file's verdict is checked: a referenced original or one of its
+renditions marked as an orphan, or an unreferenced one kept, counts as a mismatch,
+so non-zero ``mismatches`` means a GC pass would delete live files or leak dead ones.
+No Mongo is needed.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.core.config import settings
+from app.services.upload_gc import _scan
+from app.utils.derivatives import Variant, derived_path
+from app.utils.storage import local_path
+
+
+def _seed(originals: int, referenced_share: float, rng: random.Random) -> tuple[set[str], set[str], set[str]]:
+    variants = [
+        Variant(width=width, fmt=fmt)
+        for width in settings.image_derivative_widths_list
+        for fmt in settings.image_derivative_formats_list
+    ]
+    referenced: set[str] = set()
+    live: set[str] = set()
+    dead: set[str] = set()
+    for i in range(originals):
+        sha = hashlib.sha256(str(i).encode()).hexdigest()
+        relpath = f"{sha[:2]}/{sha[2:4]}/{sha}.jpg"
+        paths = [local_path(relpath)] + [derived_path(relpath, v) for v in variants]
+        keep = rng.random() < referenced_share
+        if keep:
+            referenced.add(relpath)
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x")
+            (live if keep else dead).add(os.path.normpath(path))
+    os.makedirs(f"{settings.upload_dir}/.tmp", exist_ok=True)
+    for i in range(originals // 10):
+        path = f"{settings.upload_dir}/.tmp/{i}.part"
+        with open(path, "wb") as f:
+            f.write(b"x")
+        dead.add(os.path.normpath(path))
+    return referenced, live, dead
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--originals", type=int, default=2000)
+    parser.add_argument("--referenced", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        settings.upload_dir = upload_dir
+        referenced, live, dead = _seed(args.originals, args.referenced, random.Random(args.seed))
+        started = time.perf_counter()
+        # Everything is past the grace period.
+        scanned, orphans = _scan(time.time() + 60, referenced, set())
+        elapsed = time.perf_counter() - started
+
+    doomed = {os.path.normpath(path) for path, _, _ in orphans}
+    deleted_live = len(doomed & live)
+    kept_dead = len(dead - doomed)
+    result = {
+        "originals": args.originals,
+        "files": scanned,
+        "scan_s": round(elapsed, 3),
+        "orphans": len(orphans),
+        "live_renditions_deleted": sum(1 for p in doomed & live if "/.derived/" in p),
+        "mismatches": deleted_live + kept_dead,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()